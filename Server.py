@@ -8,20 +8,35 @@ import numpy as np
 import face_recognition
 from sklearn.cluster import DBSCAN
 from collections import defaultdict
-from typing import List, Dict
+from typing import List, Dict, Tuple, Union
 
-from photo_loader import load_all_photos_from_firebase
+from photo_loader import load_photo_collection_from_firebase, DEFAULT_PAGE_SIZE
 from user_loader import load_all_users_from_firebase
 from userclass import User
 from photo import Photo
-
+from photo_collection import PhotoCollection
+from predicted_photos import send_predicted_photos_to_users
+from services.clustering_service import ClusterState, DEFAULT_STATE_PATH, embedding_stamp
+from encoding_engine import FaceEncodingEngine
+from image_loader import load_image
+from face_detection import detect_and_encode
+from embedding_codec import encode_embeddings, decode_embeddings, is_legacy
+from blob_downloader import BlobPrefetcher, LocalBucket
+from image_cache import ImageCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_BYTES
+
+import argparse
 import logging
-import pickle
-import base64
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+BUCKET_NAME = "photobomb-fc123.appspot.com"
+
+# Stamped on every photo document next to its embeddings. Bump this whenever the
+# detector, encoder, their parameters or the pixels they see change so stored embeddings
+# are recomputed. v2: images are decoded upright (EXIF orientation applied).
+EMBEDDING_MODEL_VERSION = "hog-resnet-v2"
+
 def initialize_firebase():
     """
     Initializes Firebase Admin SDK with the provided service account key.
@@ -34,30 +49,26 @@ def initialize_firebase():
         logging.error(f"Failed to initialize Firebase Admin SDK: {e}")
         raise
 
-def create_people_cluster(photo_list: List[Photo]) -> Dict[int, List[str]]:
+def create_people_cluster(photo_list: Union[PhotoCollection, List[Photo]]) -> Dict[int, List[str]]:
     """
     Clusters face encodings from a list of Photo objects and associates clusters with users based on account photos.
 
     Args:
-        photo_list (List[Photo]): List of Photo instances to cluster.
+        photo_list (PhotoCollection | List[Photo]): Photos to cluster. Passing a PhotoCollection reuses
+                                                    its shared embedding matrix.
 
     Returns:
         Dict[int, List[str]]: A dictionary where keys are user `author_id`s (from account photos in clusters)
                                and values are lists of photo IDs associated with each user.
     """
-    all_encodings = []
-    photo_references = []
-
-    for photo in photo_list:
-        all_encodings.extend(photo.face_encodings)
-        photo_references.extend([photo] * len(photo.face_encodings))
+    photos = photo_list if isinstance(photo_list, PhotoCollection) else PhotoCollection(photo_list)
+    all_encodings = photos.embedding_matrix
+    face_photo_index = photos.face_photo_index
 
-    if not all_encodings:
+    if len(all_encodings) == 0:
         logging.warning("No face encodings found to cluster.")
         return {}
 
-    all_encodings = np.array(all_encodings)
-
     try:
         dbscan = DBSCAN(eps=0.55, min_samples=1, metric="euclidean").fit(all_encodings)
         labels = dbscan.labels_
@@ -66,11 +77,31 @@ def create_people_cluster(photo_list: List[Photo]) -> Dict[int, List[str]]:
         logging.error(f"DBSCAN clustering failed: {e}")
         return {}
 
+    return _people_clusters_from_labels(photos, labels, face_photo_index)
+
+def _people_clusters_from_labels(photos: PhotoCollection, labels: np.ndarray, face_photo_index: np.ndarray) -> Dict[int, List[str]]:
+    """
+    Groups faces by cluster label and keys each cluster by the author of an account photo in it.
+
+    Args:
+        photos (PhotoCollection): The clustered photos.
+        labels (np.ndarray): Cluster label per face; -1 marks noise.
+        face_photo_index (np.ndarray): Index into `photos` per face.
+
+    Returns:
+        Dict[int, List[str]]: `author_id` -> photo IDs in that author's cluster.
+    """
+    if len(labels) == 0:
+        return {}
+
     # Group photos by cluster labels
-    clusters = defaultdict(list)
-    for idx, label in enumerate(labels):
+    clusters = {}
+    face_order = np.argsort(labels, kind='stable')
+    boundaries = np.flatnonzero(np.diff(labels[face_order])) + 1
+    for face_indexes in np.split(face_order, boundaries):
+        label = labels[face_indexes[0]]
         if label != -1:  # Skip noise points
-            clusters[label].append(photo_references[idx])
+            clusters[label] = [photos[i] for i in face_photo_index[face_indexes]]
 
     # Create a dictionary to hold clusters associated with user `author_id`s
     people_clusters = defaultdict(list)
@@ -89,75 +120,270 @@ def create_people_cluster(photo_list: List[Photo]) -> Dict[int, List[str]]:
 
     return people_clusters
 
+def update_people_cluster(photos: PhotoCollection, state_path: str = DEFAULT_STATE_PATH, full_recluster: bool = False) -> Dict[int, List[str]]:
+    """
+    Incremental counterpart of `create_people_cluster`: assigns only the faces of photos that
+    are not yet in the persisted cluster state, re-running DBSCAN over everything only when
+    asked to, when there is no saved state, or when previously clustered photos were removed
+    or re-embedded.
 
-def send_predicted_photos_to_users(db: firestore.Client, people_clusters: Dict):
-    # Fetch all user documents from Firestore
-    users_ref = db.collection('users')
-    users_docs = users_ref.stream()
-    
-    for user_doc in users_docs:
-        user_id = user_doc.id
-        logging.info(f"Processing user {user_id}.")
+    Args:
+        photos (PhotoCollection): All photos with their current embeddings.
+        state_path (str): Where the cluster state is persisted between runs.
+        full_recluster (bool): Discard the saved state and cluster everything from scratch.
 
-        # Locate the corresponding document in `user_photos` using the user_id
-        user_photos_ref = db.collection('user_photos').document(user_id)
-        user_photos_doc = user_photos_ref.get()
+    Returns:
+        Dict[int, List[str]]: `author_id` -> photo IDs, as returned by `create_people_cluster`.
+    """
+    photo_ids = photos.photo_ids
+    photo_stamps = {
+        photo_id: embedding_stamp(embedding_hash, embedding_version)
+        for photo_id, embedding_hash, embedding_version
+        in zip(photo_ids.tolist(), photos.embedding_hashes.tolist(), photos.embedding_versions.tolist())
+    }
+    face_photo_ids = photo_ids[photos.face_photo_index]
+
+    state = None if full_recluster else ClusterState.load(state_path)
+    if state is not None and not state.is_compatible_with(photo_stamps):
+        logging.info("Clustered photos were removed or re-embedded since the last run. Re-clustering everything.")
+        state = None
+
+    if state is None:
+        state = ClusterState.fit(photos.embedding_matrix, face_photo_ids, photo_stamps)
+    else:
+        is_new = np.array([photo_id not in state.photo_stamps for photo_id in photo_ids.tolist()], dtype=bool)
+        new_faces = is_new[photos.face_photo_index]
+        state.assign(
+            photos.embedding_matrix[new_faces],
+            face_photo_ids[new_faces],
+            {photo_id: stamp for photo_id, stamp in photo_stamps.items() if photo_id not in state.photo_stamps}
+        )
+    state.save(state_path)
+
+    # Map the state's faces back onto the collection
+    photo_index = {photo_id: i for i, photo_id in enumerate(photo_ids.tolist())}
+    face_photo_index = np.array([photo_index[photo_id] for photo_id in state.face_photo_ids], dtype=np.int32)
+    return _people_clusters_from_labels(photos, state.labels, face_photo_index)
+
+
+def is_embedding_stale(photo: Photo) -> bool:
+    """
+    Checks whether a photo's stored face embeddings need to be (re)computed.
 
-        if not user_photos_doc.exists:
-            logging.warning(f"No user_photos document found for user {user_id}. Skipping.")
-            continue
+    Args:
+        photo (Photo): Photo loaded from Firestore.
 
-        # Retrieve the confirmed photos for the user
-        confirmed_photo_ids = set(user_photos_doc.to_dict().get('confirmed_photos', []))  # Set of confirmed photo IDs
+    Returns:
+        bool: True if the photo was never embedded or was embedded with a different model version.
+    """
+    return not photo.embedding_hash or photo.embedding_version != EMBEDDING_MODEL_VERSION
 
-        # Retrieve clustered photo IDs for the user from `people_clusters`
-        clustered_photo_ids = set(people_clusters.get(user_id, []))  # Set of clustered photo IDs for this user
-        
-        # Calculate intersection of confirmed and clustered photos to get predicted photos
-        predicted_photo_ids = clustered_photo_ids - confirmed_photo_ids.intersection(clustered_photo_ids)
+def _fetch_photo_for_embedding(photo_id: str, db: firestore.Client, force: bool = True, bucket=None, cache: ImageCache = None):
+    """
+    Looks up a photo document and downloads its blob if its embeddings need (re)computing.
 
-        # Update the `predicted_photos` field in `user_photos`
-        user_photos_ref.update({
-            'predicted_photos': list(predicted_photo_ids)
-        })
-        logging.info(f"Updated `predicted_photos` for user {user_id} with {len(predicted_photo_ids)} photos.")
+    Args:
+        photo_id (str): ID of the photo document.
+        db (firestore.Client): Firestore client.
+        force (bool): Download even if the stored stamp matches the current blob and model version.
+        bucket: Storage bucket to read from. Defaults to the app's Cloud Storage bucket.
+        cache (ImageCache): Local image cache to download through, if any.
 
-def add_face_embedding(photo_id: str, db: firestore.Client):
+    Returns:
+        Tuple[str | bytes, str] | None: The downloaded image (see `_download_blob`) and the blob's
+                                        content hash, or None if the photo should be skipped.
+    """
     doc_ref = db.collection('photos').document(photo_id)
     doc = doc_ref.get()
 
     if not doc.exists:
         logging.error(f"Photo document {photo_id} does not exist.")
-        return
+        return None
 
     data = doc.to_dict()
 
     firebase_file_path = data.get('file_path')
-    bucket = storage.bucket("photobomb-fc123.appspot.com")
-    blob = bucket.blob(firebase_file_path)
+    bucket = bucket or storage.bucket(BUCKET_NAME)
+    # get_blob only fetches the object metadata, which carries the content hash
+    blob = bucket.get_blob(firebase_file_path)
+    if blob is None:
+        logging.error(f"Blob {firebase_file_path} for photo {photo_id} does not exist.")
+        return None
+
+    content_hash = blob.md5_hash
+    if (
+        not force
+        and data.get('embedding_hash') == content_hash
+        and data.get('embedding_version') == EMBEDDING_MODEL_VERSION
+    ):
+        logging.info(f"Face embeddings for photo {photo_id} are up to date. Skipping.")
+        return None
+
+    return _download_blob(blob, cache), content_hash
+
+def _download_blob(blob, cache: ImageCache = None):
+    """
+    Downloads a blob through the image cache if one is given, returning the cached file's path.
+    Without a cache the blob is downloaded into memory and its bytes are returned, so the
+    image is decoded without a filesystem round-trip.
+    """
+    if cache is not None:
+        return cache.fetch(blob)
+    return blob.download_as_bytes()
+
+def _store_face_embeddings(photo_id: str, db: firestore.Client, face_encodings: List[np.ndarray], content_hash: str):
+    """Serializes face encodings onto a photo document along with their content hash and model version stamp."""
+    logging.info(f"Found {len(face_encodings)} face(s) in photo {photo_id}.")
+    db.collection('photos').document(photo_id).update({
+        'face_embeddings': encode_embeddings(face_encodings),
+        'embedding_hash': content_hash,
+        'embedding_version': EMBEDDING_MODEL_VERSION
+    })
+    logging.info(f"Replaced face embeddings for photo {photo_id}.")
 
-    local_path = os.path.join("downloaded_photos", os.path.basename(firebase_file_path))
-    blob.download_to_filename(local_path)
-        
-    image = face_recognition.load_image_file(local_path)
+def add_face_embedding(photo_id: str, db: firestore.Client, force: bool = True, bucket=None, cache: ImageCache = None) -> bool:
+    """
+    Computes face embeddings for a photo and stores them on its Firestore document,
+    stamped with the blob's content hash and the current model version.
+
+    Args:
+        photo_id (str): ID of the photo document.
+        db (firestore.Client): Firestore client.
+        force (bool): Recompute even if the stored stamp matches the current blob and model version.
+        bucket: Storage bucket to read from. Defaults to the app's Cloud Storage bucket.
+        cache (ImageCache): Local image cache to download through, if any.
+
+    Returns:
+        bool: True if the embeddings were (re)computed and written.
+    """
+    fetched = _fetch_photo_for_embedding(photo_id, db, force, bucket, cache)
+    if fetched is None:
+        return False
+    image_source, content_hash = fetched
+
+    image = load_image(image_source)
     # Compute face encodings
-    face_encodings = face_recognition.face_encodings(image)
-    face_embeddings = [encoding.tolist() for encoding in face_encodings]
-    logging.info(f"Found {len(face_embeddings)} face(s) in photo {photo_id}.")
-    face_embeddings_serialized = base64.b64encode(pickle.dumps(face_encodings)).decode('utf-8')
-    padding_needed = len(face_embeddings_serialized) % 4
-    if padding_needed != 0:
-        face_embeddings_serialized += "=" * (4 - padding_needed)
-    doc_ref.update({'face_embeddings': face_embeddings_serialized})
-    logging.info(f"Replaced face embeddings for photo {photo_id}.")
+    _, face_encodings = detect_and_encode(image)
+    _store_face_embeddings(photo_id, db, face_encodings, content_hash)
+    return True
+
+def add_face_embeddings(
+    photo_ids: List[str],
+    db: firestore.Client,
+    engine: FaceEncodingEngine,
+    force: Dict[str, bool] = None,
+    prefetcher: BlobPrefetcher = None,
+    bucket=None,
+    cache: ImageCache = None
+) -> Dict[str, Tuple[List[np.ndarray], str, str]]:
+    """
+    Computes face embeddings for many photos, encoding them on the engine's worker pool.
+
+    Photo documents are fetched and their blobs downloaded on the prefetcher's thread pool,
+    ahead of and concurrently with encoding; results are written back to Firestore as they complete,
+    and also returned so a loaded PhotoCollection can be patched with them (see
+    `PhotoCollection.update_embeddings`) instead of being reloaded.
+
+    Args:
+        photo_ids (List[str]): IDs of the photo documents to embed.
+        db (firestore.Client): Firestore client.
+        engine (FaceEncodingEngine): Pool to run detection and encoding on.
+        force (Dict[str, bool]): Per-photo `force` flag (see `add_face_embedding`). Defaults to True.
+        prefetcher (BlobPrefetcher): Download stage. Defaults to `BlobPrefetcher()`.
+        bucket: Storage bucket to read from. Defaults to the app's Cloud Storage bucket.
+        cache (ImageCache): Local image cache to download through, if any.
+
+    Returns:
+        Dict[str, Tuple[List[np.ndarray], str, str]]: Photo ID -> (face encodings, embedding hash,
+                                                      embedding version) for every photo written.
+    """
+    force = force or {}
+    prefetcher = prefetcher or BlobPrefetcher()
+    content_hashes = {}
+
+    def fetch(photo_id: str):
+        logging.info(f"Processing photo {photo_id} to replace face embeddings.")
+        return _fetch_photo_for_embedding(photo_id, db, force.get(photo_id, True), bucket, cache)
+
+    def jobs():
+        for photo_id, fetched in prefetcher.prefetch(fetch, photo_ids):
+            if fetched is None:
+                continue
+            image_source, content_hashes[photo_id] = fetched
+            yield photo_id, image_source
+
+    embeddings = {}
+    for photo_id, face_encodings in engine.encode_unordered(jobs()):
+        if face_encodings is None:
+            continue
+        content_hash = content_hashes.pop(photo_id)
+        _store_face_embeddings(photo_id, db, face_encodings, content_hash)
+        embeddings[photo_id] = (face_encodings, content_hash, EMBEDDING_MODEL_VERSION)
+    return embeddings
+
+def refresh_face_embeddings(
+    photos: PhotoCollection,
+    db: firestore.Client,
+    engine: FaceEncodingEngine,
+    prefetcher: BlobPrefetcher = None,
+    bucket=None,
+    cache: ImageCache = None,
+    full_refresh: bool = False,
+    verify_content: bool = False
+) -> Dict[str, Tuple[List[np.ndarray], str, str]]:
+    """
+    Re-encodes the photos whose embeddings are missing or stale and patches `photos` with the
+    results, so the catalogue reflects them without being reloaded.
+
+    Args:
+        photos (PhotoCollection): Catalogue loaded at the start of the run.
+        db (firestore.Client): Firestore client.
+        engine (FaceEncodingEngine): Pool to run detection and encoding on.
+        prefetcher (BlobPrefetcher): Download stage. Defaults to `BlobPrefetcher()`.
+        bucket: Storage bucket to read from. Defaults to the app's Cloud Storage bucket.
+        cache (ImageCache): Local image cache to download through, if any.
+        full_refresh (bool): Re-encode every photo.
+        verify_content (bool): Also re-encode up-to-date photos whose blob content hash changed.
 
-def add_user_face_embedding(uid: str, db: firestore.Client):
-    # Query `photos` collection to find the profile photo for this user
-    photos_ref = db.collection('photos').stream()
-    # query = photos_ref.where('author_id', '==', user.uid).where('is_account_photo', '==', True)
-    query = filter(lambda doc: doc.to_dict().get('is_account_photo', False) == True and doc.to_dict().get('author_id') == user.uid, )
-    profile_photo_docs = list(query)
-    profile_photos = [Photo.from_dict(doc) for doc in profile_photo_docs]
+    Returns:
+        Dict[str, Tuple[List[np.ndarray], str, str]]: The new embeddings, as from `add_face_embeddings`.
+    """
+    force = {}
+    for photo in photos:
+        stale = full_refresh or is_embedding_stale(photo)
+        if stale or verify_content:
+            force[photo.photo_id] = stale
+    embeddings = add_face_embeddings(list(force), db, engine, force, prefetcher, bucket, cache)
+    logging.info(f"Updated face embeddings for {len(embeddings)} of {len(photos)} photos.")
+
+    # Patch the loaded photos with the updated face embeddings rather than reloading them
+    if embeddings:
+        photos.update_embeddings(embeddings)
+        logging.info(f"Patched {len(embeddings)} photos with their new face embeddings.")
+    return embeddings
+
+def add_user_face_embedding(
+    uid: str,
+    db: firestore.Client,
+    engine: FaceEncodingEngine = None,
+    bucket=None,
+    cache: ImageCache = None,
+    photos: PhotoCollection = None
+):
+    if photos is not None:
+        # Served from the catalogue's author index, without a Firestore read
+        profile_photo = photos.account_photo(uid)
+        profile_photos = [profile_photo] if profile_photo is not None else []
+    else:
+        # Query `photos` for this user's profile photo; both filters are equalities, which
+        # Firestore serves from its single-field indexes, so this costs one small read per user
+        query = (
+            db.collection('photos')
+            .where('author_id', '==', uid)
+            .where('isAccountPhoto', '==', True)
+            .limit(1)
+        )
+        profile_photos = [Photo.from_dict(doc) for doc in query.stream()]
     
     # Check if any profile photos are found
     if not profile_photos:
@@ -168,38 +394,68 @@ def add_user_face_embedding(uid: str, db: firestore.Client):
     profile_photo = profile_photos[0]
     
     firebase_file_path = profile_photo.file_path
-    bucket = storage.bucket("photobomb-fc123.appspot.com")
-    blob = bucket.blob(firebase_file_path)
+    bucket = bucket or storage.bucket(BUCKET_NAME)
+    blob = bucket.get_blob(firebase_file_path)
+    if blob is None:
+        logging.error(f"Blob {firebase_file_path} for profile photo {profile_photo.photo_id} does not exist.")
+        return
     
-    # Download the photo to a local temporary file
-    local_path = os.path.join("downloaded_photos", os.path.basename(firebase_file_path))
-    blob.download_to_filename(local_path)
+    # Download the photo to the cache or into memory
+    image_source = _download_blob(blob, cache)
 
     # Process the image to compute face encodings
-    image = face_recognition.load_image_file(local_path)
-    face_encodings = face_recognition.face_encodings(image)
+    if engine is not None:
+        face_encodings = engine.encode(image_source)
+    else:
+        image = load_image(image_source)
+        _, face_encodings = detect_and_encode(image)
     
     if not face_encodings:
         logging.warning(f"No faces found in profile photo {profile_photo.photo_id} for user {uid}.")
         return
 
-        # Use the first face encoding as the user's primary face embedding
-        user_face_embedding = face_encodings[0]
+    # Use the first face encoding as the user's primary face embedding
+    user_face_embedding = face_encodings[0]
 
-    # Serialize the face embedding with pickle and base64 encoding
-    user_face_embedding_serialized = base64.b64encode(pickle.dumps(user_face_embedding)).decode('utf-8')
+    # Update the user's document with 'face_embedding' in the compact binary format
+    user_doc_ref = db.collection('users').document(uid)
+    user_doc_ref.update({'face_embedding': encode_embeddings([user_face_embedding])})
+    logging.info(f"Updated user {uid} with serialized primary face embedding.")
 
-    # Ensure padding in case base64 encoding needs it
-    padding_needed = len(user_face_embedding_serialized) % 4
-    if padding_needed != 0:
-        user_face_embedding_serialized += "=" * (4 - padding_needed)
+def migrate_legacy_embeddings(db: firestore.Client) -> int:
+    """
+    Rewrites photo and user embeddings still stored as base64-encoded pickles in the
+    compact binary format, without recomputing them. Stamps are left untouched.
 
-    # Update the user's document with 'face_embedding'
-    user_doc_ref = db.collection('users').document(user.uid)
-    user_doc_ref.update({'face_embedding': user_face_embedding_serialized})
-    logging.info(f"Updated user {user.uid} with serialized primary face embedding.")
+    Args:
+        db (firestore.Client): Firestore client.
 
-    #face_embeddings = pickle.loads(base64.b64decode(face_embeddings_serialized))
+    Returns:
+        int: Number of documents rewritten.
+    """
+    migrated = 0
+    for collection, field in (('photos', 'face_embeddings'), ('users', 'face_embedding')):
+        batch = db.batch()
+        pending = 0
+        for doc in db.collection(collection).stream():
+            value = doc.to_dict().get(field)
+            if not is_legacy(value):
+                continue
+            try:
+                batch.update(doc.reference, {field: encode_embeddings(decode_embeddings(value))})
+            except Exception as e:
+                logging.error(f"Failed to migrate {field} of {collection}/{doc.id}: {e}")
+                continue
+            pending += 1
+            if pending == 500:  # Firestore's per-batch write limit
+                batch.commit()
+                migrated += pending
+                batch, pending = db.batch(), 0
+        if pending:
+            batch.commit()
+            migrated += pending
+    logging.info(f"Migrated {migrated} document(s) to the compact embedding format.")
+    return migrated
 
 # def get_face_encodings(folder_path: str) -> tuple[List[np.ndarray], List[str]]: # local version
 #     """
@@ -240,7 +496,26 @@ def add_user_face_embedding(uid: str, db: firestore.Client):
 
 #     return encodings, file_paths
 
-def main():
+def main(
+    full_refresh: bool = False,
+    verify_content: bool = False,
+    workers: int = None,
+    max_pending: int = None,
+    download_workers: int = 4,
+    prefetch: int = 8,
+    bucket_dir: str = None,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    cache_max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+    max_detection_dimension: int = None,
+    max_decode_dimension: int = None,
+    detection_model: str = 'hog',
+    batch_size: int = 1,
+    migrate_embeddings: bool = False,
+    incremental_clustering: bool = False,
+    full_recluster: bool = False,
+    cluster_state_path: str = DEFAULT_STATE_PATH,
+    page_size: int = DEFAULT_PAGE_SIZE
+):
     """
     Main function to execute the server operations:
     - Initialize Firebase
@@ -249,6 +524,32 @@ def main():
     - Add face embeddings to users missing them
     - Perform clustering on face encodings
     - Handle known and unknown face encodings from local directories
+
+    Args:
+        full_refresh (bool): Re-encode every photo instead of only those with missing or stale embeddings.
+        verify_content (bool): Also check the blob content hash of already embedded photos and
+                               re-encode the ones whose image changed.
+        workers (int): Number of face encoding worker processes. Defaults to the number of CPUs.
+        max_pending (int): Maximum number of encoding batches (of `batch_size` photos) queued on
+                           the encoding pool at once. Defaults to twice the worker count.
+        download_workers (int): Number of concurrent blob downloads.
+        prefetch (int): Number of photos downloaded ahead of the encoder.
+        bucket_dir (str): Read blobs from this local directory instead of Cloud Storage.
+        cache_dir (str): Directory of the content-addressed image cache. If None, images are
+                         downloaded and decoded in memory without touching disk.
+        cache_max_bytes (int): Size cap of the image cache; least recently used images are evicted beyond it.
+        max_detection_dimension (int): Run face detection on images downscaled to this longest side.
+                                       Encodings are still computed at full resolution.
+        max_decode_dimension (int): Decode JPEGs at a reduced scale whose longest side is at least
+                                    this; faces are then detected and encoded at that size.
+        detection_model (str): Face detector to use, 'hog' or 'cnn'.
+        batch_size (int): Number of photos per encoding task; the CNN detector runs on them as a batch.
+        migrate_embeddings (bool): First rewrite legacy pickled embeddings in the compact format.
+        incremental_clustering (bool): Assign only new faces to the persisted cluster state
+                                       instead of re-running DBSCAN over every face.
+        full_recluster (bool): With incremental clustering, rebuild the cluster state from scratch.
+        cluster_state_path (str): File the incremental cluster state is persisted in.
+        page_size (int): Photo documents fetched per Firestore query when loading the catalogue.
     """
     # Initialize Firebase
     initialize_firebase()
@@ -256,8 +557,25 @@ def main():
     # Initialize Firestore client
     db = firestore.client()
 
+    engine = FaceEncodingEngine(
+        workers=workers,
+        max_pending=max_pending,
+        max_detection_dimension=max_detection_dimension,
+        detection_model=detection_model,
+        batch_size=batch_size,
+        # Letterbox similar-sized photos into 64px buckets so they share CNN batches
+        pad_to=64 if batch_size > 1 else None,
+        max_decode_dimension=max_decode_dimension
+    )
+    prefetcher = BlobPrefetcher(workers=download_workers, depth=prefetch)
+    bucket = LocalBucket(bucket_dir) if bucket_dir else None
+    cache = ImageCache(cache_dir, cache_max_bytes) if cache_dir else None
+
+    if migrate_embeddings:
+        migrate_legacy_embeddings(db)
+
     # Load all Photo objects from Firestore
-    photo_list = load_all_photos_from_firebase()
+    photo_list = load_photo_collection_from_firebase(db, page_size)
     logging.info(f"Retrieved {len(photo_list)} photos from Firestore.")
     print(photo_list)
 
@@ -273,25 +591,25 @@ def main():
     user_list = load_all_users_from_firebase()
     logging.info(f"Retrieved {len(user_list)} users from Firestore.")
     for user in user_list:
-        if not hasattr(user, 'face_embedding') or not user.face_embedding:
+        if getattr(user, 'face_embedding', None) is None:
             logging.info(f"User {user.uid} is missing a face embedding. Adding it now.")
-            add_user_face_embedding(user.uid, db)
+            add_user_face_embedding(user.uid, db, engine, bucket, cache, photos=photo_list)
 
     # for user in user_list:
-    #     user_photos = user.get_photo_class_objects()
+    #     user_photos = user.get_photo_class_objects(photo_list)
     #     logging.info(f"User '{user.email}' has {len(user_photos)} photos.")
 
     # Add face embeddings to photos missing them
-    for photo in photo_list:
-        logging.info(f"Processing photo {photo.photo_id} to replace face embeddings.")
-        add_face_embedding(photo.photo_id, db)
-
-    # Reload photos to include updated face embeddings
-    photo_list = load_all_photos_from_firebase()
-    logging.info(f"Reloaded {len(photo_list)} photos after adding face embeddings.")
+    with engine:
+        refresh_face_embeddings(photo_list, db, engine, prefetcher, bucket, cache, full_refresh, verify_content)
+    if cache is not None:
+        logging.info(f"Image cache: {cache.hits} hit(s), {cache.misses} miss(es), {cache.total_bytes} bytes on disk.")
 
     # Perform clustering on all photo encodings
-    people_clusters = create_people_cluster(photo_list)
+    if incremental_clustering:
+        people_clusters = update_people_cluster(photo_list, cluster_state_path, full_recluster)
+    else:
+        people_clusters = create_people_cluster(photo_list)
     logging.info(f"Created {len(people_clusters)} people clusters.")
 
      # Display clusters
@@ -317,4 +635,64 @@ def main():
     # logging.info(f"Retrieved {len(unknown_encodings)} unknown face encodings from {unknown_folder}.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="PhotoBomb batch embedding and clustering job.")
+    parser.add_argument("--full-refresh", action="store_true",
+                        help="Re-encode every photo instead of only missing or stale embeddings.")
+    parser.add_argument("--verify-content", action="store_true",
+                        help="Re-encode embedded photos whose blob content hash changed.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of face encoding worker processes (default: number of CPUs).")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Maximum number of encoding batches (of --batch-size photos) queued on the pool at once "
+                             "(default: twice the number of workers).")
+    parser.add_argument("--download-workers", type=int, default=4,
+                        help="Number of concurrent blob downloads.")
+    parser.add_argument("--prefetch", type=int, default=8,
+                        help="Number of photos downloaded ahead of the encoder.")
+    parser.add_argument("--bucket-dir", default=None,
+                        help="Read blobs from a local directory mirror of the bucket instead of Cloud Storage.")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help="Directory of the content-addressed image cache.")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // 1024 ** 2,
+                        help="Size cap of the image cache in MB.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Disable the image cache and decode downloaded images in memory.")
+    parser.add_argument("--max-detection-dimension", type=int, default=None,
+                        help="Run face detection on images downscaled to this longest side (default: full resolution).")
+    parser.add_argument("--max-decode-dimension", type=int, default=None,
+                        help="Decode JPEGs at reduced scale down to this longest side (default: full resolution).")
+    parser.add_argument("--detection-model", choices=["hog", "cnn"], default="hog",
+                        help="Face detector to use. Only the CNN detector runs batched.")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Number of photos per encoding task.")
+    parser.add_argument("--migrate-embeddings", action="store_true",
+                        help="Rewrite legacy pickled embeddings in the compact binary format before running.")
+    parser.add_argument("--incremental-clustering", action="store_true",
+                        help="Assign only new faces to the persisted cluster state instead of re-running DBSCAN.")
+    parser.add_argument("--full-recluster", action="store_true",
+                        help="With --incremental-clustering, rebuild the cluster state from scratch.")
+    parser.add_argument("--cluster-state", default=DEFAULT_STATE_PATH,
+                        help="File the incremental cluster state is persisted in.")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="Photo documents fetched per Firestore query when loading the catalogue.")
+    args = parser.parse_args()
+    main(
+        full_refresh=args.full_refresh,
+        verify_content=args.verify_content,
+        workers=args.workers,
+        max_pending=args.max_pending,
+        download_workers=args.download_workers,
+        prefetch=args.prefetch,
+        bucket_dir=args.bucket_dir,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        cache_max_bytes=args.cache_max_mb * 1024 ** 2,
+        max_detection_dimension=args.max_detection_dimension,
+        max_decode_dimension=args.max_decode_dimension,
+        detection_model=args.detection_model,
+        batch_size=args.batch_size,
+        migrate_embeddings=args.migrate_embeddings,
+        incremental_clustering=args.incremental_clustering,
+        full_recluster=args.full_recluster,
+        cluster_state_path=args.cluster_state,
+        page_size=args.page_size
+    )
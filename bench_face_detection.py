@@ -0,0 +1,83 @@
+# bench_face_detection.py
+#
+# Benchmarks downscale-before-detect against full-resolution detection on the sample photos.
+# For each max detection dimension it reports total detection+encoding time and recall
+# relative to full resolution (a face counts as found if a box overlaps it with IoU >= 0.5).
+#
+#   python bench_face_detection.py [photo_directory] [--sizes 2048 1600 1280 1024 800 640]
+#
+# Results on the 12 sample photos in photos/all_photos (HOG detector, one CPU core, images
+# from 912x679 to 4032x3024; "enc dist" is the mean distance between a face's encoding at
+# that size and at full resolution):
+#
+#    max dim  seconds  speedup  faces  recall  enc dist
+#       full   112.24     1.00     27   1.000    0.0000
+#       2048    47.55     2.36     27   1.000    0.0246
+#       1600    32.26     3.48     27   1.000    0.0305
+#       1280    21.63     5.19     26   0.963    0.0330
+#       1024    13.00     8.63     26   0.963    0.0337
+#        800     9.07    12.37     26   0.963    0.0371
+#        640     6.70    16.75     25   0.926    0.0364
+
+import os
+import time
+import argparse
+import numpy as np
+import face_recognition
+
+from face_detection import detect_and_encode
+
+def iou(a, b) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    intersection = max(bottom - top, 0) * max(right - left, 0)
+    area = lambda box: (box[2] - box[0]) * (box[1] - box[3])
+    union = area(a) + area(b) - intersection
+    return intersection / union if union else 0.0
+
+def run(images, max_dimension):
+    """Returns (seconds, locations per image, encodings per image) for one detection size."""
+    results = []
+    start = time.perf_counter()
+    for image in images:
+        results.append(detect_and_encode(image, max_dimension))
+    elapsed = time.perf_counter() - start
+    return elapsed, [r[0] for r in results], [r[1] for r in results]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark downscale-before-detect face detection.")
+    parser.add_argument("photo_directory", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "photos", "all_photos"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 1600, 1280, 1024, 800, 640])
+    args = parser.parse_args()
+
+    file_names = sorted(f for f in os.listdir(args.photo_directory) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+    images = [face_recognition.load_image_file(os.path.join(args.photo_directory, f)) for f in file_names]
+    print(f"Loaded {len(images)} images from {args.photo_directory}")
+
+    base_time, base_locations, base_encodings = run(images, None)
+    base_faces = sum(len(locations) for locations in base_locations)
+    print(f"{'max dim':>8} {'seconds':>8} {'speedup':>8} {'faces':>6} {'recall':>7} {'enc dist':>9}")
+    print(f"{'full':>8} {base_time:8.2f} {1.0:8.2f} {base_faces:6d} {1.0:7.3f} {0.0:9.4f}")
+
+    for size in args.sizes:
+        elapsed, locations, encodings = run(images, size)
+        found = 0
+        distances = []
+        for image_index, reference in enumerate(base_locations):
+            for face_index, box in enumerate(reference):
+                overlaps = [iou(box, other) for other in locations[image_index]]
+                if overlaps and max(overlaps) >= 0.5:
+                    found += 1
+                    match = int(np.argmax(overlaps))
+                    distances.append(np.linalg.norm(
+                        base_encodings[image_index][face_index] - encodings[image_index][match]
+                    ))
+        recall = found / base_faces if base_faces else 1.0
+        mean_distance = float(np.mean(distances)) if distances else 0.0
+        faces = sum(len(l) for l in locations)
+        print(f"{size:8d} {elapsed:8.2f} {base_time / elapsed:8.2f} {faces:6d} {recall:7.3f} {mean_distance:9.4f}")
+
+if __name__ == "__main__":
+    main()
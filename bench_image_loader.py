@@ -0,0 +1,57 @@
+# bench_image_loader.py
+#
+# Benchmarks image_loader (JPEG draft-mode decoding, EXIF orientation) against
+# face_recognition.load_image_file on the sample photos. For each decode size it reports total
+# decode time, speedup and decoded megapixels; with --detect it also runs face detection at
+# the same size and reports how many faces are found.
+#
+#   python bench_image_loader.py [photo_directory] [--sizes 2048 1600 1280 1024 800 640] [--detect]
+
+import os
+import time
+import argparse
+import face_recognition
+
+from face_detection import detect_face_locations
+from image_loader import load_image
+
+def run(paths, load, detect=False, detect_dimension=None):
+    """Returns (seconds, megapixels decoded, faces found or None) for one loader."""
+    pixels = 0
+    faces = 0 if detect else None
+    elapsed = 0.0
+    for path in paths:
+        start = time.perf_counter()
+        image = load(path)
+        elapsed += time.perf_counter() - start
+        pixels += image.shape[0] * image.shape[1]
+        if faces is not None:
+            faces += len(detect_face_locations(image, detect_dimension))
+    return elapsed, pixels / 1e6, faces
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark JPEG draft-mode image loading.")
+    parser.add_argument("photo_directory", nargs="?",
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "photos", "all_photos"))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[2048, 1600, 1280, 1024, 800, 640])
+    parser.add_argument("--detect", action="store_true",
+                        help="Also count faces detected at each size (detection time is not included).")
+    args = parser.parse_args()
+
+    file_names = sorted(f for f in os.listdir(args.photo_directory) if f.lower().endswith(('.png', '.jpg', '.jpeg')))
+    paths = [os.path.join(args.photo_directory, f) for f in file_names]
+    print(f"Benchmarking {len(paths)} images from {args.photo_directory}")
+
+    print(f"{'loader':>22} {'seconds':>8} {'speedup':>8} {'MPix':>8} {'faces':>6}")
+    base_time, base_pixels, base_faces = run(paths, face_recognition.load_image_file, args.detect)
+    print(f"{'load_image_file':>22} {base_time:8.2f} {1.0:8.2f} {base_pixels:8.1f} {base_faces if args.detect else '-':>6}")
+
+    elapsed, pixels, faces = run(paths, load_image, args.detect)
+    print(f"{'image_loader full':>22} {elapsed:8.2f} {base_time / elapsed:8.2f} {pixels:8.1f} {faces if args.detect else '-':>6}")
+
+    for size in args.sizes:
+        elapsed, pixels, faces = run(paths, lambda path: load_image(path, size), args.detect, size)
+        print(f"{'image_loader ' + str(size):>22} {elapsed:8.2f} {base_time / elapsed:8.2f} {pixels:8.1f} {faces if args.detect else '-':>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# blob_downloader.py
+
+import os
+import base64
+import hashlib
+import shutil
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+_EXHAUSTED = object()
+
+class BlobPrefetcher:
+    """
+    Runs a blocking fetch (e.g. a blob download) for a stream of items on a thread pool,
+    keeping up to `depth` items in flight ahead of the consumer.
+
+    Results are yielded in input order, so while the consumer is busy with one item
+    (e.g. encoding it) the next `depth` downloads are already running.
+    """
+
+    def __init__(self, workers: int = 4, depth: int = 8):
+        """
+        Args:
+            workers (int): Number of concurrent downloads.
+            depth (int): Number of items fetched ahead of the consumer. At least `workers`.
+        """
+        self.workers = workers
+        self.depth = max(depth, workers)
+
+    def prefetch(self, fetch: Callable[[T], R], items: Iterable[T]) -> Iterator[Tuple[T, Optional[R]]]:
+        """
+        Applies `fetch` to each item in the background.
+
+        Args:
+            fetch (Callable[[T], R]): Blocking function to run for each item.
+            items (Iterable[T]): Items to fetch. Consumed lazily.
+
+        Yields:
+            Tuple[T, Optional[R]]: Each item with its fetch result, or None if the fetch raised.
+        """
+        items = iter(items)
+        in_flight = deque()
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            for item in items:
+                in_flight.append((item, executor.submit(fetch, item)))
+                if len(in_flight) >= self.depth:
+                    break
+
+            while in_flight:
+                item, future = in_flight.popleft()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Failed to fetch {item}: {e}")
+                    result = None
+
+                # Refill the window before handing the result over so downloads keep running
+                next_item = next(items, _EXHAUSTED)
+                if next_item is not _EXHAUSTED:
+                    in_flight.append((next_item, executor.submit(fetch, next_item)))
+
+                yield item, result
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+class LocalBlob:
+    """Minimal stand-in for `google.cloud.storage.Blob` backed by a local file."""
+
+    def __init__(self, bucket: 'LocalBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+        self.path = os.path.join(bucket.root, name)
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    @property
+    def size(self) -> int:
+        return os.path.getsize(self.path)
+
+    @property
+    def generation(self) -> int:
+        return os.stat(self.path).st_mtime_ns
+
+    @property
+    def md5_hash(self) -> str:
+        """Base64-encoded MD5 digest, matching the format Cloud Storage reports."""
+        digest = hashlib.md5()
+        with open(self.path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        return base64.b64encode(digest.digest()).decode('utf-8')
+
+    def reload(self):
+        if not self.exists():
+            raise FileNotFoundError(self.path)
+
+    def download_to_filename(self, filename: str):
+        shutil.copyfile(self.path, filename)
+
+    def download_as_bytes(self) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+class LocalBucket:
+    """
+    Minimal stand-in for `google.cloud.storage.Bucket` backed by a directory, where
+    blob names are paths relative to `root`. Lets the batch pipeline run offline.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.name = os.path.basename(os.path.normpath(root))
+
+    def blob(self, name: str) -> LocalBlob:
+        return LocalBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[LocalBlob]:
+        blob = LocalBlob(self, name)
+        return blob if blob.exists() else None
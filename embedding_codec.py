@@ -0,0 +1,103 @@
+# embedding_codec.py
+
+import io
+import base64
+import pickle
+import struct
+import logging
+from typing import Iterable, Union
+
+import numpy as np
+
+EMBEDDING_DIMENSION = 128
+
+# Compact format: an 11-byte header followed by an N x D little-endian float matrix.
+#   magic (3s) | format version (B) | dtype code (B) | dimension (H) | count (I)
+_MAGIC = b'PBE'
+_FORMAT_VERSION = 1
+_HEADER = struct.Struct('<3sBBHI')
+_DTYPES = {1: np.dtype('<f4'), 2: np.dtype('<f2')}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+
+# Only the globals numpy needs to rebuild pickled arrays may be loaded from legacy values
+_LEGACY_PICKLE_GLOBALS = {
+    ('numpy.core.multiarray', '_reconstruct'),
+    ('numpy._core.multiarray', '_reconstruct'),
+    ('numpy.core.multiarray', 'scalar'),
+    ('numpy._core.multiarray', 'scalar'),
+    ('numpy', 'ndarray'),
+    ('numpy', 'dtype'),
+}
+
+class _LegacyUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) not in _LEGACY_PICKLE_GLOBALS:
+            raise pickle.UnpicklingError(f"Refusing to load {module}.{name} from a legacy embedding.")
+        return super().find_class(module, name)
+
+def _empty() -> np.ndarray:
+    return np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+
+def encode_embeddings(encodings: Iterable[np.ndarray], dtype: str = 'float32') -> bytes:
+    """
+    Packs face encodings into the compact binary format stored in Firestore.
+
+    Args:
+        encodings (Iterable[np.ndarray]): 128-d encodings, or an N x 128 matrix.
+        dtype (str): 'float32', or 'float16' to halve the size at ~1e-3 precision.
+
+    Returns:
+        bytes: Header followed by the packed matrix.
+    """
+    matrix = np.asarray(encodings if isinstance(encodings, np.ndarray) else list(encodings))
+    matrix = _empty() if matrix.size == 0 else matrix.reshape(-1, matrix.shape[-1])
+    matrix = np.ascontiguousarray(matrix, dtype=np.dtype(dtype).newbyteorder('<'))
+    header = _HEADER.pack(_MAGIC, _FORMAT_VERSION, _DTYPE_CODES[matrix.dtype], matrix.shape[1], matrix.shape[0])
+    return header + matrix.tobytes()
+
+def is_compact(value) -> bool:
+    """Checks whether a stored value is in the compact binary format."""
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[:3]) == _MAGIC
+
+def decode_embeddings(value: Union[bytes, str, list, None]) -> np.ndarray:
+    """
+    Decodes stored face embeddings into an N x 128 float32 matrix.
+
+    Reads the compact format as well as the legacy representations still found in Firestore:
+    base64-encoded pickles of a single array or a list of arrays, and plain lists of floats.
+
+    Args:
+        value: Stored `face_embeddings` / `face_embedding` field value.
+
+    Returns:
+        np.ndarray: N x 128 float32 matrix (N may be 0).
+    """
+    if value is None or len(value) == 0:
+        return _empty()
+
+    if is_compact(value):
+        _, version, dtype_code, dimension, count = _HEADER.unpack_from(value)
+        if version != _FORMAT_VERSION:
+            raise ValueError(f"Unsupported embedding format version {version}.")
+        matrix = np.frombuffer(value, dtype=_DTYPES[dtype_code], count=count * dimension, offset=_HEADER.size)
+        return matrix.reshape(count, dimension).astype(np.float32)
+
+    if isinstance(value, str):
+        # Short placeholder strings predate the pickled format and never held any embeddings
+        if len(value) <= 13:
+            return _empty()
+        padding_needed = len(value) % 4
+        if padding_needed != 0:
+            value += "=" * (4 - padding_needed)
+        value = _LegacyUnpickler(io.BytesIO(base64.b64decode(value))).load()
+
+    matrix = np.asarray(value, dtype=np.float32)
+    if matrix.size == 0:
+        return _empty()
+    return matrix.reshape(-1, EMBEDDING_DIMENSION)
+
+def is_legacy(value) -> bool:
+    """Checks whether a stored value holds embeddings in a legacy (pickled or list) format."""
+    if value is None or is_compact(value):
+        return False
+    return len(value) > 0
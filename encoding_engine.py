@@ -0,0 +1,186 @@
+# encoding_engine.py
+
+import os
+import logging
+from concurrent.futures import ProcessPoolExecutor, Future, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from image_loader import load_image
+
+# Set in each worker process by `_init_worker`
+_face_recognition = None
+_face_detection = None
+_detection_options = {}
+_max_decode_dimension = None
+
+def _init_worker(detection_options: dict = None, max_decode_dimension: int = None):
+    """
+    Worker initializer. Importing face_recognition loads the dlib HOG detector,
+    landmark predictor and ResNet encoder, so this happens exactly once per worker.
+
+    Args:
+        detection_options (dict): Keyword arguments for `face_detection.batch_detect_and_encode`.
+        max_decode_dimension (int): Longest side JPEGs are decoded at (see `image_loader.decode_image`).
+    """
+    global _face_recognition, _face_detection, _detection_options, _max_decode_dimension
+    import face_recognition
+    import face_detection
+    _face_recognition = face_recognition
+    _face_detection = face_detection
+    _detection_options = detection_options or {}
+    _max_decode_dimension = max_decode_dimension
+
+def _encode_batch(sources: list) -> List[Optional[List[np.ndarray]]]:
+    """
+    Loads a batch of images and returns the encodings of every face found in each,
+    with None for images that could not be decoded.
+    """
+    images = []
+    for source in sources:
+        try:
+            images.append(load_image(source, _max_decode_dimension))
+        except Exception as e:
+            logging.error(f"Failed to load image: {e}")
+            images.append(None)
+
+    loaded = [image for image in images if image is not None]
+    results = iter(_face_detection.batch_detect_and_encode(loaded, **_detection_options))
+    return [None if image is None else next(results)[1] for image in images]
+
+class FaceEncodingEngine:
+    """
+    Process pool that runs face detection and encoding off the main process.
+
+    Jobs are `(key, source)` pairs where `source` is a file path or the image's encoded
+    bytes (see `image_loader.load_image`). Downloads and Firestore access stay in the caller's
+    process; only the CPU-bound decode/detect/encode work is shipped to the workers.
+
+    Jobs are shipped to the workers in batches of `batch_size`, which amortises the
+    per-task overhead and lets the CNN detector run on batches of images
+    (see `face_detection.batch_detect_face_locations`).
+
+    Usage:
+        with FaceEncodingEngine(workers=8) as engine:
+            for photo_id, encodings in engine.encode_unordered(jobs):
+                ...
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        max_pending: int = None,
+        max_detection_dimension: int = None,
+        detection_model: str = 'hog',
+        batch_size: int = 1,
+        pad_to: int = None,
+        max_decode_dimension: int = None
+    ):
+        """
+        Args:
+            workers (int): Number of worker processes. Defaults to the number of CPUs.
+            max_pending (int): Maximum number of batches submitted but not yet collected.
+                               Defaults to twice the worker count.
+            max_detection_dimension (int): Longest image side to run face detection at
+                                           (see `face_detection.detect_face_locations`).
+            detection_model (str): 'hog' or 'cnn'. Only the CNN detector runs batched.
+            batch_size (int): Number of images per worker task.
+            pad_to (int): Letterbox granularity for batched CNN detection.
+            max_decode_dimension (int): Decode JPEGs at reduced scale down to this longest side;
+                                        faces are then also encoded at that size.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.workers * 2
+        self.batch_size = max(batch_size, 1)
+        self.detection_options = {
+            'max_dimension': max_detection_dimension,
+            'model': detection_model,
+            'batch_size': self.batch_size,
+            'pad_to': pad_to
+        }
+        self.max_decode_dimension = max_decode_dimension
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.detection_options, self.max_decode_dimension)
+            )
+            logging.info(f"Started face encoding engine with {self.workers} worker(s).")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self) -> 'FaceEncodingEngine':
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def encode(self, source) -> List[np.ndarray]:
+        """Encodes a single image on the pool and waits for the result."""
+        self.start()
+        encodings = self._executor.submit(_encode_batch, [source]).result()[0]
+        if encodings is None:
+            raise ValueError("Failed to load image.")
+        return encodings
+
+    def encode_unordered(self, jobs: Iterable[Tuple[str, object]]) -> Iterator[Tuple[str, Optional[List[np.ndarray]]]]:
+        """
+        Encodes images on the pool, yielding results in completion order.
+
+        The `jobs` iterable is consumed lazily and at most `max_pending` batches are in
+        flight at once, so a slow producer (e.g. one downloading each image) overlaps
+        with encoding and memory stays bounded.
+
+        Args:
+            jobs (Iterable[Tuple[str, object]]): `(key, source)` pairs.
+
+        Yields:
+            Tuple[str, Optional[List[np.ndarray]]]: The job key and its face encodings,
+                                                   or None if the job failed.
+        """
+        self.start()
+        pending: Dict[Future, List[str]] = {}
+        keys, sources = [], []
+
+        for key, source in jobs:
+            keys.append(key)
+            sources.append(source)
+            if len(keys) < self.batch_size:
+                continue
+            yield from self._submit(pending, keys, sources)
+            keys, sources = [], []
+
+        if keys:
+            yield from self._submit(pending, keys, sources)
+        while pending:
+            yield from self._collect(pending)
+
+    def _submit(self, pending: Dict[Future, List[str]], keys: List[str], sources: list) -> Iterator[Tuple[str, Optional[List[np.ndarray]]]]:
+        """Submits a batch once fewer than `max_pending` are in flight, yielding any results collected while waiting."""
+        if len(pending) >= self.max_pending:
+            yield from self._collect(pending)
+        pending[self._executor.submit(_encode_batch, sources)] = keys
+
+    @staticmethod
+    def _collect(pending: Dict[Future, List[str]]) -> Iterator[Tuple[str, Optional[List[np.ndarray]]]]:
+        """Waits for at least one pending batch and yields the results of every finished one."""
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            keys = pending.pop(future)
+            try:
+                results = future.result()
+            except Exception as e:
+                logging.error(f"Failed to encode faces for {', '.join(keys)}: {e}")
+                results = [None] * len(keys)
+            for key, encodings in zip(keys, results):
+                if encodings is None:
+                    logging.error(f"Failed to encode faces for {key}.")
+                yield key, encodings
@@ -0,0 +1,178 @@
+# face_detection.py
+
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+import face_recognition
+from PIL import Image
+
+# Longest image side, in pixels, that face detection runs at. None detects at full resolution.
+DEFAULT_MAX_DETECTION_DIMENSION = None
+
+FaceLocation = Tuple[int, int, int, int]  # (top, right, bottom, left), as returned by face_recognition
+
+def detection_scale(height: int, width: int, max_dimension: Optional[int]) -> float:
+    """Returns the factor an image must be scaled by so its longest side fits `max_dimension`."""
+    if not max_dimension or max(height, width) <= max_dimension:
+        return 1.0
+    return max_dimension / max(height, width)
+
+def rescale_locations(locations: List[FaceLocation], scale: float, height: int, width: int) -> List[FaceLocation]:
+    """
+    Maps face boxes found on an image scaled by `scale` back to the original image's coordinates,
+    clamped to its bounds.
+    """
+    rescaled = []
+    for top, right, bottom, left in locations:
+        rescaled.append((
+            max(int(round(top / scale)), 0),
+            min(int(round(right / scale)), width),
+            min(int(round(bottom / scale)), height),
+            max(int(round(left / scale)), 0)
+        ))
+    return rescaled
+
+def to_original_locations(locations: List[FaceLocation], image_shape: Tuple[int, ...], original_size: Tuple[int, int]) -> List[FaceLocation]:
+    """
+    Maps face boxes found on a reduced decode of an image (see image_loader.decode_image) back to
+    the coordinates of the image at its original `(height, width)`.
+    """
+    height, width = original_size
+    if tuple(image_shape[:2]) == (height, width):
+        return locations
+    return rescale_locations(locations, max(image_shape[:2]) / max(height, width), height, width)
+
+def downscale(image: np.ndarray, scale: float) -> np.ndarray:
+    """Resizes an RGB image array by `scale`."""
+    if scale == 1.0:
+        return image
+    height, width = image.shape[:2]
+    size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+    return np.asarray(Image.fromarray(image).resize(size, Image.BILINEAR))
+
+def detect_face_locations(
+    image: np.ndarray,
+    max_dimension: Optional[int] = DEFAULT_MAX_DETECTION_DIMENSION,
+    model: str = 'hog',
+    number_of_times_to_upsample: int = 1
+) -> List[FaceLocation]:
+    """
+    Detects faces on a copy of the image downscaled so its longest side is at most `max_dimension`,
+    returning the boxes in the original image's coordinates.
+
+    Args:
+        image (np.ndarray): RGB image array.
+        max_dimension (int): Longest side to run detection at. None detects at full resolution.
+        model (str): 'hog' or 'cnn'.
+        number_of_times_to_upsample (int): Passed through to `face_recognition.face_locations`.
+
+    Returns:
+        List[FaceLocation]: Face boxes as (top, right, bottom, left) in original coordinates.
+    """
+    height, width = image.shape[:2]
+    scale = detection_scale(height, width, max_dimension)
+    locations = face_recognition.face_locations(downscale(image, scale), number_of_times_to_upsample, model)
+    if scale != 1.0:
+        logging.debug(f"Detected {len(locations)} face(s) at {scale:.3f}x of {width}x{height}.")
+    return rescale_locations(locations, scale, height, width)
+
+def detect_and_encode(
+    image: np.ndarray,
+    max_dimension: Optional[int] = DEFAULT_MAX_DETECTION_DIMENSION,
+    model: str = 'hog'
+) -> Tuple[List[FaceLocation], List[np.ndarray]]:
+    """
+    Detects faces (optionally on a downscaled copy, see `detect_face_locations`) and computes
+    their encodings on the full-resolution image.
+
+    Returns:
+        Tuple[List[FaceLocation], List[np.ndarray]]: Face locations and their 128-d encodings.
+    """
+    face_locations = detect_face_locations(image, max_dimension, model)
+    face_encodings = face_recognition.face_encodings(image, face_locations)
+    return face_locations, face_encodings
+
+def _letterbox(image: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Pads an image with black on the bottom and right to `height` x `width`."""
+    if image.shape[:2] == (height, width):
+        return image
+    padded = np.zeros((height, width) + image.shape[2:], dtype=image.dtype)
+    padded[:image.shape[0], :image.shape[1]] = image
+    return padded
+
+def batch_detect_face_locations(
+    images: List[np.ndarray],
+    max_dimension: Optional[int] = DEFAULT_MAX_DETECTION_DIMENSION,
+    model: str = 'hog',
+    batch_size: int = 32,
+    pad_to: Optional[int] = None,
+    number_of_times_to_upsample: int = 1
+) -> List[List[FaceLocation]]:
+    """
+    Detects faces in many images, running the CNN detector on batches of same-size images.
+
+    dlib only batches the CNN detector, and only over images of identical size. Images are
+    downscaled as in `detect_face_locations`, then grouped by shape; with `pad_to` set, each
+    image is letterboxed (padded bottom/right) up to the next multiple of `pad_to` so images
+    of similar size share a batch. The HOG detector has no batch mode, so with `model='hog'`
+    this falls back to detecting one image at a time.
+
+    Args:
+        images (List[np.ndarray]): RGB image arrays.
+        max_dimension (int): Longest side to run detection at. None detects at full resolution.
+        model (str): 'hog' or 'cnn'.
+        batch_size (int): Maximum number of images per detector call.
+        pad_to (int): Letterbox granularity in pixels. None only batches identically sized images.
+        number_of_times_to_upsample (int): Passed through to the detector.
+
+    Returns:
+        List[List[FaceLocation]]: Face boxes per image, in each original image's coordinates.
+    """
+    if model != 'cnn':
+        return [detect_face_locations(image, max_dimension, model, number_of_times_to_upsample) for image in images]
+
+    scales = []
+    groups = {}  # detection shape -> indexes of images detected at that shape
+    scaled_images = []
+    for index, image in enumerate(images):
+        height, width = image.shape[:2]
+        scale = detection_scale(height, width, max_dimension)
+        scaled = downscale(image, scale)
+        shape = scaled.shape[:2]
+        if pad_to:
+            shape = tuple(-(-side // pad_to) * pad_to for side in shape)
+        scales.append(scale)
+        scaled_images.append(scaled)
+        groups.setdefault(shape, []).append(index)
+
+    results: List[List[FaceLocation]] = [[] for _ in images]
+    for (height, width), indexes in groups.items():
+        for start in range(0, len(indexes), batch_size):
+            chunk = indexes[start:start + batch_size]
+            batch = [_letterbox(scaled_images[i], height, width) for i in chunk]
+            batch_locations = face_recognition.batch_face_locations(batch, number_of_times_to_upsample, len(batch))
+            for i, locations in zip(chunk, batch_locations):
+                # Padding is only ever added bottom/right, so boxes need no shift; the
+                # final rescale clamps any that reach into it
+                original_height, original_width = images[i].shape[:2]
+                results[i] = rescale_locations(locations, scales[i], original_height, original_width)
+        logging.debug(f"Detected faces in {len(indexes)} image(s) batched at {width}x{height}.")
+    return results
+
+def batch_detect_and_encode(
+    images: List[np.ndarray],
+    max_dimension: Optional[int] = DEFAULT_MAX_DETECTION_DIMENSION,
+    model: str = 'hog',
+    batch_size: int = 32,
+    pad_to: Optional[int] = None
+) -> List[Tuple[List[FaceLocation], List[np.ndarray]]]:
+    """
+    Batched counterpart of `detect_and_encode`: detects faces with `batch_detect_face_locations`
+    and computes each image's encodings at full resolution.
+    """
+    all_locations = batch_detect_face_locations(images, max_dimension, model, batch_size, pad_to)
+    return [
+        (locations, face_recognition.face_encodings(image, locations))
+        for image, locations in zip(images, all_locations)
+    ]
@@ -0,0 +1,225 @@
+# fake_firestore.py
+#
+# In-memory stand-in for the parts of the Firestore client the batch server uses, so loaders
+# and writers can be tested without a Firebase project. Counts documents read and written and
+# the number of round-trips (each stream/get/get_all/commit/update/set call is one).
+
+import copy
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+DOCUMENT_ID = '__name__'
+
+class FakeDocumentSnapshot:
+
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[dict]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+class FakeDocumentReference:
+
+    def __init__(self, collection: 'FakeCollection', doc_id: str):
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def _client(self) -> 'FakeFirestore':
+        return self._collection._client
+
+    def _snapshot(self) -> FakeDocumentSnapshot:
+        data = self._collection._documents.get(self.id)
+        self._client.reads += 1
+        return FakeDocumentSnapshot(self, data)
+
+    def get(self) -> FakeDocumentSnapshot:
+        self._client.requests += 1
+        return self._snapshot()
+
+    def set(self, data: dict, merge: bool = False):
+        self._client.requests += 1
+        self._apply_set(data, merge)
+
+    def update(self, data: dict):
+        self._client.requests += 1
+        self._apply_update(data)
+
+    def _apply_set(self, data: dict, merge: bool = False):
+        documents = self._collection._documents
+        if merge and self.id in documents:
+            documents[self.id].update(copy.deepcopy(data))
+        else:
+            documents[self.id] = copy.deepcopy(data)
+        self._client.writes += 1
+
+    def _apply_update(self, data: dict):
+        documents = self._collection._documents
+        if self.id not in documents:
+            raise KeyError(f"No document to update: {self._collection.name}/{self.id}")
+        document = documents[self.id]
+        for field, value in data.items():
+            document[field] = _apply_transform(document.get(field), value)
+        self._client.writes += 1
+
+def _apply_transform(current: Any, value: Any) -> Any:
+    """Applies Firestore array transforms (ArrayUnion / ArrayRemove, matched by name) or plain values."""
+    transform = type(value).__name__
+    if transform == 'ArrayUnion':
+        result = list(current or [])
+        result.extend(item for item in value.values if item not in result)
+        return result
+    if transform == 'ArrayRemove':
+        return [item for item in (current or []) if item not in value.values]
+    return copy.deepcopy(value)
+
+class FakeQuery:
+
+    def __init__(self, collection: 'FakeCollection', filters=(), order=None, limit=None, start_after=None, projection=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+        self._start_after = start_after
+        self._projection = projection
+
+    def _copy(self, **changes) -> 'FakeQuery':
+        fields = dict(filters=self._filters, order=self._order, limit=self._limit,
+                      start_after=self._start_after, projection=self._projection)
+        fields.update(changes)
+        return FakeQuery(self._collection, **fields)
+
+    def where(self, field: str, op: str, value: Any) -> 'FakeQuery':
+        if op not in ('==', 'in', 'array_contains'):
+            raise ValueError(f"Unsupported operator {op}")
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def select(self, fields: Iterable[str]) -> 'FakeQuery':
+        return self._copy(projection=[field for field in fields if field != DOCUMENT_ID])
+
+    def order_by(self, field: str) -> 'FakeQuery':
+        return self._copy(order=field)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot: FakeDocumentSnapshot) -> 'FakeQuery':
+        return self._copy(start_after=snapshot)
+
+    def _sort_key(self, doc_id: str, data: dict):
+        return doc_id if self._order in (None, DOCUMENT_ID) else (data.get(self._order), doc_id)
+
+    def _matches(self, doc_id: str, data: dict) -> bool:
+        for field, op, value in self._filters:
+            actual = doc_id if field == DOCUMENT_ID else data.get(field)
+            if op == '==' and actual != value:
+                return False
+            if op == 'in' and actual not in value:
+                return False
+            if op == 'array_contains' and value not in (actual or []):
+                return False
+        return True
+
+    def stream(self) -> Iterator[FakeDocumentSnapshot]:
+        client = self._collection._client
+        client.requests += 1
+        documents = self._collection._documents
+        matching = sorted(
+            (doc_id for doc_id, data in documents.items() if self._matches(doc_id, data)),
+            key=lambda doc_id: self._sort_key(doc_id, documents[doc_id])
+        )
+        if self._start_after is not None:
+            cursor = self._sort_key(self._start_after.id, self._start_after._data or {})
+            matching = [doc_id for doc_id in matching if self._sort_key(doc_id, documents[doc_id]) > cursor]
+        if self._limit is not None:
+            matching = matching[:self._limit]
+        for doc_id in matching:
+            snapshot = self._collection.document(doc_id)._snapshot()
+            if self._projection is not None:
+                snapshot._data = {field: snapshot._data[field] for field in self._projection if field in snapshot._data}
+            yield snapshot
+
+    def get(self) -> List[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+class FakeCollection(FakeQuery):
+
+    def __init__(self, client: 'FakeFirestore', name: str):
+        self._client = client
+        self.name = name
+        self._documents: Dict[str, dict] = {}
+        super().__init__(self)
+
+    def document(self, doc_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self, doc_id)
+
+class FakeWriteBatch:
+    """Buffers writes and applies them in one round-trip on `commit`, with Firestore's 500-write limit."""
+
+    MAX_WRITES = 500
+
+    def __init__(self, client: 'FakeFirestore'):
+        self._client = client
+        self._writes = []
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def _add(self, write):
+        if len(self._writes) >= self.MAX_WRITES:
+            raise ValueError(f"A batch can hold at most {self.MAX_WRITES} writes.")
+        self._writes.append(write)
+
+    def set(self, reference: FakeDocumentReference, data: dict, merge: bool = False):
+        self._add(lambda: reference._apply_set(data, merge))
+
+    def update(self, reference: FakeDocumentReference, data: dict):
+        self._add(lambda: reference._apply_update(data))
+
+    def commit(self):
+        self._client.requests += 1
+        self._client.commits += 1
+        for write in self._writes:
+            write()
+        self._writes = []
+
+class FakeFirestore:
+    """
+    Usage:
+        db = FakeFirestore({'photos': {'photo1': {'file_path': ..., 'author_id': ...}}})
+        photos = load_all_photos_from_firebase(db=db)
+    """
+
+    def __init__(self, collections: Dict[str, Dict[str, dict]] = None):
+        self._collections: Dict[str, FakeCollection] = {}
+        self.reads = 0
+        self.writes = 0
+        self.requests = 0
+        self.commits = 0
+        for name, documents in (collections or {}).items():
+            self.collection(name)._documents.update(copy.deepcopy(documents))
+
+    def collection(self, name: str) -> FakeCollection:
+        if name not in self._collections:
+            self._collections[name] = FakeCollection(self, name)
+        return self._collections[name]
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def get_all(self, references: Iterable[FakeDocumentReference]) -> Iterator[FakeDocumentSnapshot]:
+        self.requests += 1
+        for reference in list(references):
+            yield reference._snapshot()
+
+    def data(self, collection: str) -> Dict[str, dict]:
+        """Current contents of a collection, for assertions."""
+        return copy.deepcopy(self.collection(collection)._documents)
@@ -0,0 +1,111 @@
+# image_cache.py
+
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join("downloaded_photos", "cache")
+DEFAULT_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+class ImageCache:
+    """
+    Content-addressed on-disk cache of downloaded blobs with a size cap and LRU eviction.
+
+    Entries are keyed by the blob's storage path plus its generation and MD5, so blobs that
+    share a basename never collide and an overwritten blob is fetched again. Recency is
+    tracked through file modification times, which lets the LRU order survive restarts.
+    The cap should comfortably exceed the number of images in flight in the pipeline.
+    """
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        Args:
+            directory (str): Directory holding the cached files.
+            max_bytes (int): Total size above which least recently used entries are evicted.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuilds the LRU index from the files already in the cache directory."""
+        found = []
+        for dirpath, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                if filename.endswith('.part'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                stat = os.stat(path)
+                found.append((stat.st_mtime_ns, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._total_bytes += size
+        logging.info(f"Image cache at {self.directory} holds {len(self._entries)} file(s), {self._total_bytes} bytes.")
+
+    @staticmethod
+    def key_for(blob) -> str:
+        """Content address of a blob: its storage path plus generation and MD5 when known."""
+        identity = f"{blob.name}\0{getattr(blob, 'generation', None) or ''}\0{getattr(blob, 'md5_hash', None) or ''}"
+        return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+    def path_for(self, blob) -> str:
+        key = self.key_for(blob)
+        extension = os.path.splitext(blob.name)[1].lower()
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def fetch(self, blob) -> str:
+        """
+        Returns a local path holding the blob's contents, downloading it only on a cache miss.
+
+        Args:
+            blob: A Cloud Storage blob (or `LocalBlob`), ideally with metadata loaded.
+
+        Returns:
+            str: Path of the cached file.
+        """
+        path = self.path_for(blob)
+        with self._lock:
+            if path in self._entries and os.path.exists(path):
+                self._entries.move_to_end(path)
+                self.hits += 1
+                os.utime(path)
+                return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial_path = f"{path}.{threading.get_ident()}.part"
+        blob.download_to_filename(partial_path)
+        os.replace(partial_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self.misses += 1
+            self._total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
+        return path
+
+    def _evict(self):
+        """Removes least recently used files until the cache fits its cap. Never evicts the newest entry."""
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            logging.debug(f"Evicted {path} from image cache.")
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,71 @@
+# image_loader.py
+
+import io
+import logging
+from typing import BinaryIO, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image, ImageOps
+
+ImageSource = Union[str, bytes, bytearray, memoryview, BinaryIO]
+
+_EXIF_ORIENTATION = 0x0112
+# EXIF orientations that rotate the image by 90 degrees, swapping its width and height
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+def open_image(source: ImageSource) -> Image.Image:
+    """Opens an image given as a file path, the raw encoded bytes of the file, or a binary file object."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+def read_image_size(source: ImageSource) -> Tuple[int, int]:
+    """
+    Returns the upright (height, width) of an image from its header, without decoding the pixels.
+    """
+    with open_image(source) as image:
+        width, height = image.size
+        if image.getexif().get(_EXIF_ORIENTATION, 1) in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+    return height, width
+
+def decode_image(source: ImageSource, max_dimension: Optional[int] = None) -> Tuple[np.ndarray, Tuple[int, int]]:
+    """
+    Decodes an image into an upright RGB array, reducing JPEGs while decoding when full
+    resolution isn't needed.
+
+    Phones usually store photos in sensor orientation with an EXIF Orientation tag saying how
+    to display them. The face detectors only find upright faces, so the tag is applied here
+    (face_recognition.load_image_file ignores it).
+
+    JPEG supports decoding at 1/2, 1/4 or 1/8 scale directly from the compressed data (PIL's
+    draft mode), which is far cheaper in time and memory than decoding at full size and
+    resizing. With `max_dimension` set, a JPEG is decoded at the smallest of those scales
+    whose longest side is still at least `max_dimension`. Other formats are always decoded
+    at full resolution.
+
+    Args:
+        source (ImageSource): File path, encoded bytes or binary file object.
+        max_dimension (int): Longest side the caller needs. None decodes at full resolution.
+
+    Returns:
+        Tuple[np.ndarray, Tuple[int, int]]: The upright RGB array and the upright (height, width)
+                                            of the image at full resolution.
+    """
+    with open_image(source) as image:
+        width, height = image.size
+        if max_dimension and image.format == 'JPEG' and max(width, height) > max_dimension:
+            ratio = max_dimension / max(width, height)
+            image.draft('RGB', (int(np.ceil(width * ratio)), int(np.ceil(height * ratio))))
+            logging.debug(f"Decoding {width}x{height} JPEG at {image.size[0]}x{image.size[1]}.")
+
+        orientation = image.getexif().get(_EXIF_ORIENTATION, 1)
+        if orientation in _TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        upright = ImageOps.exif_transpose(image) if orientation != 1 else image
+        array = np.array(upright.convert('RGB'))
+    return array, (height, width)
+
+def load_image(source: ImageSource, max_dimension: Optional[int] = None) -> np.ndarray:
+    """Decodes an image into an RGB array; see `decode_image`."""
+    return decode_image(source, max_dimension)[0]
@@ -7,3 +7,7 @@ from routers import users, photos
 
 app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(photos.router, prefix="/photos", tags=["photos"])
+
+@app.on_event("shutdown")
+def shutdown_processing_executor():
+    photos.processing_executor.shutdown()
@@ -1,6 +1,5 @@
 # ML/photo.py
 
-import face_recognition
 import os
 import json
 import pickle
@@ -8,34 +7,99 @@ from datetime import datetime
 import uuid
 import numpy as np
 import logging
+from face_detection import detect_and_encode, to_original_locations, DEFAULT_MAX_DETECTION_DIMENSION
+from image_loader import decode_image, read_image_size
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Photo:
-    def __init__(self, file_path, upload_timestamp=None, is_account_photo=False, author_id=None):
+    # Longest image side face detection runs at; see face_detection.detect_face_locations
+    max_detection_dimension = DEFAULT_MAX_DETECTION_DIMENSION
+    # Longest side JPEGs are decoded at; see image_loader.decode_image. None decodes at full resolution
+    max_decode_dimension = None
+
+    def __init__(self, file_path, upload_timestamp=None, is_account_photo=False, author_id=None,
+                 face_encodings=None, face_locations=None):
         self.photo_id = str(uuid.uuid4())  # Unique identifier for the photo
         self.file_path = file_path
-        self.image = None
-        self.face_locations = []
-        self.face_encodings = []
-        self.metadata = {}
+        self.image = None  # Decoded pixels; only held while faces are being processed
         self.upload_timestamp = upload_timestamp or datetime.utcnow().isoformat()
         self.is_account_photo = is_account_photo
         self.author_id = author_id  # Reference to User UID
+        # Faces and size are computed on first access (see _ensure_processed), so constructing
+        # a Photo never decodes the image
+        self._face_encodings = None
+        self._face_locations = None
+        self._image_size = None  # Upright (height, width) at full resolution
     
-        self.load_image()
-        self.process_faces()
-        self.generate_metadata()
+        if face_encodings is not None:
+            # Faces were already processed by the caller (e.g. from uploaded bytes)
+            self.face_encodings = face_encodings
+            self.face_locations = face_locations or []
+
+    @property
+    def is_processed(self) -> bool:
+        """Whether face encodings are available without decoding the image."""
+        return self._face_encodings is not None
+
+    @property
+    def face_encodings(self) -> list:
+        self._ensure_processed()
+        return self._face_encodings
+
+    @face_encodings.setter
+    def face_encodings(self, face_encodings: list):
+        self._face_encodings = list(face_encodings)
+        if self._face_locations is None:
+            self._face_locations = []
+
+    @property
+    def face_locations(self) -> list:
+        self._ensure_processed()
+        return self._face_locations
+
+    @face_locations.setter
+    def face_locations(self, face_locations: list):
+        self._face_locations = list(face_locations)
+
+    @property
+    def image_height(self):
+        return self._read_image_size()[0]
+
+    @property
+    def image_width(self):
+        return self._read_image_size()[1]
+
+    @property
+    def metadata(self) -> dict:
+        return self.generate_metadata()
+
+    def _ensure_processed(self):
+        """Decodes the image and processes its faces if that hasn't happened yet, then releases the pixels."""
+        if self._face_encodings is None:
+            self.load_image()
+            self.process_faces()
+            self.image = None
+
+    def _read_image_size(self):
+        """Returns (height, width), reading only the image header if it hasn't been decoded."""
+        if self._image_size is None:
+            try:
+                self._image_size = read_image_size(self.file_path)
+            except Exception as e:
+                logging.error(f"Error reading image size of {self.file_path}: {e}")
+                self._image_size = (None, None)
+        return self._image_size
     
     def load_image(self):
-        """Loads the image from the file path with error handling."""
+        """Loads the image upright (EXIF orientation applied) from the file path with error handling."""
         if not os.path.exists(self.file_path):
             logging.error(f"File not found: {self.file_path}")
             self.image = None
             return
         try:
-            self.image = face_recognition.load_image_file(self.file_path)
+            self.image, self._image_size = decode_image(self.file_path, self.max_decode_dimension)
             logging.info(f"Loaded image: {self.file_path}")
         except Exception as e:
             logging.error(f"Error loading image {self.file_path}: {e}")
@@ -45,42 +109,33 @@ class Photo:
         """Detects face locations and encodings in the image with error handling."""
         if self.image is not None:
             try:
-                self.face_locations = face_recognition.face_locations(self.image, model='hog')
-                self.face_encodings = face_recognition.face_encodings(self.image, self.face_locations)
-                logging.info(f"Detected {len(self.face_encodings)} face(s) in {self.file_path}")
+                face_locations, face_encodings = detect_and_encode(self.image, self.max_detection_dimension)
+                original_size = self._image_size or self.image.shape[:2]
+                self._face_locations = to_original_locations(face_locations, self.image.shape, original_size)
+                self._face_encodings = face_encodings
+                logging.info(f"Detected {len(face_encodings)} face(s) in {self.file_path}")
             except Exception as e:
                 logging.error(f"Error processing faces in {self.file_path}: {e}")
-                self.face_locations = []
-                self.face_encodings = []
+                self._face_locations = []
+                self._face_encodings = []
         else:
             logging.warning(f"Skipping face processing for {self.file_path} due to image loading failure.")
+            self._face_locations = []
+            self._face_encodings = []
     
-    def generate_metadata(self):
-        """Generates metadata for the photo."""
-        if self.image is not None:
-            self.metadata = {
-                'file_name': os.path.basename(self.file_path),
-                'num_faces': len(self.face_encodings),
-                'face_locations': self.face_locations,
-                'image_height': self.image.shape[0],
-                'image_width': self.image.shape[1],
-                'upload_timestamp': self.upload_timestamp,
-                'is_account_photo': self.is_account_photo,
-                'author_id': self.author_id,
-                'photo_id': self.photo_id
-            }
-        else:
-            self.metadata = {
-                'file_name': os.path.basename(self.file_path),
-                'num_faces': 0,
-                'face_locations': [],
-                'image_height': None,
-                'image_width': None,
-                'upload_timestamp': self.upload_timestamp,
-                'is_account_photo': self.is_account_photo,
-                'author_id': self.author_id,
-                'photo_id': self.photo_id
-            }
+    def generate_metadata(self) -> dict:
+        """Generates metadata for the photo, processing its faces if needed."""
+        return {
+            'file_name': os.path.basename(self.file_path),
+            'num_faces': len(self.face_encodings),
+            'face_locations': self.face_locations,
+            'image_height': self.image_height,
+            'image_width': self.image_width,
+            'upload_timestamp': self.upload_timestamp,
+            'is_account_photo': self.is_account_photo,
+            'author_id': self.author_id,
+            'photo_id': self.photo_id
+        }
     
     def save_metadata(self, output_directory):
         """Saves the metadata to a JSON file."""
@@ -129,14 +184,11 @@ class Photo:
         photo_id = data.get('photo_id', str(uuid.uuid4()))
         face_embeddings = data.get('face_embeddings', [])
         
-        # Instantiate Photo without processing (since data is provided)
-        photo = Photo(file_path, upload_timestamp, is_account_photo, author_id)
+        # Instantiate Photo without processing (since data is provided), converting
+        # face_embeddings to NumPy arrays
+        photo = Photo(file_path, upload_timestamp, is_account_photo, author_id,
+                      face_encodings=[np.array(emb) for emb in face_embeddings])
         photo.photo_id = photo_id
-        photo.metadata['face_embeddings'] = face_embeddings
-        
-        # Convert face_embeddings to NumPy arrays
-        photo.face_encodings = [np.array(emb) for emb in face_embeddings]
-        photo.metadata['num_faces'] = len(photo.face_encodings)
         
         # Optionally, you can calculate face_locations if needed
         # Here, we're assuming that face_locations are not stored separately
@@ -1,6 +1,5 @@
 # ML/photo.py
 
-import face_recognition
 import os
 import json
 import pickle
@@ -11,11 +10,19 @@ import logging
 from typing import List
 import pickle
 import base64
+from face_detection import detect_and_encode, to_original_locations, DEFAULT_MAX_DETECTION_DIMENSION
+from image_loader import decode_image, read_image_size
+from embedding_codec import encode_embeddings, decode_embeddings
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 class Photo:
+    # Longest image side face detection runs at; see face_detection.detect_face_locations
+    max_detection_dimension = DEFAULT_MAX_DETECTION_DIMENSION
+    # Longest side JPEGs are decoded at; see image_loader.decode_image. None decodes at full resolution
+    max_decode_dimension = None
+
     def __init__(
         self, 
         file_path: str, 
@@ -23,35 +30,89 @@ class Photo:
         is_account_photo: bool = False, 
         author_id: str = None, 
         face_embeddings: List[List[float]] = None, 
-        photo_id: str = None
+        photo_id: str = None,
+        embedding_hash: str = None,
+        embedding_version: str = None
     ):
         self.photo_id = photo_id #or str(uuid.uuid4())  # Unique identifier for the photo
         self.file_path = file_path
-        self.image = None
-        self.face_locations = []
-        self.face_encodings = []
-        self.metadata = {}
+        self.image = None  # Decoded pixels; only held while faces are being processed
         self.upload_timestamp = upload_timestamp or datetime.utcnow().isoformat()
         self.is_account_photo = is_account_photo
         self.author_id = author_id  # Reference to User UID
-        
-        if face_embeddings:
-            self.face_encodings = [np.array(enc) for enc in face_embeddings]
-            self.face_locations = []  # Optional: You can store face locations if needed
-            self.generate_metadata()
-        else:
+        self.embedding_hash = embedding_hash  # Content hash of the blob the embeddings were computed from
+        self.embedding_version = embedding_version  # Model version stamp of the embeddings
+        # Faces and size are computed on first access (see _ensure_processed), so constructing
+        # a Photo never decodes the image
+        self._face_encodings = None
+        self._face_locations = None
+        self._image_size = None  # Upright (height, width) at full resolution
+
+        if face_embeddings is not None:
+            self.face_encodings = [np.asarray(enc) for enc in face_embeddings]
+
+    @property
+    def is_processed(self) -> bool:
+        """Whether face encodings are available without decoding the image."""
+        return self._face_encodings is not None
+
+    @property
+    def face_encodings(self) -> List[np.ndarray]:
+        self._ensure_processed()
+        return self._face_encodings
+
+    @face_encodings.setter
+    def face_encodings(self, face_encodings: List[np.ndarray]):
+        self._face_encodings = list(face_encodings)
+        if self._face_locations is None:
+            self._face_locations = []  # Stored embeddings don't carry locations
+
+    @property
+    def face_locations(self) -> list:
+        self._ensure_processed()
+        return self._face_locations
+
+    @face_locations.setter
+    def face_locations(self, face_locations: list):
+        self._face_locations = list(face_locations)
+
+    @property
+    def image_height(self):
+        return self._read_image_size()[0]
+
+    @property
+    def image_width(self):
+        return self._read_image_size()[1]
+
+    @property
+    def metadata(self) -> dict:
+        return self.generate_metadata()
+
+    def _ensure_processed(self):
+        """Decodes the image and processes its faces if that hasn't happened yet, then releases the pixels."""
+        if self._face_encodings is None:
             self.load_image()
             self.process_faces()
-            self.generate_metadata()
-    
+            self.image = None
+
+    def _read_image_size(self):
+        """Returns (height, width), reading only the image header if it hasn't been decoded."""
+        if self._image_size is None:
+            try:
+                self._image_size = read_image_size(self.file_path)
+            except Exception as e:
+                logging.error(f"Error reading image size of {self.file_path}: {e}")
+                self._image_size = (None, None)
+        return self._image_size
+
     def load_image(self):
-        """Loads the image from the file path with error handling."""
+        """Loads the image upright (EXIF orientation applied) from the file path with error handling."""
         if not os.path.exists(self.file_path):
             logging.error(f"File not found: {self.file_path}")
             self.image = None
             return
         try:
-            self.image = face_recognition.load_image_file(self.file_path)
+            self.image, self._image_size = decode_image(self.file_path, self.max_decode_dimension)
             logging.info(f"Loaded image: {self.file_path}")
         except Exception as e:
             logging.error(f"Error loading image {self.file_path}: {e}")
@@ -61,42 +122,33 @@ class Photo:
         """Detects face locations and encodings in the image with error handling."""
         if self.image is not None:
             try:
-                self.face_locations = face_recognition.face_locations(self.image, model='hog')
-                self.face_encodings = face_recognition.face_encodings(self.image, self.face_locations)
-                logging.info(f"Detected {len(self.face_encodings)} face(s) in {self.file_path}")
+                face_locations, face_encodings = detect_and_encode(self.image, self.max_detection_dimension)
+                original_size = self._image_size or self.image.shape[:2]
+                self._face_locations = to_original_locations(face_locations, self.image.shape, original_size)
+                self._face_encodings = face_encodings
+                logging.info(f"Detected {len(face_encodings)} face(s) in {self.file_path}")
             except Exception as e:
                 logging.error(f"Error processing faces in {self.file_path}: {e}")
-                self.face_locations = []
-                self.face_encodings = []
+                self._face_locations = []
+                self._face_encodings = []
         else:
             logging.warning(f"Skipping face processing for {self.file_path} due to image loading failure.")
+            self._face_locations = []
+            self._face_encodings = []
     
-    def generate_metadata(self):
-        """Generates metadata for the photo."""
-        if self.image is not None:
-            self.metadata = {
-                'file_name': os.path.basename(self.file_path),
-                'num_faces': len(self.face_encodings),
-                'face_locations': self.face_locations,
-                'image_height': self.image.shape[0],
-                'image_width': self.image.shape[1],
-                'upload_timestamp': self.upload_timestamp,
-                'is_account_photo': self.is_account_photo,
-                'author_id': self.author_id,
-                'photo_id': self.photo_id
-            }
-        else:
-            self.metadata = {
-                'file_name': os.path.basename(self.file_path),
-                'num_faces': 0,
-                'face_locations': [],
-                'image_height': None,
-                'image_width': None,
-                'upload_timestamp': self.upload_timestamp,
-                'is_account_photo': self.is_account_photo,
-                'author_id': self.author_id,
-                'photo_id': self.photo_id
-            }
+    def generate_metadata(self) -> dict:
+        """Generates metadata for the photo, processing its faces if needed."""
+        return {
+            'file_name': os.path.basename(self.file_path),
+            'num_faces': len(self.face_encodings),
+            'face_locations': self.face_locations,
+            'image_height': self.image_height,
+            'image_width': self.image_width,
+            'upload_timestamp': self.upload_timestamp,
+            'is_account_photo': self.is_account_photo,
+            'author_id': self.author_id,
+            'photo_id': self.photo_id
+        }
     
     def save_metadata(self, output_directory: str):
         """Saves the metadata to a JSON file."""
@@ -144,14 +196,13 @@ class Photo:
         is_account_photo = data.get('isAccountPhoto')
         author_id = data['author_id']
         photo_id = doc.id #, str(uuid.uuid4()))
-        face_embeddings_pickled = data.get('face_embeddings')
-        if len(face_embeddings_pickled) >13:
-            padding_needed = len(face_embeddings_pickled) % 4
-            if padding_needed != 0:
-                face_embeddings_pickled += "=" * (4 - padding_needed)
-            face_embeddings = pickle.loads(base64.b64decode(face_embeddings_pickled))
-        else:
-            face_embeddings = face_embeddings_pickled
+        embedding_hash = data.get('embedding_hash')
+        embedding_version = data.get('embedding_version')
+        # Reads both the compact format and legacy pickled values
+        face_embeddings = decode_embeddings(data.get('face_embeddings'))
+        if len(face_embeddings) == 0 and not embedding_version:
+            # Never embedded by the server, as opposed to embedded with no faces found
+            face_embeddings = None
         # Instantiate Photo without processing if face_embeddings are provided
         photo = Photo(
             file_path=file_path, 
@@ -159,7 +210,9 @@ class Photo:
             is_account_photo=is_account_photo, 
             author_id=author_id, 
             face_embeddings=face_embeddings, 
-            photo_id=photo_id
+            photo_id=photo_id,
+            embedding_hash=embedding_hash,
+            embedding_version=embedding_version
         )
         
         return photo
@@ -173,9 +226,11 @@ class Photo:
         """
         return {
             'IsAccountPhoto': self.is_account_photo,
-            'face_embeddings': [emb.tolist() for emb in self.face_encodings],
+            'face_embeddings': encode_embeddings(self.face_encodings),
             'file_path': self.file_path,
             'author_id': self.author_id,
             'photo_id': self.photo_id,
-            'upload_timestamp': self.upload_timestamp
+            'upload_timestamp': self.upload_timestamp,
+            'embedding_hash': self.embedding_hash,
+            'embedding_version': self.embedding_version
         }
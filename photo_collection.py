@@ -0,0 +1,356 @@
+# photo_collection.py
+
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from photo import Photo
+from embedding_codec import EMBEDDING_DIMENSION, decode_embeddings
+
+def _bytes_column(values: List[Optional[str]]) -> np.ndarray:
+    """Packs strings into a fixed-width UTF-8 bytes array; None is stored as b''."""
+    return np.array([(value or '').encode('utf-8') for value in values], dtype=bytes)
+
+def _to_datetime64(value) -> np.datetime64:
+    """Converts a Firestore timestamp or ISO 8601 string to a naive UTC datetime64, NaT if unparseable."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return np.datetime64(value, 'us')
+    try:
+        return np.datetime64(str(value).rstrip('Z'), 'us')
+    except ValueError:
+        return np.datetime64('NaT', 'us')
+
+class PhotoRecord:
+    """
+    Read-only view of one photo in a PhotoCollection. Holds only a reference to the collection
+    and a row number; every field is read from the collection's columns on access.
+    """
+    __slots__ = ('_photos', '_index')
+
+    def __init__(self, photos: 'PhotoCollection', index: int):
+        self._photos = photos
+        self._index = index
+
+    def __repr__(self) -> str:
+        return f"PhotoRecord({self.photo_id!r}, {self.num_faces} face(s))"
+
+    @property
+    def photo_id(self) -> str:
+        return self._photos._photo_ids[self._index].decode('utf-8')
+
+    @property
+    def file_path(self) -> str:
+        return self._photos._file_paths[self._index].decode('utf-8')
+
+    @property
+    def author_id(self) -> Optional[str]:
+        return self._photos._author_ids[self._index].decode('utf-8') or None
+
+    @property
+    def is_account_photo(self) -> bool:
+        return bool(self._photos._is_account_photo[self._index])
+
+    @property
+    def upload_timestamp(self) -> Optional[str]:
+        timestamp = self._photos._upload_timestamps[self._index]
+        return None if np.isnat(timestamp) else str(timestamp)
+
+    @property
+    def embedding_hash(self) -> Optional[str]:
+        return self._photos._embedding_hashes[self._index].decode('utf-8') or None
+
+    @property
+    def embedding_version(self) -> Optional[str]:
+        return self._photos._embedding_versions[self._photos._embedding_version_codes[self._index]]
+
+    @property
+    def num_faces(self) -> int:
+        offsets = self._photos._face_offsets
+        return int(offsets[self._index + 1] - offsets[self._index])
+
+    @property
+    def face_encodings(self) -> np.ndarray:
+        """num_faces x 128 view into the collection's embedding matrix."""
+        offsets = self._photos._face_offsets
+        return self._photos.embedding_matrix[offsets[self._index]:offsets[self._index + 1]]
+
+class PhotoCollection:
+    """
+    Columnar catalogue of photos for the batch server.
+
+    Instead of one Photo object per photo, each with its own metadata dict and a list of
+    separate 128-d arrays, fields are stored as one compact numpy column each (IDs and paths as
+    fixed-width UTF-8 bytes, flags as bools, timestamps as datetime64, model versions as small
+    integer codes) and every face encoding lives in one contiguous F x 128 float32 matrix, with
+    `face_offsets` marking where each photo's faces start. Holding a million photos costs the
+    width of those columns (about a hundred bytes per photo) plus 512 bytes per face.
+
+    Iterating or indexing yields PhotoRecord views with the same attribute names as Photo, so
+    code written against Photo objects keeps working.
+    """
+
+    def __init__(self, photos: Iterable[Photo] = ()):
+        """
+        Args:
+            photos (Iterable[Photo]): Photos to catalogue. Their face encodings are copied into
+                                      the shared matrix, so the Photo objects can be discarded.
+        """
+        builder = _CollectionBuilder()
+        for photo in photos:
+            builder.add(
+                photo.photo_id, photo.file_path, photo.author_id, photo.is_account_photo,
+                photo.upload_timestamp, getattr(photo, 'embedding_hash', None),
+                getattr(photo, 'embedding_version', None), photo.face_encodings
+            )
+        builder.build_into(self)
+
+    @classmethod
+    def from_documents(cls, docs: Iterable) -> 'PhotoCollection':
+        """
+        Catalogues Firestore photo documents directly, decoding their embeddings into the shared
+        matrix without creating Photo objects. Documents missing required fields are logged and skipped.
+        """
+        builder = _CollectionBuilder()
+        for doc in docs:
+            try:
+                builder.add_document(doc)
+            except Exception as e:
+                logging.error(f"Failed to catalogue photo document {doc.id}: {e}")
+        collection = cls.__new__(cls)
+        builder.build_into(collection)
+        return collection
+
+    @classmethod
+    def concatenate(cls, collections: Iterable['PhotoCollection']) -> 'PhotoCollection':
+        """Joins collections (e.g. pages decoded in parallel) column by column into one."""
+        collections = list(collections)
+        if not collections:
+            return cls()
+        versions = {None: 0}
+        version_codes = []
+        for photos in collections:
+            remap = np.array([versions.setdefault(version, len(versions)) for version in photos._embedding_versions], dtype=np.int16)
+            version_codes.append(remap[photos._embedding_version_codes])
+
+        joined = cls.__new__(cls)
+        for column in ('_photo_ids', '_file_paths', '_author_ids', '_is_account_photo',
+                       '_upload_timestamps', '_embedding_hashes', 'embedding_matrix'):
+            setattr(joined, column, np.concatenate([getattr(photos, column) for photos in collections]))
+        joined._embedding_versions = sorted(versions, key=versions.get)
+        joined._embedding_version_codes = np.concatenate(version_codes)
+        counts = np.concatenate([np.diff(photos._face_offsets) for photos in collections])
+        joined._face_offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        joined._id_order = None
+        joined._author_order = None
+        return joined
+
+    def __len__(self) -> int:
+        return len(self._photo_ids)
+
+    def __iter__(self) -> Iterator[PhotoRecord]:
+        return (PhotoRecord(self, i) for i in range(len(self)))
+
+    def __getitem__(self, index: int) -> PhotoRecord:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("PhotoCollection index out of range")
+        return PhotoRecord(self, index)
+
+    def __repr__(self) -> str:
+        return f"PhotoCollection({len(self)} photos, {len(self.embedding_matrix)} faces)"
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the columns and the embedding matrix."""
+        columns = (self._photo_ids, self._file_paths, self._author_ids, self._is_account_photo,
+                   self._upload_timestamps, self._embedding_hashes, self._embedding_version_codes,
+                   self._face_offsets, self.embedding_matrix)
+        return sum(column.nbytes for column in columns)
+
+    @property
+    def photo_ids(self) -> np.ndarray:
+        """Length-N str array of photo IDs."""
+        return np.char.decode(self._photo_ids, 'utf-8')
+
+    @property
+    def embedding_hashes(self) -> np.ndarray:
+        """Length-N str array of embedding hashes, '' where a photo has none."""
+        return np.char.decode(self._embedding_hashes, 'utf-8')
+
+    @property
+    def embedding_versions(self) -> np.ndarray:
+        """Length-N str array of embedding model versions, '' where a photo has none."""
+        versions = np.array([version or '' for version in self._embedding_versions], dtype=str)
+        return versions[self._embedding_version_codes]
+
+    @property
+    def face_offsets(self) -> np.ndarray:
+        """Length-N+1 int64 array; photo i's faces are rows face_offsets[i]:face_offsets[i + 1] of the matrix."""
+        return self._face_offsets
+
+    @property
+    def face_photo_index(self) -> np.ndarray:
+        """Length-F int32 array; entry i is the index in this collection of the photo face i belongs to."""
+        counts = np.diff(self._face_offsets)
+        return np.repeat(np.arange(len(self), dtype=np.int32), counts)
+
+    def index_of(self, photo_id: str) -> Optional[int]:
+        """Row of a photo by ID, found by binary search over a sorted index; None if absent."""
+        if self._id_order is None:
+            self._id_order = np.argsort(self._photo_ids, kind='stable')
+        key = photo_id.encode('utf-8')
+        position = np.searchsorted(self._photo_ids, key, sorter=self._id_order)
+        if position < len(self) and self._photo_ids[self._id_order[position]] == key:
+            return int(self._id_order[position])
+        return None
+
+    def photo_indexes_by_author(self, author_id: str) -> np.ndarray:
+        """
+        Rows of every photo by `author_id`, in collection order. The author index (a sort of the
+        author column) is built on the first call and serves every later lookup by binary search.
+        """
+        if self._author_order is None:
+            self._author_order = np.argsort(self._author_ids, kind='stable')
+        key = (author_id or '').encode('utf-8')
+        start = np.searchsorted(self._author_ids, key, side='left', sorter=self._author_order)
+        end = np.searchsorted(self._author_ids, key, side='right', sorter=self._author_order)
+        # The stable sort keeps rows of one author in collection order
+        return self._author_order[start:end]
+
+    def photos_by_author(self, author_id: str) -> List[PhotoRecord]:
+        return [PhotoRecord(self, int(i)) for i in self.photo_indexes_by_author(author_id)]
+
+    def account_photo(self, author_id: str) -> Optional[PhotoRecord]:
+        """The first account (profile) photo of `author_id`, or None."""
+        indexes = self.photo_indexes_by_author(author_id)
+        account = indexes[self._is_account_photo[indexes]]
+        return PhotoRecord(self, int(account[0])) if len(account) else None
+
+    def update_embeddings(self, updates: Dict[str, Tuple[Sequence[np.ndarray], Optional[str], Optional[str]]]) -> int:
+        """
+        Replaces the face encodings and embedding stamps of photos in place, e.g. with the results
+        of an embedding run, so the collection doesn't have to be reloaded to pick them up. The
+        embedding matrix is rebuilt once for the whole batch.
+
+        Args:
+            updates (Dict): Photo ID -> (face encodings, embedding hash, embedding version).
+                            IDs that aren't in the collection are logged and ignored.
+
+        Returns:
+            int: Number of photos updated.
+        """
+        rows = {}
+        for photo_id, update in updates.items():
+            index = self.index_of(photo_id)
+            if index is None:
+                logging.warning(f"Photo {photo_id} is not in the collection; its embeddings were not updated.")
+                continue
+            rows[index] = update
+        if not rows:
+            return 0
+
+        # Widen the hash column if a new hash is longer than any stored one
+        width = max(self._embedding_hashes.itemsize, _bytes_column([update[1] for update in rows.values()]).itemsize)
+        self._embedding_hashes = self._embedding_hashes.astype(f'S{width}')
+        versions = {version: code for code, version in enumerate(self._embedding_versions)}
+        counts = np.diff(self._face_offsets)
+
+        # Splice the new encodings in between the unchanged runs of the matrix
+        pieces = []
+        start = 0
+        for index in sorted(rows):
+            face_encodings, embedding_hash, embedding_version = rows[index]
+            encodings = np.asarray(face_encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION)
+            pieces.append(self.embedding_matrix[self._face_offsets[start]:self._face_offsets[index]])
+            pieces.append(encodings)
+            counts[index] = len(encodings)
+            self._embedding_hashes[index] = (embedding_hash or '').encode('utf-8')
+            self._embedding_version_codes[index] = versions.setdefault(embedding_version, len(versions))
+            start = index + 1
+        pieces.append(self.embedding_matrix[self._face_offsets[start]:])
+
+        self.embedding_matrix = np.concatenate(pieces)
+        self._face_offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        self._embedding_versions = sorted(versions, key=versions.get)
+        return len(rows)
+
+    def append(self, photo: Photo):
+        self.extend([photo])
+
+    def extend(self, photos: Iterable[Photo]):
+        """Adds photos. This copies every column, so prefer building collections in one go."""
+        builder = _CollectionBuilder()
+        builder.add_collection(self)
+        for photo in photos:
+            builder.add(
+                photo.photo_id, photo.file_path, photo.author_id, photo.is_account_photo,
+                photo.upload_timestamp, getattr(photo, 'embedding_hash', None),
+                getattr(photo, 'embedding_version', None), photo.face_encodings
+            )
+        builder.build_into(self)
+
+class _CollectionBuilder:
+    """Accumulates rows in lists and converts them into a PhotoCollection's columns in one pass."""
+
+    def __init__(self):
+        self.photo_ids, self.file_paths, self.author_ids = [], [], []
+        self.is_account_photo, self.upload_timestamps, self.embedding_hashes = [], [], []
+        self.embedding_versions = {None: 0}
+        self.embedding_version_codes = []
+        self.face_counts = []
+        self.encodings = []
+
+    def add(self, photo_id, file_path, author_id, is_account_photo, upload_timestamp,
+            embedding_hash, embedding_version, face_encodings):
+        self.photo_ids.append(photo_id)
+        self.file_paths.append(file_path)
+        self.author_ids.append(author_id)
+        self.is_account_photo.append(bool(is_account_photo))
+        self.upload_timestamps.append(_to_datetime64(upload_timestamp))
+        self.embedding_hashes.append(embedding_hash)
+        code = self.embedding_versions.setdefault(embedding_version, len(self.embedding_versions))
+        self.embedding_version_codes.append(code)
+        encodings = np.asarray(face_encodings, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION)
+        self.face_counts.append(len(encodings))
+        if len(encodings):
+            self.encodings.append(encodings)
+
+    def add_document(self, doc):
+        # Same fields and defaults as Photo.from_dict
+        data = doc.to_dict()
+        for field in ('file_path', 'author_id'):
+            if field not in data:
+                raise ValueError(f"Missing required field '{field}' in photo document.")
+        self.add(
+            doc.id, data['file_path'], data['author_id'], data.get('isAccountPhoto'),
+            data.get('upload_timestamp', datetime.utcnow()), data.get('embedding_hash'),
+            data.get('embedding_version'), decode_embeddings(data.get('face_embeddings'))
+        )
+
+    def add_collection(self, photos: PhotoCollection):
+        for record in photos:
+            self.add(record.photo_id, record.file_path, record.author_id, record.is_account_photo,
+                     record.upload_timestamp, record.embedding_hash, record.embedding_version,
+                     record.face_encodings)
+
+    def build_into(self, photos: PhotoCollection):
+        photos._photo_ids = _bytes_column(self.photo_ids)
+        photos._file_paths = _bytes_column(self.file_paths)
+        photos._author_ids = _bytes_column(self.author_ids)
+        photos._is_account_photo = np.array(self.is_account_photo, dtype=bool)
+        photos._upload_timestamps = np.array(self.upload_timestamps, dtype='datetime64[us]')
+        photos._embedding_hashes = _bytes_column(self.embedding_hashes)
+        photos._embedding_versions = sorted(self.embedding_versions, key=self.embedding_versions.get)
+        photos._embedding_version_codes = np.array(self.embedding_version_codes, dtype=np.int16)
+        photos._face_offsets = np.concatenate([[0], np.cumsum(self.face_counts, dtype=np.int64)])
+        if self.encodings:
+            photos.embedding_matrix = np.concatenate(self.encodings)
+        else:
+            photos.embedding_matrix = np.empty((0, EMBEDDING_DIMENSION), dtype=np.float32)
+        photos._id_order = None
+        photos._author_order = None
@@ -1,53 +1,121 @@
 # ML/photo_loader.py
 
-from typing import List
+from typing import Iterator, List
 from photo import Photo  # Ensure correct import path
+from photo_collection import PhotoCollection
+from blob_downloader import BlobPrefetcher
 from firebase_admin import firestore
 import logging
 
-def load_all_photos_from_firebase() -> List[Photo]:
+# Documents fetched per Firestore query
+DEFAULT_PAGE_SIZE = 500
+# Threads decoding fetched pages while the next page is being fetched
+DEFAULT_DECODE_WORKERS = 4
+
+def iter_photo_document_pages(db=None, page_size: int = DEFAULT_PAGE_SIZE, query=None) -> Iterator[list]:
     """
-    Retrieves all photo documents from Firestore and returns a list of Photo objects.
-    
-    Returns:
-        List[Photo]: A list of Photo instances representing each photo document in Firestore.
+    Fetches photo documents one page at a time, ordered by document ID and resuming each page
+    with a `start_after` cursor on the previous page's last document, so no single long-lived
+    stream has to cover the whole collection.
+
+    Args:
+        db (firestore.Client): Firestore client. Defaults to the app's client.
+        page_size (int): Documents per page.
+        query: Query to page through. Defaults to the whole `photos` collection.
+
+    Yields:
+        list: Document snapshots, at most `page_size` per page.
     """
-    db = firestore.client()
-    all_photo_docs = db.collection('photos').stream()
-    
-    photo_objects = []
-    for doc in all_photo_docs:
+    if query is None:
+        query = (db or firestore.client()).collection('photos')
+    query = query.order_by(firestore.FieldPath.document_id()).limit(page_size)
+
+    last_doc = None
+    while True:
+        page_query = query if last_doc is None else query.start_after(last_doc)
+        page = list(page_query.stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last_doc = page[-1]
+
+def _decode_photo_page(page: list) -> List[Photo]:
+    photos = []
+    for doc in page:
         try:
-            photo = Photo.from_dict(doc)
-            photo_objects.append(photo)
-            logging.info(f"Loaded Photo: {photo.photo_id}, Filename: {photo.metadata.get('file_name', 'N/A')}")
+            photos.append(Photo.from_dict(doc))
         except Exception as e:
             logging.error(f"Failed to create Photo from document {doc.id}: {e}")
-    
+    logging.debug(f"Decoded {len(photos)} of {len(page)} photo documents.")
+    return photos
+
+def _catalogue_photo_page(page: list) -> PhotoCollection:
+    return PhotoCollection.from_documents(page)
+
+def _decode_pages(decode, pages: Iterator[list], workers: int) -> Iterator:
+    """Decodes pages on `workers` threads, in order, while later pages are still being fetched."""
+    prefetcher = BlobPrefetcher(workers=workers, depth=workers * 2)
+    for page, decoded in prefetcher.prefetch(decode, pages):
+        if decoded is None:
+            logging.error(f"Failed to decode a page of {len(page)} photo documents.")
+            continue
+        yield decoded
+
+def iter_photos_from_firebase(
+    db=None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    workers: int = DEFAULT_DECODE_WORKERS,
+    query=None
+) -> Iterator[Photo]:
+    """
+    Yields Photo objects for every photo document, fetching paged and decoding pages in parallel.
+    At most `2 * workers` pages are held at once, however large the collection.
+
+    Args:
+        db (firestore.Client): Firestore client. Defaults to the app's client.
+        page_size (int): Documents per Firestore query.
+        workers (int): Threads decoding pages.
+        query: Query to load. Defaults to the whole `photos` collection.
+    """
+    pages = iter_photo_document_pages(db, page_size, query)
+    for photos in _decode_pages(_decode_photo_page, pages, workers):
+        yield from photos
+
+def load_all_photos_from_firebase(db=None, page_size: int = DEFAULT_PAGE_SIZE, workers: int = DEFAULT_DECODE_WORKERS) -> List[Photo]:
+    """
+    Retrieves all photo documents from Firestore and returns a list of Photo objects.
+
+    Returns:
+        List[Photo]: A list of Photo instances representing each photo document in Firestore.
+    """
+    photo_objects = list(iter_photos_from_firebase(db, page_size, workers))
+    logging.info(f"Loaded {len(photo_objects)} photos.")
     return photo_objects
 
-def load_photos_by_author_from_firebase(author_id: str) -> List[Photo]:
+def load_photo_collection_from_firebase(db=None, page_size: int = DEFAULT_PAGE_SIZE, workers: int = DEFAULT_DECODE_WORKERS) -> PhotoCollection:
+    """
+    Retrieves all photo documents from Firestore into a compact columnar PhotoCollection,
+    without creating a Photo object per document. Pages are catalogued in parallel and joined.
+
+    Returns:
+        PhotoCollection: Every photo that could be catalogued.
+    """
+    pages = iter_photo_document_pages(db, page_size)
+    photos = PhotoCollection.concatenate(_decode_pages(_catalogue_photo_page, pages, workers))
+    logging.info(f"Loaded {len(photos)} photos ({photos.nbytes / 1024 ** 2:.1f} MB).")
+    return photos
+
+def load_photos_by_author_from_firebase(author_id: str, db=None) -> List[Photo]:
     """
     Retrieves photo documents authored by a specific user from Firestore and returns a list of Photo objects.
-    
+
     Args:
         author_id (str): The UID of the author/user.
-    
+
     Returns:
         List[Photo]: A list of Photo instances authored by the specified user.
     """
-    db = firestore.client()
-    photos_ref = db.collection('photos')
-    query = photos_ref.where('author_id', '==', author_id)
-    photo_docs = query.stream()
-    
-    photo_objects = []
-    for doc in photo_docs:
-        try:
-            photo = Photo.from_dict(doc)
-            photo_objects.append(photo)
-            logging.info(f"Loaded Photo: {photo.photo_id}, Filename: {photo.metadata.get('file_name', 'N/A')}")
-        except Exception as e:
-            logging.error(f"Failed to create Photo from document {doc.id}: {e}")
-    
-    return photo_objects
+    db = db or firestore.client()
+    query = db.collection('photos').where('author_id', '==', author_id)
+    return list(iter_photos_from_firebase(query=query))
@@ -0,0 +1,111 @@
+# predicted_photos.py
+
+import logging
+from typing import Dict, Iterator, List
+
+from firebase_admin import firestore
+
+# Documents requested per get_all call
+READ_CHUNK_SIZE = 300
+# Firestore's limit on writes per batch commit
+MAX_BATCH_WRITES = 500
+
+def _chunks(items: List, size: int) -> Iterator[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class _BatchWriter:
+    """Queues document updates and commits them in WriteBatches of up to `max_writes`."""
+
+    def __init__(self, db, max_writes: int = MAX_BATCH_WRITES):
+        self.db = db
+        self.max_writes = max_writes
+        self.commits = 0
+        self._batch = None
+        self._pending = 0
+
+    def update(self, reference, *updates: dict):
+        """Queues one or more updates of a document, keeping them in the same (atomic) batch."""
+        if self._pending + len(updates) > self.max_writes:
+            self.flush()
+        if self._batch is None:
+            self._batch = self.db.batch()
+        for data in updates:
+            self._batch.update(reference, data)
+        self._pending += len(updates)
+
+    def flush(self):
+        if self._pending:
+            self._batch.commit()
+            self.commits += 1
+        self._batch = None
+        self._pending = 0
+
+def send_predicted_photos_to_users(db, people_clusters: Dict, read_chunk_size: int = READ_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Brings each user's `predicted_photos` in their `user_photos` document in line with their
+    predicted photos (their clustered photos minus the ones they confirmed).
+
+    User IDs are streamed without their fields, `user_photos` documents are read with one
+    get_all per `read_chunk_size` users, and updates are committed in batches of up to 500,
+    so the stage takes a handful of round-trips rather than two per user.
+
+    Only the difference from the stored list is written: new photos with ArrayUnion and
+    dropped ones with ArrayRemove (two writes in the same batch when a user has both, as
+    Firestore allows one transform per field per write). Users whose set is unchanged are
+    not written at all, so app listeners only fire on real changes.
+
+    Args:
+        db (firestore.Client): Firestore client.
+        people_clusters (Dict): `author_id` -> clustered photo IDs, from clustering.
+        read_chunk_size (int): `user_photos` documents per get_all.
+
+    Returns:
+        Dict[str, int]: Number of users seen, updated, unchanged (full rewrites avoided) and without
+                        a `user_photos` document; photo IDs added and removed; and writes made.
+    """
+    # Only the IDs are needed, so don't transfer the user documents' fields
+    user_ids = [doc.id for doc in db.collection('users').select(['__name__']).stream()]
+    user_photos = db.collection('user_photos')
+    writer = _BatchWriter(db)
+    stats = {'users': len(user_ids), 'updated': 0, 'unchanged': 0, 'missing': 0, 'added': 0, 'removed': 0, 'writes': 0}
+
+    for chunk in _chunks(user_ids, read_chunk_size):
+        for user_photos_doc in db.get_all([user_photos.document(user_id) for user_id in chunk]):
+            user_id = user_photos_doc.id
+            if not user_photos_doc.exists:
+                logging.warning(f"No user_photos document found for user {user_id}. Skipping.")
+                stats['missing'] += 1
+                continue
+
+            data = user_photos_doc.to_dict()
+            # Clustered photos the user hasn't already confirmed
+            confirmed_photo_ids = set(data.get('confirmed_photos', []))
+            predicted_photo_ids = set(people_clusters.get(user_id, [])) - confirmed_photo_ids
+
+            stored_photo_ids = set(data.get('predicted_photos', []))
+            added = sorted(predicted_photo_ids - stored_photo_ids)
+            removed = sorted(stored_photo_ids - predicted_photo_ids)
+            if not added and not removed:
+                stats['unchanged'] += 1
+                continue
+
+            updates = []
+            if added:
+                updates.append({'predicted_photos': firestore.ArrayUnion(added)})
+            if removed:
+                updates.append({'predicted_photos': firestore.ArrayRemove(removed)})
+            writer.update(user_photos_doc.reference, *updates)
+            stats['updated'] += 1
+            stats['added'] += len(added)
+            stats['removed'] += len(removed)
+            stats['writes'] += len(updates)
+            logging.debug(f"Queued `predicted_photos` update for user {user_id}: +{len(added)} -{len(removed)} photos.")
+    writer.flush()
+
+    logging.info(
+        f"Predicted photos: {stats['updated']} of {stats['users']} user(s) updated "
+        f"(+{stats['added']} -{stats['removed']} photos, {stats['writes']} write(s) in {writer.commits} commit(s)); "
+        f"{stats['unchanged']} unchanged user(s) not written, {stats['missing']} without user_photos."
+    )
+    return stats
@@ -1,40 +1,114 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.routing import APIRoute
 from models.photo import Photo
 from models.user import User
-from services.face_recognition_service import process_photo
-from typing import List
+from services.face_recognition_service import process_photo, process_photos
+from services.upload_archive import expand_upload, is_image_filename, TooManyFiles
+from services.processing_executor import ProcessingExecutor, ExecutorSaturated
+from services.upload_jobs import UploadJobStore
+from services.upload_spool import spool_upload, remove_spooled_upload, UploadTooLarge
+from collections import deque
+from functools import partial
+from typing import Awaitable, List
 import numpy as np
+import os
 
 router = APIRouter()
 
 # In-memory photo storage
 photos_db = {}
 # Access the users_db from the users module
-from routers.users import users_db
+from routers.users import users_db, users_embeddings
 
-@router.post("/upload", response_model=dict)
-async def upload_photo(file: UploadFile = File(...)):
-    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-        raise HTTPException(status_code=400, detail="Invalid image format.")
+# Pool that face detection and encoding run on, so they never block the event loop
+processing_executor = ProcessingExecutor.from_env()
+
+# Photos uploaded with background=true, polled through GET /photos/jobs/{job_id}
+upload_jobs = UploadJobStore()
+
+# Maximum embedding distance at which a face is considered to be a user (as in User.is_match)
+MATCH_TOLERANCE = 0.6
+
+# Largest single photo upload accepted, and the longest side JPEG uploads are decoded at
+# (PHOTOBOMB_MAX_DECODE_DIMENSION; unset decodes at full resolution)
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+# Allowance for the multipart boundaries and part headers around an uploaded photo
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+MAX_DECODE_DIMENSION = int(os.environ['PHOTOBOMB_MAX_DECODE_DIMENSION']) if os.environ.get('PHOTOBOMB_MAX_DECODE_DIMENSION') else None
+
+# Bulk uploads: most images accepted per request, their largest total (uncompressed) size,
+# images per executor job, and the detector to use ('cnn' batches detection across images,
+# 'hog' detects them one at a time)
+MAX_BULK_FILES = 500
+MAX_BULK_BYTES = 512 * 1024 * 1024
+BULK_CHUNK_SIZE = 16
+BULK_DETECTION_MODEL = os.environ.get('PHOTOBOMB_DETECTION_MODEL', 'hog')
+
+def _executor_busy() -> HTTPException:
+    return HTTPException(status_code=503, detail="Server is busy processing photos. Try again later.",
+                         headers={"Retry-After": "1"})
+
+def _limit_body(receive, max_bytes: int):
+    """Wraps an ASGI `receive` so a request body past `max_bytes` is refused with 413 as it arrives."""
+    received = 0
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message['type'] == 'http.request':
+            received += len(message.get('body', b''))
+            if received > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes.")
+        return message
 
-    # Read the image data
-    image_data = await file.read()
+    return limited_receive
 
-    # Process the photo to extract face encodings
-    photo = process_photo(image_data, file.filename)
+class _UploadRoute(APIRoute):
+    """
+    Route that bounds a single-photo upload before its body is received (FastAPI reads the
+    whole multipart body before calling the endpoint): a body declared larger than
+    MAX_UPLOAD_BYTES is refused with 413 straight away, and a body without a Content-Length
+    (chunked transfer encoding) is refused with 413 as soon as it passes the same limit.
+    No processing slot is held while the body arrives; the endpoint claims one once the
+    upload is spooled, so slow connections never take up processing capacity.
+    """
+
+    def get_route_handler(self):
+        handle = super().get_route_handler()
+
+        async def bounded_handle(request: Request) -> Response:
+            max_bytes = MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+            content_length = request.headers.get('content-length')
+            if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes.")
+            return await handle(Request(request.scope, _limit_body(request.receive, max_bytes)))
+
+        return bounded_handle
+
+# Routes that process a single uploaded photo, size-checked as their body is read
+upload_router = APIRouter(route_class=_UploadRoute)
+
+def _match_photo(photo: Photo) -> List[str]:
+    """
+    Stores a processed photo and files each of its faces under every user's known or unknown photos.
+
+    Returns:
+        List[str]: Usernames matched by at least one face in the photo.
+    """
     photos_db[photo.photo_id] = photo
 
-    # Initialize face ID counter
-    face_counter = 1
+    # Distances from every face to every user in one batched computation (faces x users)
+    matches = users_embeddings.matches(np.asarray(photo.face_encodings), MATCH_TOLERANCE)
+    usernames = list(users_embeddings.keys)
 
-    # Iterate over each face encoding in the photo
-    for face_encoding in photo.face_encodings:
-        face_id = face_counter
-        face_counter += 1
+    # Iterate over each face encoding in the photo, numbering faces from 1
+    for face_index, face_encoding in enumerate(photo.face_encodings):
+        face_id = face_index + 1
 
-        # Compare with each user in users_db
-        for user in users_db.values():
-            if user.is_match(face_encoding):
+        for username, is_match in zip(usernames, matches[face_index]):
+            user = users_db[username]
+            if is_match:
                 # Face matches the user
                 user.add_known_photo(face_id, face_encoding)
                 print(f"Added face ID '{face_id}' from photo '{photo.photo_id}' to known_photos of user '{user.username}'.")
@@ -43,7 +117,118 @@ async def upload_photo(file: UploadFile = File(...)):
                 user.add_unknown_photo(face_id, face_encoding)
                 print(f"Added face ID '{face_id}' from photo '{photo.photo_id}' to unknown_photos of user '{user.username}'.")
 
-    return {"message": f"Photo '{photo.photo_id}' uploaded and processed successfully."}
+    return [username for username, matched in zip(usernames, matches.any(axis=0)) if matched]
+
+async def _process_upload(processing: Awaitable[Photo]) -> dict:
+    photo = await processing
+    matched_users = _match_photo(photo)
+    return {"photo_id": photo.photo_id, "num_faces": len(photo.face_encodings), "matched_users": matched_users}
+
+@upload_router.post("/upload", response_model=dict)
+async def upload_photo(response: Response, file: UploadFile = File(...), background: bool = False):
+    """
+    Uploads a photo and matches its faces against the registered users.
+
+    With `background=true` the request returns 202 with a job ID as soon as the image is
+    queued; poll `GET /photos/jobs/{job_id}` for its status and result.
+    """
+    if not is_image_filename(file.filename):
+        raise HTTPException(status_code=400, detail="Invalid image format.")
+
+    # Stream the image to a temporary file in bounded chunks rather than reading it into memory
+    try:
+        spool_path = await spool_upload(file, MAX_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    # Only claim a processing slot once the whole upload is in, so slow transfers hold no capacity
+    try:
+        slot = processing_executor.reserve()
+    except ExecutorSaturated:
+        remove_spooled_upload(spool_path)
+        raise _executor_busy()
+    # The file goes when the slot is freed: once the worker is done with it, even if this
+    # request is cancelled first, or straight away if the job can't be submitted
+    slot.add_release_callback(partial(remove_spooled_upload, spool_path))
+
+    # Process the photo to extract face encodings, off the event loop; the worker decodes
+    # straight from the spooled file
+    processing = slot.submit(process_photo, spool_path, file.filename, max_decode_dimension=MAX_DECODE_DIMENSION)
+
+    if background:
+        job = upload_jobs.start(file.filename, _process_upload(processing))
+        response.status_code = 202
+        return {"job_id": job.job_id, "status": job.status, "status_url": f"/photos/jobs/{job.job_id}"}
+
+    result = await _process_upload(processing)
+    return {"message": f"Photo '{result['photo_id']}' uploaded and processed successfully."}
+
+@router.post("/upload/bulk", response_model=dict)
+async def upload_photos(files: List[UploadFile] = File(...)):
+    """
+    Uploads many photos in one request, as individual files and/or zip or tar archives of
+    images, and matches their faces against the registered users.
+
+    Images are processed in chunks of BULK_CHUNK_SIZE, each chunk one executor job that decodes
+    its images in parallel and runs batched detection, with as many chunks in flight as the
+    executor accepts. Returns a result per image, in upload order.
+    """
+    uploads = []
+    remaining_bytes = MAX_BULK_BYTES
+    for file in files:
+        # Archives are unpacked from the already received upload file on a worker thread, so the
+        # event loop keeps serving; each image is at most MAX_UPLOAD_BYTES once unpacked
+        try:
+            images = await run_in_threadpool(
+                expand_upload, file.filename, file.file, MAX_BULK_FILES - len(uploads),
+                MAX_UPLOAD_BYTES, remaining_bytes)
+        except TooManyFiles:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_FILES} images per request.")
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        uploads.extend(images)
+        remaining_bytes -= sum(len(data) for _, data in images)
+    if not uploads:
+        raise HTTPException(status_code=400, detail="No images found in upload.")
+
+    photos = []
+    pending = deque()
+    for start in range(0, len(uploads), BULK_CHUNK_SIZE):
+        chunk = uploads[start:start + BULK_CHUNK_SIZE]
+        while True:
+            try:
+                pending.append(processing_executor.submit(
+                    process_photos, chunk, model=BULK_DETECTION_MODEL, max_decode_dimension=MAX_DECODE_DIMENSION))
+                break
+            except ExecutorSaturated:
+                if not pending:
+                    raise _executor_busy()
+                # Wait for our oldest chunk to free a slot instead of failing half an album
+                photos.extend(await pending.popleft())
+    while pending:
+        photos.extend(await pending.popleft())
+
+    results = []
+    for (filename, _), photo in zip(uploads, photos):
+        if photo is None:
+            results.append({"filename": filename, "error": "Could not decode image."})
+            continue
+        matched_users = _match_photo(photo)
+        results.append({"filename": filename, "photo_id": photo.photo_id,
+                        "num_faces": len(photo.face_encodings), "matched_users": matched_users})
+
+    return {"processed": sum(1 for photo in photos if photo is not None), "results": results}
+
+router.include_router(upload_router)
+
+@router.get("/jobs/{job_id}", response_model=dict)
+def get_upload_job(job_id: str):
+    job = upload_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    return job.to_dict()
 
 @router.get("/{photo_id}", response_model=dict)
 def get_photo(photo_id: str):
@@ -2,12 +2,15 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List
 from models.user import User
+from services.face_index import EmbeddingMatrix
 import numpy as np
 
 router = APIRouter()
 
 # In-memory user storage
 users_db = {}
+# Users' face embeddings stacked into one matrix, kept in sync with users_db
+users_embeddings = EmbeddingMatrix()
 
 class UserCreateRequest(BaseModel):
     username: str
@@ -20,9 +23,12 @@ def register_user(user_request: UserCreateRequest):
 
     # Convert the face_embedding list to a numpy array
     face_embedding = np.array(user_request.face_embedding)
+    if face_embedding.shape != (users_embeddings.dimension,):
+        raise HTTPException(status_code=400, detail=f"Face embedding must have {users_embeddings.dimension} values.")
 
     # Create a new User instance
     user = User(username=user_request.username, face_embedding=face_embedding)
+    users_embeddings.set(user.username, face_embedding)
     users_db[user.username] = user
 
     return {"message": f"User '{user.username}' registered successfully."}
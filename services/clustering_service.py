@@ -0,0 +1,183 @@
+import os
+import logging
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from embedding_codec import EMBEDDING_DIMENSION
+from services.face_index import FaceIndex
+
+DEFAULT_EPS = 0.55
+DEFAULT_STATE_PATH = "cluster_state.npz"
+
+def embedding_stamp(embedding_hash: Optional[str], embedding_version: Optional[str]) -> str:
+    """
+    Key a clustered photo's embeddings are compared by: the content hash of the blob they were
+    computed from and the model version that computed them. Either changing means re-embedded faces.
+    """
+    return f"{embedding_hash or ''}@{embedding_version or ''}"
+
+class _LabelUnion:
+    """Union-find over cluster labels."""
+
+    def __init__(self, size: int):
+        self.parent = np.arange(size)
+
+    def find(self, label: int) -> int:
+        root = label
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[label] != root:
+            self.parent[label], label = root, self.parent[label]
+        return root
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+class ClusterState:
+    """
+    Persistent face clustering state that new faces can be assigned to without re-running
+    DBSCAN over the whole corpus.
+
+    With `min_samples=1` every face is a core point, so DBSCAN clusters are exactly the
+    connected components of the graph linking faces closer than `eps`. A new face therefore
+    joins every cluster that has a face within `eps` of it, merging them if there are several,
+    or starts a new cluster otherwise, which gives the same clusters as a full re-run.
+    Removing or changing faces can split clusters, which is only handled by a full `fit`.
+
+    Neighbours are looked up through an exhaustive `FaceIndex` over the clustered faces. It
+    must stay exact at every size: a neighbour an approximate (IVF) search missed would leave
+    clusters that DBSCAN joins unmerged.
+    """
+
+    def __init__(
+        self,
+        points: np.ndarray,
+        labels: np.ndarray,
+        face_photo_ids: np.ndarray,
+        photo_stamps: Dict[str, str],
+        eps: float = DEFAULT_EPS
+    ):
+        """
+        Args:
+            points (np.ndarray): F x 128 float32 matrix of clustered face encodings.
+            labels (np.ndarray): Length-F cluster label per face.
+            face_photo_ids (np.ndarray): Length-F photo ID per face.
+            photo_stamps (Dict[str, str]): `embedding_stamp` of every clustered photo, including
+                                           photos without faces, to detect re-embedded photos.
+            eps (float): DBSCAN neighbourhood radius.
+        """
+        self.points = np.asarray(points, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.face_photo_ids = np.asarray(face_photo_ids, dtype=str)
+        self.photo_stamps = dict(photo_stamps)
+        self.eps = eps
+        self._index: Optional[FaceIndex] = None
+
+    @property
+    def index(self) -> FaceIndex:
+        """Nearest-neighbour index over the clustered faces, keyed by face row. Built on first use."""
+        if self._index is None:
+            self._index = FaceIndex(nprobe=None)
+            self._index.add_many(range(len(self.points)), self.points)
+        return self._index
+
+    @classmethod
+    def fit(
+        cls,
+        points: np.ndarray,
+        face_photo_ids: Iterable[str],
+        photo_stamps: Dict[str, str],
+        eps: float = DEFAULT_EPS
+    ) -> 'ClusterState':
+        """Clusters every face from scratch with DBSCAN."""
+        points = np.asarray(points, dtype=np.float32)
+        if len(points):
+            labels = DBSCAN(eps=eps, min_samples=1, metric="euclidean").fit(points).labels_
+        else:
+            labels = np.empty(0, dtype=np.int64)
+        logging.info(f"Fully clustered {len(points)} face(s) into {len(set(labels))} cluster(s).")
+        return cls(points, labels, np.asarray(list(face_photo_ids), dtype=str), photo_stamps, eps)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_STATE_PATH) -> Optional['ClusterState']:
+        """Loads a saved state, or returns None if there is none or it predates embedding stamps."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if 'photo_stamps' not in data:
+                logging.info(f"Cluster state in {path} has no embedding stamps; it will be rebuilt.")
+                return None
+            state = cls(
+                points=data['points'],
+                labels=data['labels'],
+                face_photo_ids=data['face_photo_ids'],
+                photo_stamps=dict(zip(data['photo_ids'].tolist(), data['photo_stamps'].tolist())),
+                eps=float(data['eps'])
+            )
+        logging.info(f"Loaded cluster state with {len(state.points)} face(s) from {path}.")
+        return state
+
+    def save(self, path: str = DEFAULT_STATE_PATH):
+        # np.savez appends .npz to names without it, so write through a file object
+        temp_path = path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(
+                f,
+                points=self.points,
+                labels=self.labels,
+                face_photo_ids=self.face_photo_ids,
+                photo_ids=np.asarray(list(self.photo_stamps.keys()), dtype=str),
+                photo_stamps=np.asarray(list(self.photo_stamps.values()), dtype=str),
+                eps=np.float64(self.eps)
+            )
+        os.replace(temp_path, path)
+        logging.info(f"Saved cluster state with {len(self.points)} face(s) to {path}.")
+
+    def is_compatible_with(self, photo_stamps: Dict[str, str]) -> bool:
+        """
+        Checks whether the given photos only add to the clustered ones. Returns False if a
+        clustered photo was removed or re-embedded (its blob or the embedding model changed),
+        which requires a full re-cluster.
+        """
+        for photo_id, stamp in self.photo_stamps.items():
+            if photo_stamps.get(photo_id, None) != stamp:
+                return False
+        return True
+
+    def assign(self, points: np.ndarray, face_photo_ids: Iterable[str], photo_stamps: Dict[str, str]) -> np.ndarray:
+        """
+        Adds new faces to the clustering, merging clusters they connect.
+
+        Args:
+            points (np.ndarray): N x 128 encodings of the new faces.
+            face_photo_ids (Iterable[str]): Photo ID per new face.
+            photo_stamps (Dict[str, str]): `embedding_stamp` of each newly added photo.
+
+        Returns:
+            np.ndarray: Labels of the new faces (labels of existing faces may change through merges).
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, EMBEDDING_DIMENSION)
+        existing = len(self.points)
+        next_label = int(self.labels.max()) + 1 if existing else 0
+        new_labels = np.arange(next_label, next_label + len(points))
+        union = _LabelUnion(next_label + len(points))
+        all_labels = np.concatenate([self.labels, new_labels])
+
+        # Neighbours of the new faces among both the existing and the other new faces
+        self.index.add_many(range(existing, existing + len(points)), points)
+        for i, neighbors in enumerate(self.index.query_radius_many(points, self.eps)):
+            for label in np.unique(all_labels[[row for row, _ in neighbors]]):
+                union.union(new_labels[i], label)
+
+        roots = np.array([union.find(label) for label in range(len(union.parent))])
+        _, compact = np.unique(roots, return_inverse=True)
+        self.labels = compact[all_labels]
+        self.points = np.concatenate([self.points, points])
+        self.face_photo_ids = np.concatenate([self.face_photo_ids, np.asarray(list(face_photo_ids), dtype=str)])
+        self.photo_stamps.update(photo_stamps)
+        logging.info(f"Assigned {len(points)} new face(s); {len(np.unique(self.labels))} cluster(s) in total.")
+        return self.labels[existing:]
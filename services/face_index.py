@@ -0,0 +1,302 @@
+import logging
+from typing import Hashable, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_codec import EMBEDDING_DIMENSION
+
+# Size of the float32 query x face distance matrix computed per chunk of an exact search
+EXACT_SEARCH_CHUNK_BYTES = 64 * 1024 * 1024
+
+def exact_search_chunk_size(face_count: int, chunk_bytes: int = EXACT_SEARCH_CHUNK_BYTES) -> int:
+    """Number of queries per exact-search chunk that keeps the distance matrix within `chunk_bytes`."""
+    return max(chunk_bytes // (4 * max(face_count, 1)), 1)
+
+class FaceIndex:
+    """
+    In-process approximate nearest-neighbour index over face encodings (IVF-flat).
+
+    Below `train_threshold` vectors the index is a flat matrix searched exactly. Past it,
+    a k-means coarse quantizer with about sqrt(N) centroids partitions the vectors into
+    inverted lists, and queries only scan the `nprobe` lists whose centroids are closest,
+    so a query touches roughly `nprobe / sqrt(N)` of the vectors. The quantizer is retrained
+    whenever the index has doubled since the last training. With `nprobe=None` the index is
+    exhaustive: it never trains and every query is an exact search, at any size.
+
+    Vectors are stored under arbitrary hashable keys (usernames, photo IDs, face row numbers)
+    and can be added and removed at any time.
+    """
+
+    def __init__(
+        self,
+        dimension: int = EMBEDDING_DIMENSION,
+        nprobe: int = 8,
+        train_threshold: int = 10000,
+        kmeans_iterations: int = 8,
+        seed: int = 0
+    ):
+        """
+        Args:
+            dimension (int): Length of the indexed vectors.
+            nprobe (int): Number of inverted lists scanned per query. Higher is slower but more exact;
+                          None always searches every vector exactly.
+            train_threshold (int): Size from which the index switches from exact flat search to IVF.
+            kmeans_iterations (int): Lloyd iterations when training the coarse quantizer.
+            seed (int): Seed for the k-means initialisation.
+        """
+        self.dimension = dimension
+        self.nprobe = nprobe
+        self.train_threshold = train_threshold
+        self.kmeans_iterations = kmeans_iterations
+        self._rng = np.random.default_rng(seed)
+
+        self._vectors = np.empty((0, dimension), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        self._live = np.empty(0, dtype=bool)
+        self._keys: List[Optional[Hashable]] = []  # slot -> key
+        self._slots = {}  # key -> slot
+        self._free: List[int] = []
+
+        self._centroids: Optional[np.ndarray] = None
+        self._lists: List[List[int]] = []  # centroid -> slots
+        self._list_blocks: List[Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = []  # contiguous copies per list
+        self._slot_list = np.empty(0, dtype=np.int64)  # slot -> centroid
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    def _reserve(self, count: int) -> List[int]:
+        """Returns `count` free slots, growing the storage geometrically if needed."""
+        slots = [self._free.pop() for _ in range(min(count, len(self._free)))]
+        missing = count - len(slots)
+        if missing:
+            start = len(self._keys)
+            needed = start + missing
+            if needed > len(self._vectors):
+                capacity = max(needed, 2 * len(self._vectors), 64)
+                grow = capacity - len(self._vectors)
+                self._vectors = np.concatenate([self._vectors, np.zeros((grow, self.dimension), dtype=np.float32)])
+                self._norms = np.concatenate([self._norms, np.zeros(grow, dtype=np.float32)])
+                self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+                self._slot_list = np.concatenate([self._slot_list, np.full(grow, -1, dtype=np.int64)])
+            self._keys.extend([None] * missing)
+            slots.extend(range(start, needed))
+        return slots
+
+    def add(self, key: Hashable, vector: np.ndarray):
+        """Adds or replaces the vector stored under `key`."""
+        self.add_many([key], np.asarray(vector).reshape(1, -1))
+
+    def add_many(self, keys: Iterable[Hashable], vectors: np.ndarray):
+        """Adds or replaces the vectors stored under `keys`."""
+        keys = list(keys)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(keys), self.dimension)
+        for key in keys:
+            if key in self._slots:
+                self.remove(key)
+
+        slots = self._reserve(len(keys))
+        slot_array = np.asarray(slots, dtype=np.int64)
+        self._vectors[slot_array] = vectors
+        self._norms[slot_array] = np.einsum('ij,ij->i', vectors, vectors)
+        self._live[slot_array] = True
+        for key, slot in zip(keys, slots):
+            self._keys[slot] = key
+            self._slots[key] = slot
+
+        if self.is_trained:
+            self._assign_to_lists(slot_array)
+        if self.nprobe is not None and len(self) >= self.train_threshold and len(self) >= 2 * self._trained_size:
+            self.train()
+
+    def remove(self, key: Hashable) -> bool:
+        """Removes the vector stored under `key`. Returns False if there was none."""
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return False
+        self._live[slot] = False
+        self._keys[slot] = None
+        self._free.append(slot)
+        if self.is_trained:
+            list_id = self._slot_list[slot]
+            self._lists[list_id].remove(slot)
+            self._list_blocks[list_id] = None
+            self._slot_list[slot] = -1
+        return True
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        slot = self._slots.get(key)
+        return None if slot is None else self._vectors[slot]
+
+    def train(self):
+        """(Re)trains the coarse quantizer on the current vectors and rebuilds the inverted lists."""
+        live_slots = np.flatnonzero(self._live)
+        nlist = max(int(np.sqrt(len(live_slots))), 1)
+        sample_size = min(len(live_slots), 32 * nlist)
+        sample = self._vectors[self._rng.choice(live_slots, sample_size, replace=False)]
+
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.kmeans_iterations):
+            assignment = self._nearest_centroids(sample, centroids, 1)[:, 0]
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            nonempty = counts > 0
+            centroids[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+        self._centroids = centroids
+        self._lists = [[] for _ in range(nlist)]
+        self._list_blocks = [None] * nlist
+        self._assign_to_lists(live_slots)
+        self._trained_size = len(live_slots)
+        logging.info(f"Trained face index with {nlist} lists over {len(live_slots)} vectors.")
+
+    @staticmethod
+    def _nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, count: int) -> np.ndarray:
+        """Indexes of the `count` nearest centroids of each vector."""
+        distances = np.einsum('ij,ij->i', centroids, centroids)[None, :] - 2.0 * vectors @ centroids.T
+        count = min(count, len(centroids))
+        if count == 1:
+            return np.argmin(distances, axis=1)[:, None]
+        return np.argpartition(distances, count - 1, axis=1)[:, :count]
+
+    def _assign_to_lists(self, slots: np.ndarray):
+        list_ids = self._nearest_centroids(self._vectors[slots], self._centroids, 1)[:, 0]
+        self._slot_list[slots] = list_ids
+        for slot, list_id in zip(slots.tolist(), list_ids.tolist()):
+            self._lists[list_id].append(slot)
+            self._list_blocks[list_id] = None
+
+    def _list_block(self, list_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Slots, vectors and squared norms of an inverted list, cached contiguously until it changes."""
+        block = self._list_blocks[list_id]
+        if block is None:
+            slots = np.asarray(self._lists[list_id], dtype=np.int64)
+            block = self._list_blocks[list_id] = (slots, self._vectors[slots], self._norms[slots])
+        return block
+
+    def _within(self, candidates: np.ndarray, squared: np.ndarray, radius: float) -> List[Tuple[Hashable, float]]:
+        """Keys and distances of the candidates within `radius`, nearest first."""
+        within = np.flatnonzero(squared <= radius * radius)
+        order = within[np.argsort(squared[within], kind='stable')]
+        distances = np.sqrt(np.maximum(squared[order], 0.0))
+        return [(self._keys[slot], float(d)) for slot, d in zip(candidates[order].tolist(), distances)]
+
+    def query_radius(self, vector: np.ndarray, radius: float) -> List[Tuple[Hashable, float]]:
+        """
+        Finds the stored vectors within `radius` (Euclidean) of `vector`.
+
+        Returns:
+            List[Tuple[Hashable, float]]: `(key, distance)` pairs sorted by distance.
+        """
+        return self.query_radius_many(np.asarray(vector).reshape(1, -1), radius)[0]
+
+    def query_radius_many(self, vectors: np.ndarray, radius: float, chunk_size: int = None) -> List[List[Tuple[Hashable, float]]]:
+        """
+        Runs `query_radius` for every row of `vectors`.
+
+        Exact searches compare a chunk of queries against every stored vector at once;
+        `chunk_size` defaults to `exact_search_chunk_size`, so memory stays bounded as the index grows.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        if len(self) == 0:
+            return [[] for _ in range(len(vectors))]
+        query_norms = np.einsum('ij,ij->i', vectors, vectors)
+
+        results = []
+        if not self.is_trained or self.nprobe is None:
+            # Exact search: one matrix product per chunk of queries
+            candidates = np.flatnonzero(self._live)
+            stored, norms = self._vectors[candidates], self._norms[candidates]
+            chunk_size = chunk_size or exact_search_chunk_size(len(candidates))
+            for start in range(0, len(vectors), chunk_size):
+                chunk = slice(start, start + chunk_size)
+                squared = norms[None, :] - 2.0 * (vectors[chunk] @ stored.T) + query_norms[chunk, None]
+                results.extend(self._within(candidates, row, radius) for row in squared)
+            return results
+
+        probes = self._nearest_centroids(vectors, self._centroids, self.nprobe)
+        for query, query_norm, query_probes in zip(vectors, query_norms, probes):
+            blocks = [self._list_block(list_id) for list_id in query_probes]
+            candidates = np.concatenate([slots for slots, _, _ in blocks])
+            squared = np.concatenate([norms - 2.0 * (stored @ query) for _, stored, norms in blocks]) + query_norm
+            results.append(self._within(candidates, squared, radius))
+        return results
+
+class EmbeddingMatrix:
+    """
+    Exact counterpart of `FaceIndex` for small keyed sets such as the registered users:
+    all embeddings stacked in one contiguous matrix, row-aligned with `keys`, so matching
+    many faces against every entry is a single vectorised distance computation.
+    """
+
+    def __init__(self, dimension: int = EMBEDDING_DIMENSION):
+        self.dimension = dimension
+        self.keys: List[Hashable] = []
+        self._rows = {}  # key -> row
+        self._matrix = np.empty((0, dimension), dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._rows
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """len(self) x dimension view of the stored embeddings."""
+        return self._matrix[:len(self.keys)]
+
+    def set(self, key: Hashable, embedding: np.ndarray):
+        """Adds or replaces the embedding stored under `key`."""
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(self.dimension)
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if row == len(self._matrix):
+                capacity = max(2 * len(self._matrix), 16)
+                self._matrix = np.concatenate([self._matrix, np.zeros((capacity - row, self.dimension), dtype=np.float32)])
+                self._norms = np.concatenate([self._norms, np.zeros(capacity - row, dtype=np.float32)])
+            self.keys.append(key)
+            self._rows[key] = row
+        self._matrix[row] = embedding
+        self._norms[row] = embedding @ embedding
+
+    def remove(self, key: Hashable) -> bool:
+        """Removes `key`, moving the last row into its place. Returns False if it was not stored."""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return False
+        last = len(self.keys) - 1
+        if row != last:
+            moved = self.keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._norms[row] = self._norms[last]
+            self.keys[row] = moved
+            self._rows[moved] = row
+        self.keys.pop()
+        return True
+
+    def distances(self, vectors: np.ndarray) -> np.ndarray:
+        """N x len(self) matrix of Euclidean distances from each vector to each stored embedding."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dimension)
+        count = len(self.keys)
+        squared = (
+            np.einsum('ij,ij->i', vectors, vectors)[:, None]
+            + self._norms[None, :count]
+            - 2.0 * (vectors @ self._matrix[:count].T)
+        )
+        return np.sqrt(np.maximum(squared, 0.0))
+
+    def matches(self, vectors: np.ndarray, tolerance: float) -> np.ndarray:
+        """N x len(self) boolean matrix; True where a vector is within `tolerance` of a stored embedding."""
+        return self.distances(vectors) <= tolerance
@@ -1,24 +1,89 @@
 import face_recognition
 import numpy as np
 from models.photo import Photo
-from typing import List
+from face_detection import detect_and_encode, batch_detect_and_encode, to_original_locations, DEFAULT_MAX_DETECTION_DIMENSION
+from image_loader import decode_image, ImageSource
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Optional, Tuple
+import logging
 
-def process_photo(image_data: bytes, filename: str) -> Photo:
-    import io
-    from PIL import Image
+# Threads decoding images for process_photos; PIL releases the GIL while decoding
+DECODE_WORKERS = 4
 
-    # Load the image from bytes
-    image = Image.open(io.BytesIO(image_data))
-    image = image.convert('RGB')  # Ensure the image is in RGB format
-    image_array = np.array(image)
+def _try_decode_image(upload: Tuple[str, ImageSource], max_decode_dimension: Optional[int]):
+    filename, source = upload
+    try:
+        return decode_image(source, max_decode_dimension)
+    except Exception as e:
+        logging.error(f"Error decoding image {filename}: {e}")
+        return None
 
-    # Detect face locations
-    face_locations = face_recognition.face_locations(image_array, model='hog')
+def process_photo(
+    source: ImageSource,
+    filename: str,
+    max_detection_dimension: int = DEFAULT_MAX_DETECTION_DIMENSION,
+    max_decode_dimension: Optional[int] = None
+) -> Photo:
+    """
+    Detects and encodes the faces in one uploaded image.
 
-    # Extract face encodings
-    face_encodings = face_recognition.face_encodings(image_array, face_locations)
+    Args:
+        source (ImageSource): Path of the spooled upload, or its bytes.
+        filename (str): Name of the uploaded file.
+        max_detection_dimension (int): Longest side to run detection at.
+        max_decode_dimension (int): Longest side JPEGs need to be decoded at; see
+                                    image_loader.decode_image. Faces are then also encoded at
+                                    this reduced size. None decodes at full resolution.
+
+    Returns:
+        Photo: The processed photo, with face locations in full-resolution coordinates.
+    """
+    # Decode straight into a single RGB array, reduced while decoding where allowed
+    image_array, original_size = decode_image(source, max_decode_dimension)
+
+    # Detect face locations (optionally on a downscaled copy) and extract
+    # face encodings at decoded resolution
+    face_locations, face_encodings = detect_and_encode(image_array, max_detection_dimension)
+    face_locations = to_original_locations(face_locations, image_array.shape, original_size)
 
     # Create a Photo object
-    photo = Photo(filename=filename, face_encodings=face_encodings)
+    photo = Photo(file_path=filename, face_encodings=face_encodings, face_locations=face_locations)
 
     return photo
+
+def process_photos(
+    uploads: List[Tuple[str, ImageSource]],
+    max_detection_dimension: int = DEFAULT_MAX_DETECTION_DIMENSION,
+    model: str = 'hog',
+    batch_size: int = 32,
+    pad_to: Optional[int] = 64,
+    max_decode_dimension: Optional[int] = None
+) -> List[Optional[Photo]]:
+    """
+    Processes many uploaded images at once: decodes them on a few threads, then detects and
+    encodes faces with `batch_detect_and_encode`, which batches detection for the CNN model.
+
+    Args:
+        uploads (List[Tuple[str, ImageSource]]): (filename, image bytes or path) pairs.
+        max_detection_dimension (int): Longest side to run detection at.
+        model (str): 'hog' or 'cnn'.
+        batch_size (int): Maximum number of images per CNN detector call.
+        pad_to (int): Letterbox granularity that lets similarly sized images share a CNN batch.
+        max_decode_dimension (int): Longest side JPEGs need to be decoded at; see `process_photo`.
+
+    Returns:
+        List[Optional[Photo]]: A Photo per upload, in order, or None where the image could not be decoded.
+    """
+    with ThreadPoolExecutor(max_workers=min(DECODE_WORKERS, len(uploads)) or 1) as pool:
+        images = list(pool.map(partial(_try_decode_image, max_decode_dimension=max_decode_dimension), uploads))
+
+    decoded = [i for i, image in enumerate(images) if image is not None]
+    results = batch_detect_and_encode([images[i][0] for i in decoded], max_detection_dimension, model, batch_size, pad_to)
+
+    photos: List[Optional[Photo]] = [None] * len(uploads)
+    for i, (face_locations, face_encodings) in zip(decoded, results):
+        image_array, original_size = images[i]
+        face_locations = to_original_locations(face_locations, image_array.shape, original_size)
+        photos[i] = Photo(file_path=uploads[i][0], face_encodings=face_encodings, face_locations=face_locations)
+    return photos
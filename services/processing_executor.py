@@ -0,0 +1,149 @@
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Optional
+
+class ExecutorSaturated(Exception):
+    """Raised when a job is submitted while the executor's queue is full."""
+
+class ExecutorSlot:
+    """
+    A place claimed in a ProcessingExecutor by `reserve`. Either `submit` one job into it, which
+    holds the slot until the job finishes on the pool, or `release` it unused. Releasing a slot
+    that was already released or handed to a job does nothing, so callers can release in `finally`.
+
+    Callbacks added with `add_release_callback` run when the slot is freed, so whatever the job
+    reads (e.g. a spooled upload) is only cleaned up once nothing on the pool can still use it.
+    """
+
+    def __init__(self, executor: 'ProcessingExecutor'):
+        self._executor = executor
+        self._held = True
+        self._callbacks = []
+
+    def add_release_callback(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """Schedules `fn(*args, **kwargs)` in this slot and returns an awaitable for its result."""
+        if not self._held:
+            raise RuntimeError("Executor slot was already used or released.")
+        self._held = False
+        try:
+            loop = asyncio.get_running_loop()
+            job = self._executor._get_executor().submit(partial(fn, *args, **kwargs))
+        except Exception:
+            self._free()
+            raise
+        # Free the slot when the pool job finishes rather than when its awaiter does: a cancelled
+        # request (e.g. a client disconnect) must not free the slot of a job still running.
+        # Cancelling the returned future only cancels jobs that haven't started.
+        job.add_done_callback(lambda _: self._free())
+        return asyncio.wrap_future(job, loop=loop)
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self._free()
+
+    def _free(self):
+        self._executor._release()
+        for callback in self._callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logging.error(f"Executor slot release callback failed: {e}")
+
+class ProcessingExecutor:
+    """
+    Runs CPU-bound photo processing off the event loop on a thread or process pool, with
+    backpressure: at most `max_workers + max_queue` jobs are accepted at once and further
+    submissions fail immediately with `ExecutorSaturated` instead of queueing without bound.
+
+    Configured from the environment by `from_env`:
+        PHOTOBOMB_EXECUTOR    'process' (default) or 'thread'
+        PHOTOBOMB_WORKERS     pool size (default: number of CPUs)
+        PHOTOBOMB_MAX_QUEUE   jobs allowed to wait for a worker (default: 2 x workers)
+    """
+
+    def __init__(self, kind: str = 'process', max_workers: int = None, max_queue: int = None):
+        if kind not in ('process', 'thread'):
+            raise ValueError(f"Unknown executor kind '{kind}'.")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = self.max_workers * 2 if max_queue is None else max_queue
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+        # Slots are released from the pool's completion callbacks, which run off the event loop
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'ProcessingExecutor':
+        workers = os.environ.get('PHOTOBOMB_WORKERS')
+        max_queue = os.environ.get('PHOTOBOMB_MAX_QUEUE')
+        return cls(
+            kind=os.environ.get('PHOTOBOMB_EXECUTOR', 'process'),
+            max_workers=int(workers) if workers else None,
+            max_queue=int(max_queue) if max_queue else None
+        )
+
+    @property
+    def in_flight(self) -> int:
+        """Jobs currently running or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.max_queue
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            pool = ProcessPoolExecutor if self.kind == 'process' else ThreadPoolExecutor
+            self._executor = pool(max_workers=self.max_workers)
+            logging.info(f"Started {self.kind} pool with {self.max_workers} worker(s) and a queue of {self.max_queue}.")
+        return self._executor
+
+    def reserve(self) -> ExecutorSlot:
+        """
+        Claims a slot for a job ahead of submitting it, so cleanup of whatever the job reads
+        (see `ExecutorSlot.add_release_callback`) is in place before it is queued.
+
+        Raises:
+            ExecutorSaturated: If the executor already holds `capacity` jobs.
+        """
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise ExecutorSaturated(f"{self._in_flight} jobs in flight.")
+            self._in_flight += 1
+        return ExecutorSlot(self)
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs) -> asyncio.Future:
+        """
+        Schedules `fn(*args, **kwargs)` on the pool and returns an awaitable for its result.
+        The slot is claimed immediately, so saturation is reported before anything is queued.
+
+        Raises:
+            ExecutorSaturated: If the executor already holds `capacity` jobs.
+        """
+        return self.reserve().submit(fn, *args, **kwargs)
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Runs `fn(*args, **kwargs)` on the pool and awaits its result.
+
+        Raises:
+            ExecutorSaturated: If the executor already holds `capacity` jobs.
+        """
+        return await self.submit(fn, *args, **kwargs)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,139 @@
+import io
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, List, Tuple, Union
+
+from services.upload_spool import UploadTooLarge
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+ARCHIVE_EXTENSIONS = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+class TooManyFiles(ValueError):
+    """Raised when an upload expands to more images than allowed."""
+
+def is_image_filename(filename: str) -> bool:
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+def is_archive_filename(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_EXTENSIONS)
+
+def _is_image_member(name: str) -> bool:
+    # Skip macOS resource forks (__MACOSX/._photo.jpg) that archivers add next to real images
+    return is_image_filename(name) and not os.path.basename(name).startswith('._')
+
+class _SizeBudget:
+    """Checks each image against the per-file limit and all of them against the total limit."""
+
+    def __init__(self, filename: str, max_file_bytes: int, max_total_bytes: int):
+        self.filename = filename
+        self.max_file_bytes = max_file_bytes
+        self.remaining = max_total_bytes
+
+    def claim(self, name: str, size: int):
+        """Claims `size` bytes for image `name` before it is read, so oversized members are never decompressed."""
+        if size > self.max_file_bytes:
+            raise UploadTooLarge(f"{name} is larger than {self.max_file_bytes} bytes.")
+        self.skip(size)
+
+    def skip(self, size: int):
+        """Claims `size` bytes that are decompressed but not kept, which only count towards the total."""
+        if size > self.remaining:
+            raise UploadTooLarge(f"{self.filename} expands to more than the allowed total size.")
+        self.remaining -= size
+
+    def read(self, name: str, f: BinaryIO) -> bytes:
+        """Reads a file whose size wasn't known up front, stopping one byte past the limit."""
+        data = f.read(min(self.max_file_bytes, self.remaining) + 1)
+        self.claim(name, len(data))
+        return data
+
+def expand_upload(
+    filename: str,
+    data: Union[bytes, BinaryIO],
+    max_files: int,
+    max_file_bytes: int,
+    max_total_bytes: int
+) -> List[Tuple[str, bytes]]:
+    """
+    Turns one uploaded file into the images it contains: an image is returned as is, a zip or
+    tar archive is unpacked into its image members (other members and directories are skipped).
+
+    Archive members are checked against the size limits using their sizes from the archive's
+    directory before they are decompressed, and reads never go past the limits, so a small
+    archive that expands to a huge one (a "zip bomb") is rejected without being unpacked.
+
+    Args:
+        filename (str): Name of the uploaded file.
+        data (bytes | BinaryIO): Its contents, or a seekable binary file holding them.
+        max_files (int): Maximum number of images to return.
+        max_file_bytes (int): Largest (uncompressed) image accepted.
+        max_total_bytes (int): Largest total (uncompressed) size of the returned images. Skipped
+                               tar members count too, as they are decompressed on the way past.
+
+    Returns:
+        List[Tuple[str, bytes]]: (filename, image bytes) pairs. Archive members are named
+                                 'archive.zip/member.jpg'.
+
+    Raises:
+        TooManyFiles: If the upload holds more than `max_files` images.
+        UploadTooLarge: If an image or the images together exceed the size limits.
+        ValueError: If the file is neither an image nor a readable archive.
+    """
+    if isinstance(data, bytes):
+        data = io.BytesIO(data)
+    budget = _SizeBudget(filename, max_file_bytes, max_total_bytes)
+
+    if is_image_filename(filename):
+        images = [(filename, budget.read(filename, data))]
+    elif filename.lower().endswith('.zip'):
+        images = _expand_zip(filename, data, max_files, budget)
+    elif is_archive_filename(filename):
+        images = _expand_tar(filename, data, max_files, budget)
+    else:
+        raise ValueError(f"Unsupported file type: {filename}")
+
+    if len(images) > max_files:
+        raise TooManyFiles(f"{filename} holds more than {max_files} images.")
+    return images
+
+def _expand_zip(filename: str, data: BinaryIO, max_files: int, budget: _SizeBudget) -> List[Tuple[str, bytes]]:
+    try:
+        archive = zipfile.ZipFile(data)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Could not read {filename}: {e}")
+    images = []
+    with archive:
+        for info in archive.infolist():
+            if info.is_dir() or not _is_image_member(info.filename):
+                continue
+            if len(images) == max_files:
+                raise TooManyFiles(f"{filename} holds more than {max_files} images.")
+            name = f"{filename}/{info.filename}"
+            budget.claim(name, info.file_size)
+            # zipfile stops decompressing at the declared size and checks the CRC, so the
+            # claimed size bounds what is read
+            with archive.open(info) as member:
+                images.append((name, member.read()))
+    return images
+
+def _expand_tar(filename: str, data: BinaryIO, max_files: int, budget: _SizeBudget) -> List[Tuple[str, bytes]]:
+    try:
+        archive = tarfile.open(fileobj=data)
+    except tarfile.TarError as e:
+        raise ValueError(f"Could not read {filename}: {e}")
+    images = []
+    with archive:
+        for member in archive:
+            if not member.isfile():
+                continue
+            if not _is_image_member(member.name):
+                # Compressed tars are a single stream, so skipping a member still decompresses it
+                budget.skip(member.size)
+                continue
+            if len(images) == max_files:
+                raise TooManyFiles(f"{filename} holds more than {max_files} images.")
+            name = f"{filename}/{member.name}"
+            budget.claim(name, member.size)
+            images.append((name, archive.extractfile(member).read()))
+    return images
@@ -0,0 +1,89 @@
+import time
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Dict, Optional
+
+PENDING = 'pending'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+class UploadJob:
+    """Status and result of one photo processed in the background."""
+
+    def __init__(self, filename: str):
+        self.job_id = str(uuid.uuid4())
+        self.filename = filename
+        self.status = PENDING
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status != PENDING
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at
+        }
+
+class UploadJobStore:
+    """
+    In-memory registry of background upload jobs. Finished jobs are kept for polling until
+    more than `max_finished` have accumulated, after which the oldest are dropped.
+    """
+
+    def __init__(self, max_finished: int = 1000):
+        self.max_finished = max_finished
+        self._jobs: 'OrderedDict[str, UploadJob]' = OrderedDict()
+        # References to running tasks so they are not garbage collected before finishing
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def get(self, job_id: str) -> Optional[UploadJob]:
+        return self._jobs.get(job_id)
+
+    def start(self, filename: str, work: Awaitable[Dict[str, Any]]) -> UploadJob:
+        """
+        Registers a job and runs `work` in the background, recording its result or error.
+
+        Args:
+            filename (str): Name of the uploaded file, for reporting.
+            work (Awaitable[Dict[str, Any]]): Awaitable producing the job's result.
+
+        Returns:
+            UploadJob: The new job, still pending.
+        """
+        job = UploadJob(filename)
+        self._jobs[job.job_id] = job
+        self._tasks[job.job_id] = asyncio.ensure_future(self._run(job, work))
+        return job
+
+    async def _run(self, job: UploadJob, work: Awaitable[Dict[str, Any]]):
+        try:
+            job.result = await work
+            job.status = SUCCEEDED
+        except Exception as e:
+            logging.error(f"Upload job {job.job_id} ({job.filename}) failed: {e}")
+            job.error = str(e)
+            job.status = FAILED
+        finally:
+            job.finished_at = time.time()
+            self._tasks.pop(job.job_id, None)
+            self._prune()
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.is_finished]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+from fastapi import UploadFile
+
+# Size of each read from the upload stream, so buffering never exceeds it regardless of file size
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the allowed size."""
+
+async def spool_upload(file: UploadFile, max_bytes: int, chunk_size: int = SPOOL_CHUNK_BYTES, directory: str = None) -> str:
+    """
+    Copies an upload to a named temporary file one chunk at a time, so the whole file is never
+    held in memory. Workers, possibly in other processes, then decode straight from the file;
+    Starlette's own spool is an anonymous file they couldn't open by path.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        max_bytes (int): Largest upload accepted.
+        chunk_size (int): Bytes read from the upload at a time.
+        directory (str): Directory to create the file in. Defaults to the system temp directory.
+
+    Returns:
+        str: Path of the temporary file. The caller must remove it.
+
+    Raises:
+        UploadTooLarge: If the upload is larger than `max_bytes`; nothing is left on disk.
+    """
+    suffix = os.path.splitext(file.filename or '')[1]
+    fd, path = tempfile.mkstemp(prefix='photobomb-upload-', suffix=suffix, dir=directory)
+    try:
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"{file.filename} is larger than {max_bytes} bytes.")
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+def remove_spooled_upload(path: str):
+    """Removes a file created by `spool_upload`, if it is still there."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
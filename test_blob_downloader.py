@@ -0,0 +1,77 @@
+import os
+import time
+import base64
+import hashlib
+import tempfile
+import threading
+import unittest
+
+from blob_downloader import BlobPrefetcher, LocalBucket
+
+
+class Test_blob_downloader(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        os.makedirs(os.path.join(self.root, 'photos', 'user1'))
+        self.content = b'not really a jpeg'
+        with open(os.path.join(self.root, 'photos', 'user1', 'a.jpg'), 'wb') as f:
+            f.write(self.content)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_local_bucket_get_blob(self):
+        bucket = LocalBucket(self.root)
+        blob = bucket.get_blob('photos/user1/a.jpg')
+
+        self.assertIsNotNone(blob)
+        self.assertEqual(blob.download_as_bytes(), self.content)
+        self.assertEqual(blob.md5_hash, base64.b64encode(hashlib.md5(self.content).digest()).decode('utf-8'))
+        self.assertIsNone(bucket.get_blob('photos/user1/missing.jpg'))
+
+    def test_local_blob_download_to_filename(self):
+        blob = LocalBucket(self.root).blob('photos/user1/a.jpg')
+        target = os.path.join(self.root, 'copy.jpg')
+        blob.download_to_filename(target)
+
+        with open(target, 'rb') as f:
+            self.assertEqual(f.read(), self.content)
+
+    def test_prefetch_preserves_order(self):
+        prefetcher = BlobPrefetcher(workers=4, depth=4)
+        results = list(prefetcher.prefetch(lambda n: n * n, range(20)))
+
+        self.assertEqual(results, [(n, n * n) for n in range(20)])
+
+    def test_prefetch_reports_failures_as_none(self):
+        def fetch(n):
+            if n == 2:
+                raise IOError("boom")
+            return n
+
+        results = dict(BlobPrefetcher(workers=2, depth=2).prefetch(fetch, range(4)))
+
+        self.assertEqual(results, {0: 0, 1: 1, 2: None, 3: 3})
+
+    def test_prefetch_runs_ahead_of_consumer(self):
+        started = []
+        lock = threading.Lock()
+
+        def fetch(n):
+            with lock:
+                started.append(n)
+            return n
+
+        results = BlobPrefetcher(workers=2, depth=3).prefetch(fetch, range(10))
+        next(results)
+        time.sleep(0.1)
+
+        # The first item plus a full window behind it have been started
+        self.assertEqual(sorted(started), [0, 1, 2, 3])
+        results.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from services.clustering_service import ClusterState, DEFAULT_EPS, embedding_stamp
+from services.face_index import FaceIndex
+
+
+def make_faces(people, faces_per_person, seed=0):
+    """Faces scattered tightly around one random centre per person, in random order."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=0.3, size=(people, 128))
+    faces = np.repeat(centres, faces_per_person, axis=0) + rng.normal(scale=0.02, size=(people * faces_per_person, 128))
+    return rng.permutation(faces).astype(np.float32)
+
+
+def partition(labels):
+    """Set of clusters, each a frozenset of face rows, so labellings can be compared up to renaming."""
+    clusters = {}
+    for row, label in enumerate(np.asarray(labels).tolist()):
+        clusters.setdefault(label, set()).add(row)
+    return {frozenset(rows) for rows in clusters.values()}
+
+
+class Test_clustering_service(unittest.TestCase):
+
+    def setUp(self):
+        self.faces = make_faces(people=40, faces_per_person=10)
+        self.face_photo_ids = [f"photo{i}" for i in range(len(self.faces))]
+        self.stamps = {photo_id: embedding_stamp(f"hash{i}", 'v1') for i, photo_id in enumerate(self.face_photo_ids)}
+        self.expected = partition(DBSCAN(eps=DEFAULT_EPS, min_samples=1).fit(self.faces).labels_)
+
+    def test_fit_matches_dbscan(self):
+        state = ClusterState.fit(self.faces, self.face_photo_ids, self.stamps)
+
+        self.assertEqual(partition(state.labels), self.expected)
+
+    def test_assign_matches_dbscan(self):
+        split = 150
+        state = ClusterState.fit(self.faces[:split], self.face_photo_ids[:split],
+                                 {photo_id: self.stamps[photo_id] for photo_id in self.face_photo_ids[:split]})
+        new_labels = state.assign(self.faces[split:], self.face_photo_ids[split:],
+                                  {photo_id: self.stamps[photo_id] for photo_id in self.face_photo_ids[split:]})
+
+        self.assertEqual(len(new_labels), len(self.faces) - split)
+        self.assertEqual(partition(state.labels), self.expected)
+        self.assertEqual(state.face_photo_ids.tolist(), self.face_photo_ids)
+        self.assertEqual(state.photo_stamps, self.stamps)
+
+    def test_assign_matches_dbscan_above_train_threshold(self):
+        # Enough faces that an approximate index would have switched to IVF search, spread so
+        # the neighbour graph is sparse and a single missed neighbour changes the partition
+        faces = np.random.default_rng(1).normal(scale=0.042, size=(10500, 128)).astype(np.float32)
+        self.assertGreater(len(faces), FaceIndex().train_threshold)
+        face_photo_ids = [f"photo{i}" for i in range(len(faces))]
+        expected = partition(DBSCAN(eps=DEFAULT_EPS, min_samples=1).fit(faces).labels_)
+
+        split = len(faces) - 500
+        state = ClusterState.fit(faces[:split], face_photo_ids[:split], {})
+        state.assign(faces[split:], face_photo_ids[split:], {})
+
+        self.assertEqual(partition(state.labels), expected)
+        self.assertFalse(state.index.is_trained)
+
+    def test_save_and_load(self):
+        state = ClusterState.fit(self.faces, self.face_photo_ids, self.stamps)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'cluster_state.npz')
+            self.assertIsNone(ClusterState.load(path))
+            state.save(path)
+            loaded = ClusterState.load(path)
+
+        np.testing.assert_array_equal(loaded.points, state.points)
+        np.testing.assert_array_equal(loaded.labels, state.labels)
+        self.assertEqual(loaded.face_photo_ids.tolist(), self.face_photo_ids)
+        self.assertEqual(loaded.photo_stamps, self.stamps)
+        self.assertEqual(loaded.eps, DEFAULT_EPS)
+
+    def test_compatibility(self):
+        state = ClusterState.fit(self.faces, self.face_photo_ids, self.stamps)
+
+        added = dict(self.stamps, new_photo=embedding_stamp('hash-new', 'v1'))
+        self.assertTrue(state.is_compatible_with(added))
+        removed = dict(self.stamps)
+        del removed['photo0']
+        self.assertFalse(state.is_compatible_with(removed))
+        new_blob = dict(self.stamps, photo0=embedding_stamp('other', 'v1'))
+        self.assertFalse(state.is_compatible_with(new_blob))
+        # Same blob re-embedded by a newer model
+        new_model = dict(self.stamps, photo0=embedding_stamp('hash0', 'v2'))
+        self.assertFalse(state.is_compatible_with(new_model))
+
+
+if __name__ == '__main__':
+    unittest.main()
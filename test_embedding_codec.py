@@ -0,0 +1,62 @@
+import base64
+import os
+import pickle
+import unittest
+
+import numpy as np
+
+from embedding_codec import decode_embeddings, encode_embeddings, is_compact, is_legacy
+
+
+class Test_embedding_codec(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.encodings = [rng.normal(scale=0.1, size=128) for _ in range(3)]
+
+    def test_round_trip_float32(self):
+        value = encode_embeddings(self.encodings)
+
+        self.assertTrue(is_compact(value))
+        self.assertEqual(len(value), 11 + 3 * 128 * 4)
+        decoded = decode_embeddings(value)
+        self.assertEqual(decoded.shape, (3, 128))
+        self.assertEqual(decoded.dtype, np.float32)
+        np.testing.assert_allclose(decoded, self.encodings, atol=1e-6)
+
+    def test_round_trip_float16(self):
+        value = encode_embeddings(self.encodings, dtype='float16')
+
+        self.assertEqual(len(value), 11 + 3 * 128 * 2)
+        np.testing.assert_allclose(decode_embeddings(value), self.encodings, atol=1e-3)
+
+    def test_empty(self):
+        self.assertEqual(decode_embeddings(encode_embeddings([])).shape, (0, 128))
+        self.assertEqual(decode_embeddings(None).shape, (0, 128))
+        self.assertEqual(decode_embeddings('').shape, (0, 128))
+
+    def test_reads_legacy_pickled_list(self):
+        legacy = base64.b64encode(pickle.dumps(self.encodings)).decode('utf-8').rstrip('=')
+
+        self.assertTrue(is_legacy(legacy))
+        np.testing.assert_allclose(decode_embeddings(legacy), self.encodings, atol=1e-6)
+
+    def test_reads_legacy_pickled_single_array(self):
+        legacy = base64.b64encode(pickle.dumps(self.encodings[0])).decode('utf-8')
+
+        self.assertEqual(decode_embeddings(legacy).shape, (1, 128))
+
+    def test_reads_plain_lists(self):
+        lists = [encoding.tolist() for encoding in self.encodings]
+
+        np.testing.assert_allclose(decode_embeddings(lists), self.encodings, atol=1e-6)
+
+    def test_refuses_arbitrary_pickles(self):
+        malicious = base64.b64encode(pickle.dumps(os.system)).decode('utf-8')
+
+        with self.assertRaises(pickle.UnpicklingError):
+            decode_embeddings(malicious)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import io
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+import encoding_engine
+import face_detection
+from encoding_engine import FaceEncodingEngine, _encode_batch
+from test_face_detection import FakeFaceRecognition
+
+
+def encode(marker):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((40, 40, 3), marker, dtype=np.uint8)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class FakeExecutor:
+    """
+    Runs each batch inline. Futures are only counted as collected once `encode_unordered`
+    yields their keys, so `peak` is the most batches that were ever in flight at once.
+    """
+
+    def __init__(self):
+        self.submitted = 0
+        self.collected = 0
+        self.peak = 0
+
+    def submit(self, fn, sources):
+        self.submitted += 1
+        self.peak = max(self.peak, self.submitted - self.collected)
+        future = Future()
+        future.set_result([[np.full(128, len(sources))] for _ in sources])
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class Test_encode_batch(unittest.TestCase):
+
+    def test_failed_images_are_none_in_place(self):
+        patches = [
+            mock.patch.object(face_detection, 'face_recognition', FakeFaceRecognition()),
+            mock.patch.object(encoding_engine, '_face_detection', face_detection),
+            mock.patch.object(encoding_engine, '_detection_options', {'model': 'cnn'})
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        results = _encode_batch([encode(1), b'not an image', encode(3), b'', encode(5)])
+
+        self.assertEqual([None if r is None else int(r[0][0]) for r in results], [1, None, 3, None, 5])
+
+
+class Test_encode_unordered(unittest.TestCase):
+
+    def run_engine(self, jobs, batch_size, max_pending):
+        engine = FaceEncodingEngine(workers=1, max_pending=max_pending, batch_size=batch_size)
+        executor = engine._executor = FakeExecutor()
+        results = {}
+        for key, encodings in engine.encode_unordered(jobs):
+            results[key] = encodings
+            executor.collected = len(results) // batch_size
+        return executor, results
+
+    def test_max_pending_bounds_batches_in_flight(self):
+        for max_pending in (1, 3):
+            executor, results = self.run_engine(((str(i), b'') for i in range(20)), batch_size=2, max_pending=max_pending)
+
+            self.assertEqual(executor.submitted, 10)
+            self.assertEqual(executor.peak, max_pending)
+            self.assertEqual(sorted(results, key=int), [str(i) for i in range(20)])
+
+    def test_jobs_are_consumed_lazily(self):
+        consumed = []
+
+        def jobs():
+            for i in range(20):
+                consumed.append(i)
+                yield str(i), b''
+
+        engine = FaceEncodingEngine(workers=1, max_pending=2, batch_size=2)
+        engine._executor = FakeExecutor()
+        next(engine.encode_unordered(jobs()))
+
+        # Two batches in flight, plus the batch that had to wait for a free slot
+        self.assertEqual(len(consumed), 6)
+
+    def test_partial_last_batch(self):
+        executor, results = self.run_engine([('a', b''), ('b', b''), ('c', b'')], batch_size=2, max_pending=4)
+
+        self.assertEqual(executor.submitted, 2)
+        self.assertEqual(len(results['a'][0]), 128)
+        self.assertEqual(results['c'][0][0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,196 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import face_detection
+from face_detection import (
+    detection_scale, rescale_locations, to_original_locations, downscale,
+    _letterbox, batch_detect_face_locations, batch_detect_and_encode
+)
+
+
+class FakeFaceRecognition:
+    """
+    Stands in for face_recognition. Each image is filled with a marker value, which the fake
+    detector reports back as a box `(marker, marker + 10, marker + 10, marker)`.
+    """
+
+    def __init__(self, boxes=None):
+        self.batches = []
+        self.boxes = boxes
+
+    def _locations(self, image):
+        if self.boxes is not None:
+            return list(self.boxes)
+        marker = int(image[0, 0, 0])
+        return [(marker, marker + 10, marker + 10, marker)]
+
+    def batch_face_locations(self, images, number_of_times_to_upsample, batch_size):
+        self.batches.append([image.shape[:2] for image in images])
+        return [self._locations(image) for image in images]
+
+    def face_locations(self, image, number_of_times_to_upsample, model):
+        return self._locations(image)
+
+    def face_encodings(self, image, locations):
+        return [np.full(128, image[0, 0, 0], dtype=np.float64) for _ in locations]
+
+
+def marked(height, width, marker):
+    return np.full((height, width, 3), marker, dtype=np.uint8)
+
+
+class Test_detection_scale(unittest.TestCase):
+
+    def test_fits_longest_side(self):
+        self.assertEqual(detection_scale(3000, 4000, 1000), 0.25)
+        self.assertEqual(detection_scale(4000, 3000, 1000), 0.25)
+
+    def test_images_under_the_limit_are_not_scaled(self):
+        self.assertEqual(detection_scale(600, 800, 1000), 1.0)
+        self.assertEqual(detection_scale(1000, 800, 1000), 1.0)
+        self.assertEqual(detection_scale(3000, 4000, None), 1.0)
+
+
+class Test_rescale_locations(unittest.TestCase):
+
+    def test_round_trip(self):
+        height, width = 3000, 4000
+        scale = detection_scale(height, width, 1000)
+        original = [(400, 2000, 1200, 1200), (0, 4000, 3000, 0)]
+        scaled = [tuple(int(round(side * scale)) for side in box) for box in original]
+
+        self.assertEqual(rescale_locations(scaled, scale, height, width), original)
+
+    def test_clamps_to_image_edges(self):
+        # The detector can return boxes reaching past the scaled image
+        locations = rescale_locations([(-5, 1010, 760, -3)], 0.25, 3000, 4000)
+
+        self.assertEqual(locations, [(0, 4000, 3000, 0)])
+
+    def test_unscaled_is_unchanged(self):
+        locations = [(10, 90, 80, 20)]
+
+        self.assertEqual(rescale_locations(locations, 1.0, 100, 100), locations)
+
+
+class Test_to_original_locations(unittest.TestCase):
+
+    def test_reduced_decode(self):
+        # A 1600x1200 JPEG drafted down to 400x300
+        locations = to_original_locations([(30, 200, 130, 100)], (300, 400, 3), (1200, 1600))
+
+        self.assertEqual(locations, [(120, 800, 520, 400)])
+
+    def test_full_decode_is_unchanged(self):
+        locations = [(30, 200, 130, 100)]
+
+        self.assertIs(to_original_locations(locations, (300, 400, 3), (300, 400)), locations)
+
+
+class Test_downscale(unittest.TestCase):
+
+    def test_resizes_to_scale(self):
+        image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+
+        scaled = downscale(image, detection_scale(3000, 4000, 1000))
+
+        self.assertEqual(scaled.shape, (750, 1000, 3))
+        self.assertEqual(scaled.dtype, np.uint8)
+
+    def test_keeps_at_least_one_pixel(self):
+        image = np.zeros((2, 4000, 3), dtype=np.uint8)
+
+        self.assertEqual(downscale(image, 0.01).shape, (1, 40, 3))
+
+    def test_unscaled_returns_same_array(self):
+        image = np.zeros((10, 10, 3), dtype=np.uint8)
+
+        self.assertIs(downscale(image, 1.0), image)
+
+
+class Test_letterbox(unittest.TestCase):
+
+    def test_pads_bottom_and_right(self):
+        image = marked(90, 100, 7)
+
+        padded = _letterbox(image, 128, 128)
+
+        self.assertEqual(padded.shape, (128, 128, 3))
+        self.assertTrue((padded[:90, :100] == 7).all())
+        self.assertFalse(padded[90:].any())
+        self.assertFalse(padded[:, 100:].any())
+
+    def test_same_size_is_unchanged(self):
+        image = marked(90, 100, 7)
+
+        self.assertIs(_letterbox(image, 90, 100), image)
+
+
+class Test_batch_detect_face_locations(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeFaceRecognition()
+        patcher = mock.patch.object(face_detection, 'face_recognition', self.fake)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_batches_identical_sizes_only(self):
+        images = [marked(100, 100, 1), marked(90, 100, 2), marked(200, 200, 3), marked(100, 100, 4)]
+
+        results = batch_detect_face_locations(images, model='cnn')
+
+        self.assertEqual(sorted(self.fake.batches), sorted([
+            [(100, 100), (100, 100)],
+            [(90, 100)],
+            [(200, 200)]
+        ]))
+        self.assertEqual(results, [[(m, m + 10, m + 10, m)] for m in (1, 2, 3, 4)])
+
+    def test_pad_to_groups_similar_sizes(self):
+        images = [marked(100, 100, 1), marked(90, 100, 2), marked(200, 200, 3), marked(100, 120, 4)]
+
+        results = batch_detect_face_locations(images, model='cnn', pad_to=128, batch_size=2)
+
+        self.assertEqual(sorted(self.fake.batches), sorted([
+            [(128, 128), (128, 128)],
+            [(128, 128)],
+            [(256, 256)]
+        ]))
+        # Results stay in input order, whichever batch each image went through
+        self.assertEqual(results, [[(m, m + 10, m + 10, m)] for m in (1, 2, 3, 4)])
+
+    def test_boxes_in_padding_are_clamped_to_the_image(self):
+        self.fake.boxes = [(80, 120, 125, 90)]
+
+        results = batch_detect_face_locations([marked(90, 100, 1)], model='cnn', pad_to=128)
+
+        self.assertEqual(self.fake.batches, [[(128, 128)]])
+        self.assertEqual(results, [[(80, 100, 90, 90)]])
+
+    def test_downscaled_boxes_are_mapped_back(self):
+        images = [marked(400, 400, 5), marked(200, 200, 5)]
+
+        results = batch_detect_face_locations(images, max_dimension=200, model='cnn')
+
+        self.assertEqual(self.fake.batches, [[(200, 200), (200, 200)]])
+        self.assertEqual(results, [[(10, 30, 30, 10)], [(5, 15, 15, 5)]])
+
+    def test_hog_detects_one_image_at_a_time(self):
+        results = batch_detect_face_locations([marked(100, 100, 1), marked(90, 100, 2)], model='hog')
+
+        self.assertEqual(self.fake.batches, [])
+        self.assertEqual(results, [[(1, 11, 11, 1)], [(2, 12, 12, 2)]])
+
+    def test_detect_and_encode_keeps_input_order(self):
+        images = [marked(100, 100, 1), marked(200, 200, 2), marked(100, 100, 3)]
+
+        results = batch_detect_and_encode(images, model='cnn')
+
+        self.assertEqual([locations for locations, _ in results], [[(m, m + 10, m + 10, m)] for m in (1, 2, 3)])
+        self.assertEqual([encodings[0][0] for _, encodings in results], [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
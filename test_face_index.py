@@ -0,0 +1,107 @@
+import unittest
+
+import numpy as np
+
+from services.face_index import EXACT_SEARCH_CHUNK_BYTES, EmbeddingMatrix, FaceIndex, exact_search_chunk_size
+
+
+class Test_face_index(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = rng.normal(scale=0.1, size=(3000, 128)).astype(np.float32)
+        self.queries = self.vectors[:50] + rng.normal(scale=0.01, size=(50, 128)).astype(np.float32)
+
+    def exact(self, query, radius):
+        distances = np.linalg.norm(self.vectors - query, axis=1)
+        return set(np.flatnonzero(distances <= radius).tolist())
+
+    def test_flat_query_radius_is_exact(self):
+        index = FaceIndex()
+        index.add_many(range(len(self.vectors)), self.vectors)
+
+        self.assertFalse(index.is_trained)
+        for query in self.queries:
+            found = index.query_radius(query, 1.0)
+            self.assertEqual({key for key, _ in found}, self.exact(query, 1.0))
+            distances = [distance for _, distance in found]
+            self.assertEqual(distances, sorted(distances))
+
+    def test_ivf_finds_near_neighbours(self):
+        index = FaceIndex(train_threshold=1000, nprobe=8)
+        index.add_many(range(len(self.vectors)), self.vectors)
+
+        self.assertTrue(index.is_trained)
+        for i, results in enumerate(index.query_radius_many(self.queries, 0.2)):
+            self.assertIn(i, {key for key, _ in results})
+
+    def test_exhaustive_index_stays_exact(self):
+        index = FaceIndex(train_threshold=1000, nprobe=None)
+        index.add_many(range(len(self.vectors)), self.vectors)
+
+        self.assertFalse(index.is_trained)
+        for query, results in zip(self.queries, index.query_radius_many(self.queries, 1.0)):
+            self.assertEqual({key for key, _ in results}, self.exact(query, 1.0))
+
+    def test_exact_chunks_fit_the_byte_budget(self):
+        self.assertEqual(exact_search_chunk_size(1_000_000), EXACT_SEARCH_CHUNK_BYTES // 4_000_000)
+        self.assertLessEqual(exact_search_chunk_size(1_000_000) * 1_000_000 * 4, EXACT_SEARCH_CHUNK_BYTES)
+        self.assertEqual(exact_search_chunk_size(10 ** 9), 1)
+        self.assertEqual(exact_search_chunk_size(0), EXACT_SEARCH_CHUNK_BYTES // 4)
+
+    def test_chunked_exact_search_matches_unchunked(self):
+        index = FaceIndex(nprobe=None)
+        index.add_many(range(len(self.vectors)), self.vectors)
+
+        chunked = index.query_radius_many(self.queries, 1.0, chunk_size=7)
+        unchunked = index.query_radius_many(self.queries, 1.0)
+        self.assertEqual(len(chunked), len(self.queries))
+        for a, b in zip(chunked, unchunked):
+            self.assertEqual([key for key, _ in a], [key for key, _ in b])
+            np.testing.assert_allclose([d for _, d in a], [d for _, d in b], rtol=1e-4)
+
+    def test_add_replace_and_remove(self):
+        index = FaceIndex(train_threshold=1000)
+        index.add_many(range(len(self.vectors)), self.vectors)
+
+        index.add('alice', self.vectors[0])
+        index.add(0, self.vectors[1])
+        self.assertTrue(index.remove('alice'))
+        self.assertFalse(index.remove('alice'))
+
+        keys = {key for key, _ in index.query_radius(self.vectors[1], 1e-3)}
+        self.assertEqual(keys, {0, 1})
+        self.assertNotIn('alice', index)
+        self.assertEqual(len(index), len(self.vectors))
+
+
+class Test_embedding_matrix(unittest.TestCase):
+
+    def test_matches_agree_with_pairwise_norms(self):
+        rng = np.random.default_rng(1)
+        users = {f"user{i}": rng.normal(scale=0.1, size=128) for i in range(40)}
+        faces = rng.normal(scale=0.1, size=(7, 128))
+        matrix = EmbeddingMatrix()
+        for username, embedding in users.items():
+            matrix.set(username, embedding)
+        matrix.remove('user3')
+        matrix.set('user5', users['user6'])
+        users['user5'] = users['user6']
+        del users['user3']
+
+        matches = matrix.matches(faces, 1.6)
+
+        self.assertEqual(matches.shape, (7, 39))
+        for j, username in enumerate(matrix.keys):
+            expected = np.linalg.norm(faces - users[username], axis=1) <= 1.6
+            np.testing.assert_array_equal(matches[:, j], expected)
+
+    def test_no_faces(self):
+        matrix = EmbeddingMatrix()
+        matrix.set('alice', np.zeros(128))
+
+        self.assertEqual(matrix.matches(np.asarray([]), 0.6).shape, (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from blob_downloader import LocalBucket
+from image_cache import ImageCache
+
+
+class CountingBlob:
+    """Wraps a LocalBlob and counts downloads."""
+
+    def __init__(self, blob):
+        self.blob = blob
+        self.name = blob.name
+        self.generation = blob.generation
+        self.md5_hash = blob.md5_hash
+        self.downloads = 0
+
+    def download_to_filename(self, filename):
+        self.downloads += 1
+        self.blob.download_to_filename(filename)
+
+
+class Test_image_cache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bucket_dir = os.path.join(self.tmp.name, 'bucket')
+        self.cache_dir = os.path.join(self.tmp.name, 'cache')
+        for user in ('user1', 'user2'):
+            os.makedirs(os.path.join(self.bucket_dir, user))
+            with open(os.path.join(self.bucket_dir, user, 'IMG_0001.jpg'), 'wb') as f:
+                f.write(user.encode('utf-8') * 100)
+        self.bucket = LocalBucket(self.bucket_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def blob(self, name):
+        return CountingBlob(self.bucket.get_blob(name))
+
+    def test_repeated_fetch_hits_cache(self):
+        cache = ImageCache(self.cache_dir)
+        blob = self.blob('user1/IMG_0001.jpg')
+
+        first = cache.fetch(blob)
+        second = cache.fetch(blob)
+
+        self.assertEqual(first, second)
+        self.assertEqual(blob.downloads, 1)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_same_basename_does_not_collide(self):
+        cache = ImageCache(self.cache_dir)
+        path1 = cache.fetch(self.blob('user1/IMG_0001.jpg'))
+        path2 = cache.fetch(self.blob('user2/IMG_0001.jpg'))
+
+        self.assertNotEqual(path1, path2)
+        with open(path1, 'rb') as f:
+            self.assertTrue(f.read().startswith(b'user1'))
+
+    def test_changed_content_is_refetched(self):
+        cache = ImageCache(self.cache_dir)
+        before = cache.fetch(self.blob('user1/IMG_0001.jpg'))
+        with open(os.path.join(self.bucket_dir, 'user1', 'IMG_0001.jpg'), 'wb') as f:
+            f.write(b'replaced')
+        after = cache.fetch(self.blob('user1/IMG_0001.jpg'))
+
+        self.assertNotEqual(before, after)
+
+    def test_lru_eviction_respects_cap(self):
+        cache = ImageCache(self.cache_dir, max_bytes=600)
+        path1 = cache.fetch(self.blob('user1/IMG_0001.jpg'))
+        path2 = cache.fetch(self.blob('user2/IMG_0001.jpg'))
+
+        self.assertFalse(os.path.exists(path1))
+        self.assertTrue(os.path.exists(path2))
+        self.assertLessEqual(cache.total_bytes, 600)
+
+    def test_index_survives_restart(self):
+        ImageCache(self.cache_dir).fetch(self.blob('user1/IMG_0001.jpg'))
+        cache = ImageCache(self.cache_dir)
+        blob = self.blob('user1/IMG_0001.jpg')
+        cache.fetch(blob)
+
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(blob.downloads, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+import image_loader
+from image_loader import decode_image, load_image, read_image_size
+
+
+def encode(size, format):
+    buffer = io.BytesIO()
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+class Test_image_loader(unittest.TestCase):
+
+    def test_full_resolution_by_default(self):
+        array, original_size = decode_image(encode((640, 480), 'JPEG'))
+
+        self.assertEqual(array.shape, (480, 640, 3))
+        self.assertEqual(original_size, (480, 640))
+
+    def test_jpeg_draft_keeps_at_least_max_dimension(self):
+        array, original_size = decode_image(encode((1600, 1200), 'JPEG'), max_dimension=300)
+
+        self.assertEqual(original_size, (1200, 1600))
+        self.assertEqual(array.shape, (300, 400, 3))
+        self.assertEqual(array.dtype, np.uint8)
+
+        array = load_image(encode((1600, 1200), 'JPEG'), max_dimension=500)
+        self.assertEqual(array.shape, (600, 800, 3))
+
+    def test_png_is_not_reduced(self):
+        array = load_image(encode((800, 600), 'PNG'), max_dimension=100)
+
+        self.assertEqual(array.shape, (600, 800, 3))
+
+    def test_applies_exif_orientation(self):
+        pixels = np.zeros((100, 200, 3), dtype=np.uint8)
+        pixels[:10, :20] = 255
+        image = Image.fromarray(pixels)
+        exif = image.getexif()
+        exif[0x0112] = 6  # stored rotated; display turned 90 degrees clockwise
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', exif=exif.tobytes())
+
+        array, original_size = decode_image(buffer.getvalue())
+        self.assertEqual(array.shape, (200, 100, 3))
+        self.assertEqual(original_size, (200, 100))
+        self.assertGreater(array[:20, -10:].mean(), 200)
+
+        array, original_size = decode_image(buffer.getvalue(), max_dimension=50)
+        self.assertEqual(array.shape, (50, 25, 3))
+        self.assertEqual(original_size, (200, 100))
+        self.assertEqual(read_image_size(buffer.getvalue()), (200, 100))
+
+    def test_file_is_closed_when_decoding_fails(self):
+        fd, path = tempfile.mkstemp(suffix='.jpg')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(encode((64, 48), 'JPEG'))
+
+        opened = []
+        def open_image(source):
+            opened.append(image_loader.Image.open(source))
+            return opened[-1]
+
+        # Fail before the pixels are loaded, as PIL itself closes the file after loading them
+        with mock.patch.object(image_loader, 'open_image', open_image), \
+                mock.patch.object(Image.Image, 'getexif', side_effect=OSError("bad EXIF")):
+            with self.assertRaises(OSError):
+                decode_image(path)
+
+        self.assertIsNone(opened[0].fp)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+from embedding_codec import encode_embeddings
+from photo_collection import PhotoCollection
+
+
+class FakeDocument:
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class Test_photo_collection(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.encodings = {
+            'a': rng.normal(size=(2, 128)).astype(np.float32),
+            'c': rng.normal(size=(1, 128)).astype(np.float32),
+        }
+        self.docs = [
+            FakeDocument('a', {'file_path': 'photos/a.jpg', 'author_id': 'alice', 'isAccountPhoto': True,
+                               'upload_timestamp': datetime(2024, 3, 24, 2, 32, tzinfo=timezone.utc),
+                               'face_embeddings': encode_embeddings(self.encodings['a']),
+                               'embedding_hash': 'h1', 'embedding_version': 'v1'}),
+            FakeDocument('b', {'file_path': 'photos/b.jpg', 'author_id': 'bob',
+                               'upload_timestamp': '2024-04-13T12:20:16.000000'}),
+            FakeDocument('broken', {'author_id': 'bob'}),
+            FakeDocument('c', {'file_path': 'photos/c.jpg', 'author_id': 'alice',
+                               'face_embeddings': encode_embeddings(self.encodings['c']),
+                               'embedding_hash': 'h3', 'embedding_version': 'v1'}),
+        ]
+
+    def test_from_documents(self):
+        photos = PhotoCollection.from_documents(self.docs)
+
+        self.assertEqual(len(photos), 3)
+        self.assertEqual(photos.photo_ids.tolist(), ['a', 'b', 'c'])
+        self.assertEqual(photos.embedding_matrix.shape, (3, 128))
+        self.assertEqual(photos.face_photo_index.tolist(), [0, 0, 2])
+        np.testing.assert_array_equal(photos[0].face_encodings, self.encodings['a'])
+        np.testing.assert_array_equal(photos[-1].face_encodings, self.encodings['c'])
+
+        a, b = photos[0], photos[1]
+        self.assertTrue(a.is_account_photo)
+        self.assertEqual(a.author_id, 'alice')
+        self.assertEqual(a.upload_timestamp, '2024-03-24T02:32:00.000000')
+        self.assertEqual((a.embedding_hash, a.embedding_version), ('h1', 'v1'))
+        self.assertFalse(b.is_account_photo)
+        self.assertEqual(b.num_faces, 0)
+        self.assertEqual((b.embedding_hash, b.embedding_version), (None, None))
+        self.assertEqual(photos.embedding_hashes.tolist(), ['h1', '', 'h3'])
+        self.assertEqual(photos.embedding_versions.tolist(), ['v1', '', 'v1'])
+
+    def test_index_of(self):
+        photos = PhotoCollection.from_documents(reversed(self.docs))
+
+        self.assertEqual(photos.index_of('a'), 2)
+        self.assertEqual(photos.index_of('c'), 0)
+        self.assertIsNone(photos.index_of('broken'))
+
+    def test_author_index(self):
+        docs = self.docs + [FakeDocument('d', {'file_path': 'photos/d.jpg', 'author_id': 'bob', 'isAccountPhoto': True})]
+        photos = PhotoCollection.from_documents(docs)
+
+        self.assertEqual([photo.photo_id for photo in photos.photos_by_author('alice')], ['a', 'c'])
+        self.assertEqual(photos.photo_indexes_by_author('bob').tolist(), [1, 3])
+        self.assertEqual(photos.photos_by_author('carol'), [])
+        self.assertEqual(photos.account_photo('bob').photo_id, 'd')
+        self.assertEqual(photos.account_photo('alice').photo_id, 'a')
+        self.assertIsNone(photos.account_photo('carol'))
+
+    def test_update_embeddings(self):
+        photos = PhotoCollection.from_documents(self.docs)
+        new_b = np.ones((3, 128), dtype=np.float32)
+
+        updated = photos.update_embeddings({
+            'b': (list(new_b), 'a-much-longer-content-hash', 'v2'),
+            'c': ([], 'h4', 'v2'),
+            'missing': ([], 'h5', 'v2'),
+        })
+
+        self.assertEqual(updated, 2)
+        self.assertEqual(photos.face_offsets.tolist(), [0, 2, 5, 5])
+        np.testing.assert_array_equal(photos[0].face_encodings, self.encodings['a'])
+        np.testing.assert_array_equal(photos[1].face_encodings, new_b)
+        self.assertEqual(photos[1].embedding_hash, 'a-much-longer-content-hash')
+        self.assertEqual(photos[1].embedding_version, 'v2')
+        self.assertEqual(photos[2].num_faces, 0)
+        self.assertEqual((photos[2].embedding_hash, photos[2].embedding_version), ('h4', 'v2'))
+        self.assertEqual((photos[0].embedding_hash, photos[0].embedding_version), ('h1', 'v1'))
+
+    def test_concatenate(self):
+        pages = [PhotoCollection.from_documents(self.docs[:2]), PhotoCollection.from_documents(self.docs[2:])]
+
+        photos = PhotoCollection.concatenate(pages)
+
+        self.assertEqual(photos.photo_ids.tolist(), ['a', 'b', 'c'])
+        self.assertEqual(photos.face_photo_index.tolist(), [0, 0, 2])
+        self.assertEqual([photo.embedding_version for photo in photos], ['v1', None, 'v1'])
+        np.testing.assert_array_equal(photos[2].face_encodings, self.encodings['c'])
+
+    def test_empty(self):
+        photos = PhotoCollection()
+
+        self.assertEqual(len(photos), 0)
+        self.assertEqual(photos.embedding_matrix.shape, (0, 128))
+        self.assertEqual(len(photos.face_photo_index), 0)
+        self.assertIsNone(photos.index_of('a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
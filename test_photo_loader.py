@@ -0,0 +1,66 @@
+import unittest
+
+import numpy as np
+
+from embedding_codec import encode_embeddings
+from fake_firestore import FakeFirestore
+from photo_loader import (
+    iter_photo_document_pages, iter_photos_from_firebase, load_photo_collection_from_firebase,
+    load_photos_by_author_from_firebase
+)
+
+
+def photo_document(i):
+    return {
+        'file_path': f"photos/{i}.jpg",
+        'author_id': f"user{i % 3}",
+        'face_embeddings': encode_embeddings(np.full((i % 2, 128), i, dtype=np.float32)),
+        'embedding_hash': f"hash{i}",
+        'embedding_version': 'v1'
+    }
+
+
+class Test_photo_loader(unittest.TestCase):
+
+    def setUp(self):
+        documents = {f"photo{i:03d}": photo_document(i) for i in range(23)}
+        documents['broken'] = {'author_id': 'user0'}
+        self.db = FakeFirestore({'photos': documents})
+
+    def test_pages_cover_collection_once(self):
+        pages = list(iter_photo_document_pages(self.db, page_size=5))
+
+        self.assertEqual([len(page) for page in pages], [5, 5, 5, 5, 4])
+        ids = [doc.id for page in pages for doc in page]
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), 24)
+
+    def test_exact_multiple_of_page_size(self):
+        pages = list(iter_photo_document_pages(self.db, page_size=8))
+
+        self.assertEqual([len(page) for page in pages], [8, 8, 8])
+        self.assertEqual(self.db.requests, 4)
+
+    def test_iter_photos_skips_invalid_documents(self):
+        photos = list(iter_photos_from_firebase(self.db, page_size=4, workers=3))
+
+        self.assertEqual([photo.photo_id for photo in photos], [f"photo{i:03d}" for i in range(23)])
+        self.assertEqual(len(photos[7].face_encodings), 1)
+        self.assertEqual(photos[7].face_encodings[0][0], 7)
+
+    def test_collection_matches_documents(self):
+        photos = load_photo_collection_from_firebase(self.db, page_size=6, workers=2)
+
+        self.assertEqual(len(photos), 23)
+        self.assertEqual(photos.embedding_matrix.shape, (11, 128))
+        self.assertEqual(photos[photos.index_of('photo009')].embedding_hash, 'hash9')
+
+    def test_by_author(self):
+        photos = load_photos_by_author_from_firebase('user1', db=self.db)
+
+        self.assertEqual({photo.author_id for photo in photos}, {'user1'})
+        self.assertEqual(len(photos), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import glob
+import os
+import tempfile
+import unittest
+
+from fastapi.testclient import TestClient
+
+from main import app
+from routers import photos
+
+
+def spooled_uploads():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), 'photobomb-upload-*')))
+
+
+def multipart(filename, data, boundary="photobomb-test-boundary"):
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def chunked(body, chunk_size=1024):
+    # A generator body has no known length, so it is sent with chunked transfer encoding
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+class Test_photo_routes(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_upload_is_rejected_when_executor_is_saturated(self):
+        before = spooled_uploads()
+        slots = [photos.processing_executor.reserve() for _ in range(photos.processing_executor.capacity)]
+        try:
+            response = self.client.post("/photos/upload", files={"file": ("photo.jpg", b"jpeg", "image/jpeg")})
+        finally:
+            for slot in slots:
+                slot.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+        self.assertEqual(photos.processing_executor.in_flight, 0)
+        self.assertEqual(spooled_uploads() - before, set())
+
+    def test_chunked_upload_is_accepted(self):
+        body, headers = multipart("notes.txt", b"text")
+
+        response = self.client.post("/photos/upload", content=chunked(body), headers=headers)
+
+        # The body was read and parsed: the filename check answers, not a length check
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Invalid image format.")
+
+    def test_chunked_upload_too_large_is_rejected(self):
+        limits = photos.MAX_UPLOAD_BYTES, photos.MULTIPART_OVERHEAD_BYTES
+        photos.MAX_UPLOAD_BYTES, photos.MULTIPART_OVERHEAD_BYTES = 1000, 500
+        try:
+            body, headers = multipart("photo.jpg", b"x" * 5000)
+            response = self.client.post("/photos/upload", content=chunked(body, 256), headers=headers)
+        finally:
+            photos.MAX_UPLOAD_BYTES, photos.MULTIPART_OVERHEAD_BYTES = limits
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(photos.processing_executor.in_flight, 0)
+
+    def test_upload_declared_too_large_is_rejected(self):
+        limits = photos.MAX_UPLOAD_BYTES, photos.MULTIPART_OVERHEAD_BYTES
+        photos.MAX_UPLOAD_BYTES, photos.MULTIPART_OVERHEAD_BYTES = 1000, 500
+        try:
+            response = self.client.post("/photos/upload", files={"file": ("photo.jpg", b"x" * 5000, "image/jpeg")})
+        finally:
+            photos.MAX_UPLOAD_BYTES, photos.MULTIPART_OVERHEAD_BYTES = limits
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(photos.processing_executor.in_flight, 0)
+
+    def test_rejected_upload_holds_no_slot(self):
+        response = self.client.post("/photos/upload", files={"file": ("notes.txt", b"text", "text/plain")})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(photos.processing_executor.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from fake_firestore import FakeFirestore
+from predicted_photos import send_predicted_photos_to_users
+
+
+class Test_predicted_photos(unittest.TestCase):
+
+    def setUp(self):
+        users = {f"user{i}": {'email': f"user{i}@example.com"} for i in range(1200)}
+        user_photos = {f"user{i}": {'confirmed_photos': ['p1'], 'predicted_photos': []} for i in range(1199)}
+        user_photos['user0']['predicted_photos'] = ['p3', 'p2']
+        self.db = FakeFirestore({'users': users, 'user_photos': user_photos})
+        self.clusters = {f"user{i}": ['p1', 'p2', 'p3'] for i in range(1100)}
+
+    def test_batches_reads_and_writes(self):
+        stats = send_predicted_photos_to_users(self.db, self.clusters)
+
+        self.assertEqual(stats, {'users': 1200, 'updated': 1099, 'unchanged': 100, 'missing': 1,
+                                 'added': 2198, 'removed': 0, 'writes': 1099})
+        self.assertEqual(self.db.writes, 1099)
+        self.assertEqual(self.db.commits, 3)
+        # One users stream, four get_all calls and three commits
+        self.assertEqual(self.db.requests, 8)
+
+        user_photos = self.db.data('user_photos')
+        self.assertEqual(sorted(user_photos['user5']['predicted_photos']), ['p2', 'p3'])
+        self.assertEqual(user_photos['user5']['confirmed_photos'], ['p1'])
+        self.assertEqual(user_photos['user1150']['predicted_photos'], [])
+
+    def test_second_run_writes_nothing(self):
+        send_predicted_photos_to_users(self.db, self.clusters)
+        writes = self.db.writes
+
+        stats = send_predicted_photos_to_users(self.db, self.clusters)
+
+        self.assertEqual(stats['updated'], 0)
+        self.assertEqual(self.db.writes, writes)
+
+    def test_writes_only_differences(self):
+        db = FakeFirestore({
+            'users': {'alice': {}, 'bob': {}},
+            'user_photos': {
+                'alice': {'confirmed_photos': ['p1'], 'predicted_photos': ['p2', 'p3']},
+                'bob': {'confirmed_photos': [], 'predicted_photos': ['p4']},
+            }
+        })
+        clusters = {'alice': ['p1', 'p3', 'p5'], 'bob': ['p4', 'p6']}
+
+        stats = send_predicted_photos_to_users(db, clusters)
+
+        self.assertEqual((stats['added'], stats['removed'], stats['writes']), (2, 1, 3))
+        self.assertEqual(db.commits, 1)
+        user_photos = db.data('user_photos')
+        self.assertEqual(sorted(user_photos['alice']['predicted_photos']), ['p3', 'p5'])
+        self.assertEqual(user_photos['bob']['predicted_photos'], ['p4', 'p6'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+import unittest
+
+from services.processing_executor import ProcessingExecutor, ExecutorSaturated
+
+
+class Test_processing_executor(unittest.TestCase):
+
+    def setUp(self):
+        self.executor = ProcessingExecutor(kind='thread', max_workers=1, max_queue=1)
+
+    def tearDown(self):
+        self.executor.shutdown()
+
+    def test_saturated_when_capacity_is_reserved(self):
+        slots = [self.executor.reserve() for _ in range(self.executor.capacity)]
+
+        with self.assertRaises(ExecutorSaturated):
+            self.executor.reserve()
+        with self.assertRaises(ExecutorSaturated):
+            asyncio.run(self.executor.run(sum, [1, 2]))
+
+        slots[0].release()
+        slots[0].release()
+        self.assertEqual(self.executor.in_flight, self.executor.capacity - 1)
+        self.assertEqual(asyncio.run(self.executor.run(sum, [1, 2])), 3)
+        self.assertEqual(self.executor.in_flight, self.executor.capacity - 1)
+
+    def test_slot_is_held_until_a_cancelled_job_finishes(self):
+        started, finish = threading.Event(), threading.Event()
+
+        def job():
+            started.set()
+            finish.wait(5)
+
+        async def scenario():
+            task = asyncio.ensure_future(self.executor.run(job))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            # The awaiting request goes away while the job is still running on the pool
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(self.executor.in_flight, 1)
+
+        asyncio.run(scenario())
+        finish.set()
+        self.executor.shutdown()
+        self.assertEqual(self.executor.in_flight, 0)
+
+    def test_release_callbacks_run_when_the_job_finishes(self):
+        started, finish = threading.Event(), threading.Event()
+        released = []
+
+        async def scenario():
+            slot = self.executor.reserve()
+            slot.add_release_callback(lambda: released.append('job'))
+            task = asyncio.ensure_future(slot.submit(lambda: (started.set(), finish.wait(5))))
+            await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # Still running on the pool, so whatever it reads must still be there
+            self.assertEqual(released, [])
+
+            unused = self.executor.reserve()
+            unused.add_release_callback(lambda: released.append('unused'))
+            unused.release()
+            self.assertEqual(released, ['unused'])
+
+        asyncio.run(scenario())
+        finish.set()
+        self.executor.shutdown()
+        self.assertEqual(released, ['unused', 'job'])
+
+    def test_used_slot_cannot_be_reused(self):
+        async def scenario():
+            slot = self.executor.reserve()
+            self.assertEqual(await slot.submit(max, 1, 2), 2)
+            with self.assertRaises(RuntimeError):
+                slot.submit(max, 1, 2)
+            slot.release()
+
+        asyncio.run(scenario())
+        self.assertEqual(self.executor.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
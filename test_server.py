@@ -0,0 +1,218 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+from sklearn.cluster import DBSCAN
+
+from blob_downloader import BlobPrefetcher, LocalBucket
+from embedding_codec import encode_embeddings
+from fake_firestore import FakeFirestore
+from photo_collection import PhotoCollection
+from photo_loader import load_photo_collection_from_firebase
+from Server import (
+    EMBEDDING_MODEL_VERSION, update_people_cluster, refresh_face_embeddings, add_user_face_embedding,
+    _people_clusters_from_labels
+)
+from services.clustering_service import ClusterState
+
+
+class FakeDocument:
+
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+def make_photos(people, photos_per_person, version='v1', seed=0):
+    """One account photo and several tagged photos per person, one face each."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=0.3, size=(people, 128))
+    docs = []
+    for person in range(people):
+        for i in range(photos_per_person):
+            face = centres[person] + rng.normal(scale=0.02, size=128)
+            docs.append(FakeDocument(f"p{person}-{i}", {
+                'file_path': f"photos/p{person}-{i}.jpg",
+                'author_id': f"user{person}",
+                'isAccountPhoto': i == 0,
+                'face_embeddings': encode_embeddings([face]),
+                'embedding_hash': f"hash{person}-{i}",
+                'embedding_version': version,
+            }))
+    return docs
+
+
+class Test_update_people_cluster(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state_path = os.path.join(self.directory.name, 'cluster_state.npz')
+        self.docs = make_photos(people=20, photos_per_person=5)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def dbscan_clusters(self, photos):
+        labels = DBSCAN(eps=0.55, min_samples=1).fit(photos.embedding_matrix).labels_
+        return _people_clusters_from_labels(photos, labels, photos.face_photo_index)
+
+    def normalise(self, clusters):
+        return {author: sorted(photo_ids) for author, photo_ids in clusters.items()}
+
+    def test_incremental_run_matches_dbscan(self):
+        first = PhotoCollection.from_documents(self.docs[:60])
+        self.assertEqual(self.normalise(update_people_cluster(first, self.state_path)),
+                         self.normalise(self.dbscan_clusters(first)))
+
+        everything = PhotoCollection.from_documents(self.docs)
+        clusters = update_people_cluster(everything, self.state_path)
+        self.assertEqual(self.normalise(clusters), self.normalise(self.dbscan_clusters(everything)))
+        self.assertEqual(len(clusters), 20)
+
+    def test_model_version_change_reclusters(self):
+        update_people_cluster(PhotoCollection.from_documents(self.docs), self.state_path)
+
+        # Same blobs and hashes, but embedded by a new model that places every face elsewhere
+        reembedded = make_photos(people=20, photos_per_person=5, version='v2', seed=1)
+        photos = PhotoCollection.from_documents(reembedded)
+        clusters = update_people_cluster(photos, self.state_path)
+
+        self.assertEqual(self.normalise(clusters), self.normalise(self.dbscan_clusters(photos)))
+        # The old model's faces were replaced, not kept alongside the new ones
+        np.testing.assert_array_equal(ClusterState.load(self.state_path).points, photos.embedding_matrix)
+
+
+
+class FakeEngine:
+    """Stands in for FaceEncodingEngine, recording which photos it was asked to encode."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode_unordered(self, jobs):
+        for photo_id, source in jobs:
+            self.encoded.append(photo_id)
+            yield photo_id, [np.full(128, len(self.encoded), dtype=np.float32)]
+
+    def encode(self, source):
+        self.encoded.append(source)
+        return [np.full(128, len(self.encoded), dtype=np.float32)]
+
+
+class Test_refresh_face_embeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.bucket = LocalBucket(self.directory.name)
+        for name in ('new', 'current', 'old_model', 'changed'):
+            with open(os.path.join(self.directory.name, f"{name}.jpg"), 'wb') as f:
+                f.write(name.encode())
+        current_hash = self.bucket.get_blob('current.jpg').md5_hash
+        old_model_hash = self.bucket.get_blob('old_model.jpg').md5_hash
+        face = encode_embeddings([np.zeros(128)])
+
+        def photo(name, **stamp):
+            return dict(file_path=f"{name}.jpg", author_id='alice', face_embeddings=face, **stamp)
+
+        self.db = FakeFirestore({'photos': {
+            'new': dict(file_path='new.jpg', author_id='alice'),
+            'current': photo('current', embedding_hash=current_hash, embedding_version=EMBEDDING_MODEL_VERSION),
+            'old_model': photo('old_model', embedding_hash=old_model_hash, embedding_version='hog-resnet-v0'),
+            # Stamped as current, but the blob was replaced since it was embedded
+            'changed': photo('changed', embedding_hash='stale-hash', embedding_version=EMBEDDING_MODEL_VERSION),
+        }})
+        self.photos = load_photo_collection_from_firebase(self.db)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def refresh(self, **options):
+        engine = FakeEngine()
+        embeddings = refresh_face_embeddings(self.photos, self.db, engine, BlobPrefetcher(workers=1),
+                                             self.bucket, **options)
+        self.assertEqual(sorted(embeddings), sorted(engine.encoded))
+        return sorted(engine.encoded)
+
+    def test_only_missing_and_stale_photos_are_encoded(self):
+        self.assertEqual(self.refresh(), ['new', 'old_model'])
+        self.assertEqual(self.refresh(), [])
+
+        # Checking content hashes also finds the replaced blob, once
+        self.assertEqual(self.refresh(verify_content=True), ['changed'])
+        self.assertEqual(self.refresh(verify_content=True), [])
+
+        self.assertEqual(self.refresh(full_refresh=True), ['changed', 'current', 'new', 'old_model'])
+
+    def test_collection_is_patched_like_a_reload(self):
+        self.refresh(verify_content=True)
+        reloaded = load_photo_collection_from_firebase(self.db)
+
+        np.testing.assert_array_equal(self.photos.embedding_matrix, reloaded.embedding_matrix)
+        np.testing.assert_array_equal(self.photos.face_offsets, reloaded.face_offsets)
+        self.assertEqual(self.photos.embedding_hashes.tolist(), reloaded.embedding_hashes.tolist())
+        self.assertEqual(self.photos.embedding_versions.tolist(), [EMBEDDING_MODEL_VERSION] * 4)
+
+
+class Test_add_user_face_embedding(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.bucket = LocalBucket(self.directory.name)
+        for name in ('account', 'tagged'):
+            with open(os.path.join(self.directory.name, f"{name}.jpg"), 'wb') as f:
+                f.write(name.encode())
+
+        self.db = FakeFirestore({
+            'photos': {
+                'tagged': dict(file_path='tagged.jpg', author_id='alice', isAccountPhoto=False),
+                'account': dict(file_path='account.jpg', author_id='alice', isAccountPhoto=True),
+                'other': dict(file_path='other.jpg', author_id='bob', isAccountPhoto=False),
+            },
+            'users': {'alice': {}, 'bob': {}}
+        })
+        self.engine = FakeEngine()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def add(self, uid, photos=None):
+        self.db.reads = 0
+        add_user_face_embedding(uid, self.db, self.engine, self.bucket, photos=photos)
+
+    def assert_embedded_from_account_photo(self):
+        self.assertEqual(self.engine.encoded, [b'account'])
+        self.assertEqual(self.db.data('users')['alice']['face_embedding'],
+                         encode_embeddings([np.full(128, 1, dtype=np.float32)]))
+
+    def test_account_photo_from_catalogue(self):
+        photos = load_photo_collection_from_firebase(self.db)
+
+        self.add('alice', photos)
+
+        self.assertEqual(self.db.reads, 0)
+        self.assert_embedded_from_account_photo()
+
+    def test_account_photo_from_query(self):
+        self.add('alice')
+
+        self.assertEqual(self.db.reads, 1)
+        self.assert_embedded_from_account_photo()
+
+    def test_user_without_account_photo(self):
+        photos = load_photo_collection_from_firebase(self.db)
+
+        self.add('bob', photos)
+        self.assertEqual(self.db.reads, 0)
+        self.add('bob')
+        self.assertEqual(self.db.reads, 0)
+
+        self.assertEqual(self.engine.encoded, [])
+        self.assertNotIn('face_embedding', self.db.data('users')['bob'])
+
+
+if __name__ == '__main__':
+    unittest.main()
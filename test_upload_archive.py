@@ -0,0 +1,82 @@
+import io
+import tarfile
+import unittest
+import zipfile
+
+from services.upload_archive import expand_upload, TooManyFiles
+from services.upload_spool import UploadTooLarge
+
+MB = 1024 * 1024
+
+
+def make_zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def make_tar(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class Test_upload_archive(unittest.TestCase):
+
+    def test_single_image(self):
+        self.assertEqual(expand_upload('a.JPG', io.BytesIO(b'jpeg'), 10, MB, MB), [('a.JPG', b'jpeg')])
+
+    def test_zip_keeps_only_images(self):
+        data = make_zip({'album/a.jpg': b'a', 'album/notes.txt': b'x',
+                         '__MACOSX/album/._a.jpg': b'fork', 'album/b.png': b'b'})
+
+        self.assertEqual(expand_upload('album.zip', data, 10, MB, MB),
+                         [('album.zip/album/a.jpg', b'a'), ('album.zip/album/b.png', b'b')])
+
+    def test_tar(self):
+        data = make_tar({'a.jpeg': b'a', 'b.gif': b'b'})
+
+        self.assertEqual(expand_upload('album.tar.gz', data, 10, MB, MB), [('album.tar.gz/a.jpeg', b'a')])
+
+    def test_limits(self):
+        data = make_zip({f"{i}.jpg": b'x' for i in range(5)})
+
+        with self.assertRaises(TooManyFiles):
+            expand_upload('album.zip', data, 4, MB, MB)
+        with self.assertRaises(TooManyFiles):
+            expand_upload('a.jpg', b'x', 0, MB, MB)
+
+    def test_size_limits(self):
+        # A few KB compressed, 20 MB once decompressed
+        bomb = make_zip({'big.jpg': b'\0' * (20 * MB)})
+        self.assertLess(len(bomb), 100 * 1024)
+        with self.assertRaises(UploadTooLarge):
+            expand_upload('bomb.zip', bomb, 10, 10 * MB, 100 * MB)
+
+        album = make_zip({f"{i}.jpg": b'x' * 1000 for i in range(5)})
+        self.assertEqual(len(expand_upload('album.zip', album, 10, 1000, 5000)), 5)
+        with self.assertRaises(UploadTooLarge):
+            expand_upload('album.zip', album, 10, 1000, 4999)
+
+        # Skipped tar members are decompressed too, so they count towards the total
+        tar = make_tar({'video.mov': b'\0' * 5000, 'a.jpg': b'a'})
+        with self.assertRaises(UploadTooLarge):
+            expand_upload('album.tgz', tar, 10, 1000, 4000)
+        with self.assertRaises(UploadTooLarge):
+            expand_upload('a.jpg', b'x' * 1001, 10, 1000, 5000)
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            expand_upload('notes.txt', b'x', 10, MB, MB)
+        with self.assertRaises(ValueError):
+            expand_upload('album.zip', b'not a zip', 10, MB, MB)
+
+
+if __name__ == '__main__':
+    unittest.main()
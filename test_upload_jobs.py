@@ -0,0 +1,51 @@
+import asyncio
+import unittest
+
+from services.upload_jobs import UploadJobStore, PENDING, SUCCEEDED, FAILED
+
+
+class Test_upload_jobs(unittest.TestCase):
+
+    def test_records_results_and_errors(self):
+        async def succeed():
+            await asyncio.sleep(0)
+            return {"photo_id": "abc"}
+
+        async def fail():
+            raise ValueError("bad image")
+
+        async def scenario():
+            store = UploadJobStore()
+            ok = store.start('a.jpg', succeed())
+            bad = store.start('b.jpg', fail())
+            self.assertEqual(ok.status, PENDING)
+            await asyncio.sleep(0.01)
+            return store, ok, bad
+
+        store, ok, bad = asyncio.run(scenario())
+
+        self.assertEqual(store.get(ok.job_id).status, SUCCEEDED)
+        self.assertEqual(ok.to_dict()['result'], {"photo_id": "abc"})
+        self.assertEqual(bad.status, FAILED)
+        self.assertEqual(bad.error, "bad image")
+        self.assertIsNotNone(bad.finished_at)
+
+    def test_prunes_oldest_finished_jobs(self):
+        async def done():
+            return {}
+
+        async def scenario():
+            store = UploadJobStore(max_finished=2)
+            jobs = [store.start(f"{i}.jpg", done()) for i in range(4)]
+            await asyncio.sleep(0.01)
+            return store, jobs
+
+        store, jobs = asyncio.run(scenario())
+
+        self.assertEqual(len(store), 2)
+        self.assertIsNone(store.get(jobs[0].job_id))
+        self.assertIsNotNone(store.get(jobs[3].job_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
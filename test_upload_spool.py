@@ -0,0 +1,44 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+
+from fastapi import UploadFile
+
+from services.upload_spool import spool_upload, remove_spooled_upload, UploadTooLarge
+
+
+class Test_upload_spool(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_spools_in_chunks(self):
+        data = os.urandom(10000)
+        upload = UploadFile(io.BytesIO(data), filename='photo.jpg')
+
+        path = asyncio.run(spool_upload(upload, max_bytes=len(data), chunk_size=1024, directory=self.directory.name))
+
+        self.assertEqual(os.path.dirname(path), self.directory.name)
+        self.assertTrue(path.endswith('.jpg'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+        remove_spooled_upload(path)
+        remove_spooled_upload(path)
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_too_large_leaves_nothing_behind(self):
+        upload = UploadFile(io.BytesIO(b'x' * 5000), filename='photo.jpg')
+
+        with self.assertRaises(UploadTooLarge):
+            asyncio.run(spool_upload(upload, max_bytes=4096, chunk_size=1024, directory=self.directory.name))
+
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+
+from fastapi.testclient import TestClient
+
+from main import app
+from routers import users
+
+
+class Test_user_routes(unittest.TestCase):
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        users.users_db.pop("alice", None)
+        users.users_embeddings.remove("alice")
+
+    def test_bad_embedding_dimension_does_not_claim_the_username(self):
+        response = self.client.post("/users/register", json={"username": "alice", "face_embedding": [0.1] * 5})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn("alice", users.users_db)
+        self.assertNotIn("alice", users.users_embeddings)
+
+        response = self.client.post("/users/register", json={"username": "alice", "face_embedding": [0.1] * 128})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("alice", users.users_db)
+        self.assertIn("alice", users.users_embeddings)
+        self.assertEqual(self.client.get("/users/alice").status_code, 200)
+
+    def test_duplicate_username_is_rejected(self):
+        embedding = [0.1] * 128
+        self.assertEqual(self.client.post("/users/register", json={"username": "alice", "face_embedding": embedding}).status_code, 200)
+
+        response = self.client.post("/users/register", json={"username": "alice", "face_embedding": embedding})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["detail"], "Username already exists.")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,11 @@
 # ML/userclass.py
 
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Union
 from photo_loader import load_photos_by_author_from_firebase
 from photo import Photo
+from photo_collection import PhotoCollection, PhotoRecord
+from embedding_codec import encode_embeddings, decode_embeddings
 import logging
 
 class User:
@@ -21,10 +23,19 @@ class User:
         self.confirmed_photos = confirmed_photos if confirmed_photos is not None else {}
         self.predicted_photos = predicted_photos if predicted_photos is not None else {}
     
-    def get_photo_class_objects(self) -> List[Photo]:
+    def get_photo_class_objects(self, photos: PhotoCollection = None) -> List[Union[Photo, PhotoRecord]]:
         """
-        Retrieves and returns a list of Photo objects authored by this user from Firestore.
+        Retrieves the photos authored by this user.
+
+        Args:
+            photos (PhotoCollection): Catalogue already loaded for this run. If given, the photos
+                                      are looked up in its author index instead of querying Firestore.
+
+        Returns:
+            List[Photo | PhotoRecord]: Records from `photos` if given, otherwise Photo objects from Firestore.
         """
+        if photos is not None:
+            return photos.photos_by_author(self.uid)
         logging.info(f"Fetching photos for user UID: {self.uid}")
         return load_photos_by_author_from_firebase(self.uid)
     
@@ -64,7 +75,7 @@ class User:
         return {
             'email': self.email,
             'uid': self.uid,
-            'face_embedding': self.face_embedding.tolist(),
+            'face_embedding': encode_embeddings([self.face_embedding]) if self.face_embedding is not None else None,
             'confirmed_photos': {pid: enc.tolist() for pid, enc in self.confirmed_photos.items()},
             'predicted_photos': {pid: enc.tolist() for pid, enc in self.predicted_photos.items()}
         }
@@ -87,7 +98,9 @@ class User:
         
         email = data['email']
         uid = data['uid']
-        face_embedding = np.array(data['face_embedding'])
+        # Reads both the compact format and legacy pickled values
+        face_embeddings = decode_embeddings(data['face_embedding'])
+        face_embedding = face_embeddings[0] if len(face_embeddings) else None
         
         confirmed_photos = {}
         predicted_photos = {}